@@ -3,13 +3,17 @@ import sys
 from pathlib import Path
 from datetime import datetime
 
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QHBoxLayout
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QHBoxLayout, QVBoxLayout
 
 from ui.components.log_display import LogDisplay
 from utils.logger import UnifiedLogger
 from core.command_manager import CommandManager
 from core.log_manager import LogManager
+from core.log_bridge import LogBridge
+from core.job_scheduler import JobScheduler
 from ui.components.button_panel import CommandButtonPanel
+from ui.components.job_panel import JobQueuePanel
 
 
 class LogWindow(QMainWindow):
@@ -18,9 +22,11 @@ class LogWindow(QMainWindow):
 
         # 初始化核心组件
         self.session_path = self.create_session_directory()
-        self.logger = UnifiedLogger(session_path=self.session_path, log_to_file=True)
+        self.logger = UnifiedLogger(session_path=self.session_path, log_to_file=True, structured_log=True)
         self.command_manager = CommandManager(self.logger, self.session_path)
         self.log_manager = LogManager(self.logger)
+        self.log_bridge = LogBridge(parent=self)
+        self.scheduler = JobScheduler(self.logger, parent=self)
 
         # 连接信号
         self.setup_signals()
@@ -37,14 +43,11 @@ class LogWindow(QMainWindow):
 
     def setup_signals(self):
         """连接所有信号"""
-        # 日志信号
-        self.logger.log_signal.connect(self.add_log)
-        self.command_manager.log_signal.connect(self.add_log)
-        self.log_manager.auto_log_signal.connect(self.add_log)
-
-        # 命令管理器信号
-        self.command_manager.command_started.connect(self.on_command_started)
-        self.command_manager.command_finished.connect(self.on_command_finished)
+        # 日志信号 - 工作线程的日志直接进入桥接器，由其按帧批量投递到界面
+        self.logger.log_signal.connect(self.log_bridge.post, Qt.DirectConnection)
+        self.command_manager.log_signal.connect(self.log_bridge.post)
+        self.log_manager.auto_log_signal.connect(self.log_bridge.post)
+        self.log_bridge.batch_ready.connect(self.add_logs)
 
     def init_ui(self):
         """初始化用户界面"""
@@ -60,23 +63,32 @@ class LogWindow(QMainWindow):
         main_layout.setSpacing(10)
         main_layout.setContentsMargins(10, 10, 10, 10)
 
-        # 创建左侧按钮面板
+        # 创建左侧按钮面板和任务队列
+        left_panel = QWidget()
+        left_layout = QVBoxLayout(left_panel)
+        left_layout.setContentsMargins(0, 0, 0, 0)
+
         self.button_panel = CommandButtonPanel()
         self.button_panel.command_triggered.connect(self.on_command_triggered)
         self.button_panel.config_triggered.connect(self.on_config_triggered)
-        main_layout.addWidget(self.button_panel)
+        self.button_panel.cancel_triggered.connect(self.on_cancel_triggered)
+        left_layout.addWidget(self.button_panel)
+
+        self.job_panel = JobQueuePanel(self.scheduler)
+        left_layout.addWidget(self.job_panel)
+        main_layout.addWidget(left_panel)
 
         # 创建右侧日志显示
         self.log_display = LogDisplay()
         main_layout.addWidget(self.log_display)
 
         # 设置布局比例
-        main_layout.setStretchFactor(self.button_panel, 1)
+        main_layout.setStretchFactor(left_panel, 1)
         main_layout.setStretchFactor(self.log_display, 4)
 
     def on_command_triggered(self, command_name):
         """处理命令触发"""
-        if command_name in ["start_logging", "stop_logging", "clear_log"]:
+        if command_name in ["start_logging", "stop_logging", "clear_log", "view_logs"]:
             self.handle_system_command(command_name)
         else:
             self.execute_command(command_name)
@@ -90,11 +102,19 @@ class LogWindow(QMainWindow):
         elif command_name == "clear_log":
             self.log_display.clear()
             self.log_manager.clear_logs()
+        elif command_name == "view_logs":
+            self.open_log_viewer()
 
-    def execute_command(self, command_name):
-        """执行测试命令"""
-        from core.command_executor import CommandExecutor
+    def open_log_viewer(self):
+        """打开历史日志查看器"""
+        from ui.components.log_viewer import LogViewerWindow
 
+        viewer = LogViewerWindow(parent=self)
+        viewer.show()
+        viewer.browse_file()
+
+    def execute_command(self, command_name):
+        """提交测试命令到任务调度器"""
         command = self.command_manager.get_command(command_name)
         if not command:
             self.logger.log("错误", f"未知命令: {command_name}")
@@ -105,31 +125,30 @@ class LogWindow(QMainWindow):
             self.logger.log("错误", "请先配置 Scout Insight 参数")
             return
 
-        # 使用命令执行器
-        executor = CommandExecutor(command, command_name)
-        executor.command_started.connect(lambda: self.button_panel.set_button_enabled(command_name, False))
-        executor.command_finished.connect(lambda: self.button_panel.set_button_enabled(command_name, True))
-        executor.log_signal.connect(self.add_log)
-        executor.execute()
+        # 由调度器排队执行，资源冲突的任务会等待前一个任务结束
+        self.scheduler.submit(command_name, command)
 
     def on_config_triggered(self, command_name):
         """处理配置触发"""
         self.command_manager.configure_command(command_name, self)
 
-    def on_command_started(self, command_name):
-        """命令开始回调"""
-        self.button_panel.set_button_enabled(command_name, False)
-
-    def on_command_finished(self, command_name):
-        """命令完成回调"""
-        self.button_panel.set_button_enabled(command_name, True)
+    def on_cancel_triggered(self, command_name):
+        """处理命令取消"""
+        if not self.scheduler.cancel_command(command_name):
+            self.logger.log("系统", f"没有正在运行或排队的 {command_name} 任务")
 
-    def add_log(self, level, message):
-        """添加日志到显示"""
-        self.log_display.add_log(level, message)
+    def add_logs(self, batch):
+        """批量添加日志到显示"""
+        self.log_display.add_logs(batch)
 
     def closeEvent(self, event):
         """窗口关闭事件"""
+        self.scheduler.shutdown()
+        self.command_manager.access_service.stop()
+        self.command_manager.console_broker.stop()
+        self.command_manager.ssh_transport.stop()
+        self.log_bridge.stop()
+        # close() 会等待后台写入线程把队列中的日志全部落盘
         self.logger.close()
         super().closeEvent(event)
 
@@ -0,0 +1,67 @@
+# benchmarks/line_assembler_bench.py
+"""终端输出行切分基准测试
+
+对比旧实现（每个分片都对整个 bytes 缓冲区重新解码、切分）与 LineAssembler 的吞吐量。
+
+用法: python benchmarks/line_assembler_bench.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.line_assembler import LineAssembler
+
+CHUNK_SIZE = 1024  # 与 pexpect 默认 maxread 接近
+
+
+class LegacySplitter:
+    """旧版 RawTerminalLogger 的缓冲区处理逻辑"""
+
+    def __init__(self):
+        self.buffer = b''
+
+    def feed(self, data_bytes):
+        self.buffer += data_bytes
+        decoded = self.buffer.decode('utf-8', errors='ignore')
+        lines = decoded.split('\n')
+        if not decoded.endswith('\n'):
+            self.buffer = lines[-1].encode('utf-8')
+            lines = lines[:-1]
+        else:
+            self.buffer = b''
+        return lines
+
+
+def make_workloads():
+    """生成测试数据"""
+    normal = ''.join(f"[{i:06d}] 正常日志行 status=ok value={i * 7}\n" for i in range(20000)).encode('utf-8')
+    progress = ''.join(f"\rProgress {i % 100:3d}% [{'#' * (i % 50):<50}]" for i in range(2000)).encode('utf-8')
+    binary = bytes((i * 37) % 256 for i in range(512 * 1024)).replace(b'\n', b'.')
+    return {
+        "普通日志": normal,
+        "无换行进度条": progress,
+        "二进制转储": binary,
+    }
+
+
+def run(splitter, data):
+    start = time.perf_counter()
+    count = 0
+    for offset in range(0, len(data), CHUNK_SIZE):
+        count += len(splitter.feed(data[offset:offset + CHUNK_SIZE]))
+    elapsed = time.perf_counter() - start
+    return len(data) / (1024 * 1024) / elapsed, count
+
+
+def main():
+    print(f"{'场景':<12}{'大小(KB)':>10}{'旧实现 MB/s':>14}{'新实现 MB/s':>14}{'加速比':>10}")
+    for name, data in make_workloads().items():
+        legacy_rate, _ = run(LegacySplitter(), data)
+        new_rate, _ = run(LineAssembler(), data)
+        print(f"{name:<12}{len(data) // 1024:>10}{legacy_rate:>14.2f}{new_rate:>14.2f}{new_rate / legacy_rate:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
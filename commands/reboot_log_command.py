@@ -1,10 +1,88 @@
-from utils.command_runner import CommandRunner
+from utils.command_runner import CommandRunner, serial_resource
+from utils.transfer_checkpoint import TransferCheckpoint
 from routes import reboot_log
 
 
 class RebootLogCommand(CommandRunner):
+    uses_console_broker = True
+    deadline = 3600
+
+    def __init__(self, logger):
+        super().__init__(logger)
+        self.fleet_mode = False
+        self.max_parallel = reboot_log.DEFAULT_FLEET_PARALLEL
+        self.pipelined = False
+        self.workflow = None
+        self.transfer_method = reboot_log.TRANSFER_SCP
+        self.transfer_streams = reboot_log.DEFAULT_STREAMS
+        self.resume_checkpoint = None
+        self.port = None
+
+    @property
+    def resources(self):
+        """指定了端口（或断点中记录了端口）时只占用该串口，自动选择端口和多设备模式占用全部串口"""
+        if self.resume_checkpoint:
+            try:
+                port = TransferCheckpoint.load(self.resume_checkpoint).context.get("port")
+            except (OSError, ValueError):
+                port = None
+        else:
+            port = None if self.fleet_mode else self.port
+        return (serial_resource(port),)
+
+    def set_port(self, port):
+        """单台设备模式下采集的端口号，传入 None 由 nanocom 自动选择"""
+        self.port = port
+
+    def set_fleet_mode(self, enabled, max_parallel=None):
+        """多设备模式: 并行采集所有 chimp 端口"""
+        self.fleet_mode = enabled
+        if max_parallel:
+            self.max_parallel = max_parallel
+
+    def set_pipelined(self, enabled):
+        """边采集边传输"""
+        self.pipelined = enabled
+
+    def set_transfer_method(self, method, streams=None):
+        """主机端传输方式: reboot_log.TRANSFER_METHODS 之一；streams 为多流并行时的流数"""
+        self.transfer_method = method
+        if streams:
+            self.transfer_streams = streams
+
+    def set_resume(self, checkpoint_path):
+        """下一次执行时按断点文件继续未完成的采集（只执行一次）"""
+        self.resume_checkpoint = checkpoint_path
+
+    def set_workflow(self, workflow):
+        """按工作流文件采集，传入 None 恢复内置流程"""
+        self.workflow = workflow
+
     def execute(self):
-        collector = reboot_log.RebootLogCollector()
+        if self.resume_checkpoint:
+            checkpoint, self.resume_checkpoint = self.resume_checkpoint, None
+            collector = reboot_log.RebootLogCollector(method=self.transfer_method, streams=self.transfer_streams,
+                                                      resume=checkpoint)
+            collector.set_logger(self.logger)
+            collector.set_cancel_token(self.cancel_token)
+            collector.set_console_broker(self.console_broker)
+            collector.set_ssh_transport(self.ssh_transport)
+            return collector.main()
+
+        if self.fleet_mode:
+            fleet = reboot_log.RebootLogFleet(self.logger, self.cancel_token, self.max_parallel,
+                                              getattr(self.logger, 'session_path', None), self.pipelined,
+                                              self.workflow, self.transfer_method,
+                                              self.transfer_streams)
+            fleet.set_console_broker(self.console_broker)
+            fleet.set_ssh_transport(self.ssh_transport)
+            return fleet.run()
+
+        collector = reboot_log.RebootLogCollector(port=self.port, pipelined=self.pipelined,
+                                                  workflow=self.workflow, method=self.transfer_method, streams=self.transfer_streams)
         # 将统一的logger传递给collector
         collector.set_logger(self.logger)
+        collector.set_cancel_token(self.cancel_token)
+        collector.set_console_broker(self.console_broker)
+        collector.set_ssh_transport(self.ssh_transport)
         return collector.main()
\ No newline at end of file
@@ -19,7 +19,8 @@ class ScoutConfigManager(QObject):
 
     def show_dialog(self):
         """在主线程中显示对话框"""
-        from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QMessageBox
+        from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QMessageBox,
+                                     QFileDialog, QSpinBox)
 
         class ScoutConfigDialog(QDialog):
             def __init__(self, parent=None):
@@ -32,6 +33,8 @@ class ScoutConfigManager(QObject):
                 self.station = ""
                 self.user_path = ""
                 self.target_timestamp = ""
+                self.batch_file = ""
+                self.max_parallel = scout_insight.DEFAULT_BATCH_PARALLEL
 
                 self.init_ui()
 
@@ -70,6 +73,25 @@ class ScoutConfigManager(QObject):
                 timestamp_layout.addWidget(self.timestamp_input)
                 layout.addLayout(timestamp_layout)
 
+                # 批量文件（填写后忽略上面的单条配置）
+                batch_layout = QHBoxLayout()
+                batch_layout.addWidget(QLabel("批量文件:"))
+                self.batch_input = QLineEdit()
+                self.batch_input.setPlaceholderText("CSV/JSON，填写后忽略上面的单条配置")
+                batch_layout.addWidget(self.batch_input)
+                batch_browse_button = QPushButton("浏览")
+                batch_browse_button.clicked.connect(self.browse_batch_file)
+                batch_layout.addWidget(batch_browse_button)
+                layout.addLayout(batch_layout)
+
+                parallel_layout = QHBoxLayout()
+                parallel_layout.addWidget(QLabel("批量并行数:"))
+                self.parallel_spin = QSpinBox()
+                self.parallel_spin.setRange(1, 16)
+                self.parallel_spin.setValue(self.max_parallel)
+                parallel_layout.addWidget(self.parallel_spin)
+                layout.addLayout(parallel_layout)
+
                 # 按钮布局
                 button_layout = QHBoxLayout()
 
@@ -84,8 +106,30 @@ class ScoutConfigManager(QObject):
                 layout.addLayout(button_layout)
                 self.setLayout(layout)
 
+            def browse_batch_file(self):
+                """浏览批量任务文件"""
+                file_path, _ = QFileDialog.getOpenFileName(
+                    self, "选择批量任务文件", "", "Batch Files (*.csv *.json);;All Files (*)"
+                )
+                if file_path:
+                    self.batch_input.setText(file_path)
+
             def accept_config(self):
                 """接受配置并验证"""
+                self.batch_file = self.batch_input.text().strip()
+                self.max_parallel = self.parallel_spin.value()
+                if self.batch_file:
+                    try:
+                        items = scout_insight.load_batch_file(self.batch_file)
+                    except Exception as e:
+                        QMessageBox.warning(self, "批量文件错误", str(e))
+                        return
+                    if not items:
+                        QMessageBox.warning(self, "批量文件错误", "批量文件中没有任务")
+                        return
+                    self.accept()
+                    return
+
                 self.sn = self.sn_input.text().strip()
                 self.station = self.station_input.text().strip()
                 self.user_path = self.path_input.text().strip()
@@ -104,7 +148,13 @@ class ScoutConfigManager(QObject):
                 self.accept()
 
         self.dialog = ScoutConfigDialog()
-        if self.dialog.exec_() == QDialog.Accepted:
+        if self.dialog.exec_() == QDialog.Accepted and self.dialog.batch_file:
+            self.config = {
+                'batch_file': self.dialog.batch_file,
+                'max_parallel': self.dialog.max_parallel
+            }
+            self.config_received.emit(self.config)
+        elif self.dialog.result() == QDialog.Accepted:
             self.config = {
                 'sn': self.dialog.sn,
                 'station': self.dialog.station,
@@ -118,6 +168,15 @@ class ScoutConfigManager(QObject):
 
 
 class ScoutInsightCommand(CommandRunner):
+    # scout 的检查依据 "Account" 是否出现在输出中，未经真实输出验证，只作提示
+    required_access = ("appleconnect",)
+    advisory_access = ("scout",)
+
+    @property
+    def deadline(self):
+        """单条下载 15 分钟；批量下载的耗时取决于任务数，不设截止时间"""
+        return None if self.config and self.config.get('batch_file') else 900
+
     def __init__(self, logger=None):
         super().__init__(logger)
         self.config = None
@@ -160,6 +219,9 @@ class ScoutInsightCommand(CommandRunner):
             self.logger.log("错误", "请先通过设置按钮配置 Scout Insight 参数")
             return False
 
+        if self.config.get('batch_file'):
+            return self.execute_batch()
+
         self.logger.log("系统", "开始执行 Scout Insight 下载")
         self.logger.log("程序输出", f"设备序列号: {self.config['sn']}")
         self.logger.log("程序输出", f"站点名称: {self.config['station']}")
@@ -169,6 +231,8 @@ class ScoutInsightCommand(CommandRunner):
         try:
             # 创建scout自动化实例
             automation = scout_insight.ScoutAutomation(self.logger)
+            automation.set_cancel_token(self.cancel_token)
+            automation.set_access_service(self.access_service)
             success = automation.run_automated_download(
                 sn=self.config['sn'],
                 station=self.config['station'],
@@ -187,6 +251,29 @@ class ScoutInsightCommand(CommandRunner):
             self.logger.log("错误", f"Scout Insight 执行异常: {e}")
             return False
 
+    def execute_batch(self):
+        """按批量文件并发下载，已记录在台账中的任务会被跳过"""
+        batch_file = self.config['batch_file']
+        ledger_path = scout_insight.default_ledger_path(batch_file)
+        self.logger.log("系统", f"开始执行 Scout Insight 批量下载: {batch_file}")
+        self.logger.log("程序输出", f"台账文件: {ledger_path}")
+
+        try:
+            config_list = scout_insight.load_batch_file(batch_file)
+            results = scout_insight.batch_download_scout_logs(
+                config_list,
+                self.logger,
+                max_parallel=self.config.get('max_parallel', scout_insight.DEFAULT_BATCH_PARALLEL),
+                ledger_path=ledger_path,
+                cancel_token=self.cancel_token,
+                access_service=self.access_service
+            )
+            return results['failed'] == 0
+
+        except Exception as e:
+            self.logger.log("错误", f"Scout Insight 批量下载异常: {e}")
+            return False
+
     def set_config(self, config):
         """设置配置（从主线程调用）"""
         self.config = config
\ No newline at end of file
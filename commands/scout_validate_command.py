@@ -3,7 +3,7 @@ from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel,
                              QLineEdit, QPushButton, QSpinBox, QFileDialog,
                              QGroupBox, QFormLayout)
 from PyQt5.QtCore import pyqtSignal, QObject
-from utils.command_runner import CommandRunner
+from utils.command_runner import CommandRunner, serial_resource
 from routes import scout_validate
 import json
 from pathlib import Path
@@ -71,6 +71,19 @@ class ScoutValidateConfigManager(QObject):
                 config_group.setLayout(config_layout)
                 layout.addWidget(config_group)
 
+                # 执行方式设置组
+                run_group = QGroupBox("执行方式")
+                run_layout = QFormLayout()
+
+                self.parallel_spin = QSpinBox()
+                self.parallel_spin.setRange(1, 16)
+                self.parallel_spin.setValue(1)
+                self.parallel_spin.setToolTip("非交互式命令同时执行的数量，1 表示串行；交互式命令始终串行执行")
+                run_layout.addRow("并行数:", self.parallel_spin)
+
+                run_group.setLayout(run_layout)
+                layout.addWidget(run_group)
+
                 # 按钮组
                 button_layout = QHBoxLayout()
                 ok_btn = QPushButton("确定")
@@ -111,7 +124,8 @@ class ScoutValidateConfigManager(QObject):
                 return {
                     'radar_id': self.radar_edit.text().strip(),
                     'subprocess_config': self.subprocess_edit.text(),
-                    'pexpect_config': self.pexpect_edit.text()
+                    'pexpect_config': self.pexpect_edit.text(),
+                    'parallel_workers': self.parallel_spin.value()
                 }
 
         self.dialog = ScoutValidateConfigDialog()
@@ -124,6 +138,12 @@ class ScoutValidateConfigManager(QObject):
 
 
 class ScoutValidateCommand(CommandRunner):
+    # 交互式命令会选择串口设备，且每条命令都依赖全局的 /tmp/scout
+    resources = (serial_resource(), "/tmp/scout")
+    # scout 的检查依据 "Account" 是否出现在输出中，未经真实输出验证，只作提示
+    required_access = ("appleconnect",)
+    advisory_access = ("scout",)
+
     def __init__(self, logger=None):
         super().__init__(logger)
         self.config = None
@@ -132,6 +152,7 @@ class ScoutValidateCommand(CommandRunner):
         self.subprocess_config = None
         self.pexpect_config = None
         self.radar_id = "163084325"  # 默认雷达号
+        self.parallel_workers = 1
 
     def get_config_from_dialog(self):
         """通过配置管理器获取配置"""
@@ -151,6 +172,7 @@ class ScoutValidateCommand(CommandRunner):
             self.radar_id = config.get('radar_id', "163084325")
             self.subprocess_config = config.get('subprocess_config')
             self.pexpect_config = config.get('pexpect_config')
+            self.parallel_workers = config.get('parallel_workers', 1)
 
     def set_timeout(self, timeout):
         """设置超时时间"""
@@ -169,6 +191,7 @@ class ScoutValidateCommand(CommandRunner):
             self.radar_id = config.get('radar_id', "163084325")
             self.subprocess_config = config.get('subprocess_config')
             self.pexpect_config = config.get('pexpect_config')
+            self.parallel_workers = config.get('parallel_workers', 1)
             self.config = config
 
     def execute(self):
@@ -183,10 +206,14 @@ class ScoutValidateCommand(CommandRunner):
             self.logger.log("程序输出", f"非交互式配置文件: {self.subprocess_config}")
         if self.pexpect_config:
             self.logger.log("程序输出", f"交互式配置文件: {self.pexpect_config}")
+        if self.parallel_workers > 1:
+            self.logger.log("程序输出", f"非交互式命令并行数: {self.parallel_workers}")
 
         try:
             scouter = scout_validate.ScoutValidate()
             scouter.set_logger(self.logger)
+            scouter.set_cancel_token(self.cancel_token)
+            scouter.set_parallel_workers(self.parallel_workers)
 
             # 如果有自定义配置文件路径，传递给 ScoutValidate
             if hasattr(scouter, 'set_config_paths') and self.subprocess_config and self.pexpect_config:
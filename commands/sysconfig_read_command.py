@@ -1,7 +1,20 @@
-from utils.command_runner import CommandRunner
+from utils.command_runner import CommandRunner, serial_resource
 
 
 class NanocomCommand(CommandRunner):
+    # nanocom 自动选择端口，执行前不知道会用哪个串口
+    resources = (serial_resource(),)
+    uses_console_broker = True
+    deadline = 600
+
+    def __init__(self, logger):
+        super().__init__(logger)
+        self.workflow = None
+
+    def set_workflow(self, workflow):
+        """按工作流文件执行命令，传入 None 恢复内置命令列表"""
+        self.workflow = workflow
+
     def execute(self):
         # 从 routes 包中导入 sys_read
         from routes.sysconfig_read import sys_read
@@ -9,4 +22,7 @@ class NanocomCommand(CommandRunner):
         sys_reader = sys_read()
         # 将统一的logger传递给sys_reader
         sys_reader.set_logger(self.logger)
+        sys_reader.set_cancel_token(self.cancel_token)
+        sys_reader.set_workflow(self.workflow)
+        sys_reader.set_console_broker(self.console_broker)
         return sys_reader.main()
\ No newline at end of file
@@ -1,10 +1,15 @@
 # core/command_manager.py
+from pathlib import Path
+
 from PyQt5.QtCore import QObject, pyqtSignal
 # from commands.nanocom_command import NanocomCommand
 from commands.reboot_log_command import RebootLogCommand
 from commands.scout_validate_command import ScoutValidateCommand
 from commands.scout_insight_command import ScoutInsightCommand, ScoutConfigManager
 from commands.sysconfig_read_command import NanocomCommand
+from utils.access_state import AccessStateService
+from utils.console_broker import ConsoleBroker
+from utils.ssh_transport import SshTransport
 
 
 class CommandManager(QObject):
@@ -12,14 +17,22 @@ class CommandManager(QObject):
 
     # 信号定义
     log_signal = pyqtSignal(str, str)  # level, message
-    command_started = pyqtSignal(str)  # command_name
-    command_finished = pyqtSignal(str)  # command_name
 
     def __init__(self, logger, session_path):
         super().__init__()
         self.logger = logger
         self.session_path = session_path
         self.commands = {}
+        # 启动时在后台预热 AppleConnect / scout 访问检查
+        self.access_service = AccessStateService(logger)
+        self.access_service.start()
+        # 串口命令之间复用已登录的 nanocom 会话
+        self.console_broker = ConsoleBroker(logger)
+        self.console_broker.start()
+        # 每台设备一个复用的 SSH 主连接，主机密钥记录在会话目录中
+        known_hosts = Path(session_path) / "ssh" / "known_hosts" if session_path else None
+        self.ssh_transport = SshTransport(known_hosts, logger)
+        self.ssh_transport.start()
         self.setup_commands()
 
     def setup_commands(self):
@@ -35,6 +48,9 @@ class CommandManager(QObject):
         for command_name, command in self.commands.items():
             if hasattr(command, 'set_session_path'):
                 command.set_session_path(self.session_path)
+            command.set_access_service(self.access_service)
+            command.set_console_broker(self.console_broker)
+            command.set_ssh_transport(self.ssh_transport)
 
     def get_command(self, command_name):
         """获取命令实例"""
@@ -73,8 +89,29 @@ class CommandManager(QObject):
         if ok and hasattr(self.commands["nanocom"], 'set_baud_rate'):
             self.commands["nanocom"].set_baud_rate(baud_rate)
             self.log_signal.emit("程序输出", f"Nanocom 波特率设置为: {baud_rate}")
-            return True
-        return False
+        if not ok:
+            return False
+
+        command = self.commands["nanocom"]
+        sources = ["内置命令列表", "工作流文件"]
+        source, ok = QInputDialog.getItem(
+            parent, "配置 Nanocom", "选择执行的命令:", sources, 1 if command.workflow else 0, False
+        )
+        if not ok:
+            return False
+        workflow = None
+        if source == sources[1]:
+            from PyQt5.QtWidgets import QFileDialog
+            from routes.sysconfig_read import DEFAULT_WORKFLOW
+            workflow, _ = QFileDialog.getOpenFileName(
+                parent, "选择工作流文件", command.workflow or DEFAULT_WORKFLOW,
+                "JSON Files (*.json);;All Files (*)"
+            )
+            if not workflow:
+                return False
+        command.set_workflow(workflow)
+        self.log_signal.emit("程序输出", f"Nanocom 执行的命令设置为: {source}" + (f" ({workflow})" if workflow else ""))
+        return True
 
     def _configure_reboot_log(self, parent):
         """配置 Reboot Log"""
@@ -83,11 +120,83 @@ class CommandManager(QObject):
             parent, "配置 Reboot Log", "选择日志级别:",
             ["DEBUG", "INFO", "WARNING", "ERROR"], 1, False
         )
-        if ok and hasattr(self.commands["reboot_log"], 'set_log_level'):
-            self.commands["reboot_log"].set_log_level(log_level)
-            self.log_signal.emit("程序输出", f"Reboot Log 日志级别设置为: {log_level}")
+        if not ok:
+            return False
+
+        # 按命令设置阈值，低于该级别的日志在记录时直接丢弃
+        self.logger.set_command_level("reboot_log", log_level)
+        self.log_signal.emit("程序输出", f"Reboot Log 日志级别设置为: {log_level}")
+
+        command = self.commands["reboot_log"]
+        modes = ["单台设备", "全部端口（并行）", "继续未完成的采集"]
+        mode, ok = QInputDialog.getItem(
+            parent, "配置 Reboot Log", "选择采集模式:", modes, 1 if command.fleet_mode else 0, False
+        )
+        if ok and mode == modes[2]:
+            from PyQt5.QtWidgets import QFileDialog
+            from utils.transfer_checkpoint import CHECKPOINT_PREFIX
+            # 断点在之前会话的目录中，从当天的日志目录开始选择
+            start_dir = str(Path(self.session_path).parent) if self.session_path else ""
+            checkpoint, _ = QFileDialog.getOpenFileName(
+                parent, "选择传输断点文件", start_dir, f"Checkpoint Files ({CHECKPOINT_PREFIX}*.json);;All Files (*)"
+            )
+            if checkpoint:
+                command.set_resume(checkpoint)
+                self.log_signal.emit("程序输出", f"下次运行 Reboot Log 时将继续未完成的采集: {checkpoint}")
             return True
-        return False
+        if ok:
+            command.set_fleet_mode(mode == modes[1])
+            self.log_signal.emit("程序输出", f"Reboot Log 采集模式设置为: {mode}")
+        if ok and mode == modes[0]:
+            # 指定端口后，不同端口的采集任务可以同时运行
+            port, ok = QInputDialog.getText(
+                parent, "配置 Reboot Log", "串口端口号（留空自动选择）:", text=command.port or ""
+            )
+            if ok:
+                command.set_port(port.strip() or None)
+                self.log_signal.emit("程序输出", f"Reboot Log 采集端口设置为: {port.strip() or '自动选择'}")
+
+        transfer_modes = ["采集完成后统一传输", "边采集边传输", "按工作流文件"]
+        current = 2 if command.workflow else 1 if command.pipelined else 0
+        transfer_mode, ok = QInputDialog.getItem(
+            parent, "配置 Reboot Log", "选择传输方式:", transfer_modes, current, False
+        )
+        if ok:
+            workflow = None
+            if transfer_mode == transfer_modes[2]:
+                from PyQt5.QtWidgets import QFileDialog
+                from routes.reboot_log import DEFAULT_WORKFLOW
+                workflow, _ = QFileDialog.getOpenFileName(
+                    parent, "选择工作流文件", str(command.workflow or DEFAULT_WORKFLOW),
+                    "JSON Files (*.json);;All Files (*)"
+                )
+                if not workflow:
+                    return True
+            command.set_pipelined(transfer_mode == transfer_modes[1])
+            command.set_workflow(workflow)
+            self.log_signal.emit("程序输出", f"Reboot Log 传输方式设置为: {transfer_mode}"
+                                           + (f" ({workflow})" if workflow else ""))
+
+        from routes.reboot_log import TRANSFER_METHODS, TRANSFER_PARALLEL
+        from utils.parallel_transfer import MAX_STREAMS
+        sync_modes = ["完整复制", "增量同步（只传输变化的文件）", "流式归档（打包压缩后传输）", "多流并行（大文件分块）"]
+        sync_mode, ok = QInputDialog.getItem(
+            parent, "配置 Reboot Log", "选择传输内容:", sync_modes,
+            TRANSFER_METHODS.index(command.transfer_method), False
+        )
+        if ok:
+            method = TRANSFER_METHODS[sync_modes.index(sync_mode)]
+            streams = None
+            if method == TRANSFER_PARALLEL:
+                streams, ok = QInputDialog.getInt(
+                    parent, "配置 Reboot Log", "并行传输流数:", command.transfer_streams, 1, MAX_STREAMS, 1
+                )
+                if not ok:
+                    return True
+                sync_mode += f"，{streams} 个流"
+            command.set_transfer_method(method, streams)
+            self.log_signal.emit("程序输出", f"Reboot Log 传输内容设置为: {sync_mode}")
+        return True
 
     def _configure_scout_validate(self, parent):
         """配置 Scout Validate - 委托给命令类处理"""
@@ -0,0 +1,230 @@
+# core/job_scheduler.py
+import heapq
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from utils.cancellation import CancellationToken
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+STATE_NAMES = {
+    QUEUED: "排队中",
+    RUNNING: "运行中",
+    FINISHED: "已完成",
+    FAILED: "失败",
+    CANCELLED: "已取消",
+}
+
+# 优先级，数值越小越先执行
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+DEFAULT_MAX_WORKERS = 4
+HISTORY_LIMIT = 200
+
+
+def resources_conflict(resources, held):
+    """resources 中是否有资源已被占用；"<类别>:*" 与同类别的所有资源互斥（例如 serial:* 与 serial:3）"""
+    for resource in resources:
+        if resource in held:
+            return True
+        kind, separator, name = resource.partition(":")
+        if not separator:
+            continue
+        if name == "*":
+            if any(other.startswith(f"{kind}:") for other in held):
+                return True
+        elif f"{kind}:*" in held:
+            return True
+    return False
+
+
+class Job:
+    """调度任务"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, command_name, command, priority=PRIORITY_NORMAL, resources=()):
+        self.id = next(self._ids)
+        self.command_name = command_name
+        self.command = command
+        self.priority = priority
+        # 同一个命令实例不能并发执行，命令名本身也作为独占资源
+        self.resources = frozenset(resources) | {f"command:{command_name}"}
+        self.state = QUEUED
+        # 命令声明了 deadline 时，从开始运行起计时
+        self.deadline = getattr(command, 'deadline', None)
+        self.cancel_token = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def duration(self):
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+    def describe(self):
+        text = f"#{self.id} {self.command_name} [{STATE_NAMES.get(self.state, self.state)}]"
+        if self.duration is not None:
+            text += f" {self.duration:.0f}s"
+        return text
+
+
+class JobScheduler(QObject):
+    """任务调度器 - 有界工作线程池 + 优先级队列 + 资源独占
+
+    - 所有点击都进入队列，按 (优先级, 提交顺序) 出队
+    - 同时运行的任务数不超过 max_workers
+    - 任务声明的资源（如 "serial:3"、"/tmp/scout"）同一时刻只能被一个任务占用，
+      "serial:*" 占用全部串口；资源被占用的任务留在队列中，不阻塞后面可以运行的任务
+    - 调度状态只在 GUI 线程中修改，工作线程通过信号回报完成
+    - 运行中的任务通过 CancellationToken 协作取消，命令的 deadline 到期同样按取消处理
+    """
+
+    job_queued = pyqtSignal(object)  # Job
+    job_started = pyqtSignal(object)  # Job
+    job_finished = pyqtSignal(object)  # Job
+    _job_done = pyqtSignal(object)  # Job，工作线程 -> GUI 线程
+
+    def __init__(self, logger, max_workers=DEFAULT_MAX_WORKERS, parent=None):
+        super().__init__(parent)
+        self.logger = logger
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="atc-job")
+        self._queue = []  # heap: (priority, seq, job)
+        self._seq = itertools.count()
+        self._held_resources = set()
+        self.running = {}
+        self.history = []
+        self._job_done.connect(self._on_job_done)
+
+    def submit(self, command_name, command, priority=PRIORITY_NORMAL, resources=None):
+        """提交任务，返回 Job"""
+        if resources is None:
+            resources = getattr(command, 'resources', ())
+        job = Job(command_name, command, priority, resources)
+        heapq.heappush(self._queue, (priority, next(self._seq), job))
+        self.job_queued.emit(job)
+        if self.logger:
+            self.logger.log("系统", f"任务已加入队列: {job.describe()}")
+        self._dispatch()
+        return job
+
+    def queued_jobs(self):
+        return [job for _, _, job in sorted(self._queue)]
+
+    def running_jobs(self):
+        return list(self.running.values())
+
+    def finished_jobs(self):
+        return list(self.history)
+
+    def _dispatch(self):
+        """启动所有可以运行的任务"""
+        if len(self.running) >= self.max_workers or not self._queue:
+            return
+
+        waiting = []
+        while self._queue and len(self.running) < self.max_workers:
+            entry = heapq.heappop(self._queue)
+            job = entry[2]
+            if resources_conflict(job.resources, self._held_resources):
+                waiting.append(entry)
+                continue
+            self._start(job)
+
+        for entry in waiting:
+            heapq.heappush(self._queue, entry)
+
+    def cancel(self, job_id):
+        """取消任务: 排队中的直接移出队列，运行中的发出取消请求"""
+        for index, entry in enumerate(self._queue):
+            job = entry[2]
+            if job.id == job_id:
+                self._queue.pop(index)
+                heapq.heapify(self._queue)
+                job.state = CANCELLED
+                job.finished_at = time.time()
+                self._record(job)
+                self.job_finished.emit(job)
+                if self.logger:
+                    self.logger.log("警告", f"已取消排队任务: {job.describe()}")
+                return True
+
+        job = self.running.get(job_id)
+        if job and job.cancel_token:
+            job.cancel_token.cancel()
+            if self.logger:
+                self.logger.log("警告", f"正在取消任务: {job.describe()}")
+            return True
+        return False
+
+    def cancel_command(self, command_name):
+        """取消某个命令的所有排队和运行中的任务，返回取消的数量"""
+        job_ids = [job.id for _, _, job in self._queue if job.command_name == command_name]
+        job_ids += [job.id for job in self.running.values() if job.command_name == command_name]
+        return sum(1 for job_id in job_ids if self.cancel(job_id))
+
+    def _start(self, job):
+        job.state = RUNNING
+        job.started_at = time.time()
+        job.cancel_token = CancellationToken(job.deadline)
+        self._held_resources |= job.resources
+        self.running[job.id] = job
+        self.job_started.emit(job)
+        self._pool.submit(self._run_job, job)
+
+    def _run_job(self, job):
+        """在工作线程中执行命令"""
+        try:
+            logger = job.command.logger
+            if logger and hasattr(logger, 'command_context'):
+                with logger.command_context(job.command_name):
+                    job.result = job.command.run_with_error_handling(job.command.__class__.__name__,
+                                                                     job.cancel_token)
+            else:
+                job.result = job.command.run_with_error_handling(job.command.__class__.__name__,
+                                                                 job.cancel_token)
+            if job.cancel_token.cancelled:
+                job.state = CANCELLED
+            else:
+                job.state = FINISHED if job.result is not False else FAILED
+        except Exception as e:
+            job.error = e
+            job.state = FAILED
+        finally:
+            job.finished_at = time.time()
+            self._job_done.emit(job)
+
+    def _on_job_done(self, job):
+        """GUI 线程: 释放资源并调度下一个任务"""
+        self.running.pop(job.id, None)
+        self._held_resources -= job.resources
+        self._record(job)
+        self.job_finished.emit(job)
+        self._dispatch()
+
+    def _record(self, job):
+        self.history.append(job)
+        del self.history[:-HISTORY_LIMIT]
+
+    def shutdown(self, wait=False):
+        """停止接受新任务，并取消运行中的任务"""
+        self._queue.clear()
+        for job in self.running.values():
+            if job.cancel_token:
+                job.cancel_token.cancel("程序退出")
+        self._pool.shutdown(wait=wait)
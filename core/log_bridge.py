@@ -0,0 +1,105 @@
+# core/log_bridge.py
+import threading
+import time
+from collections import deque
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+
+class LogBridge(QObject):
+    """日志桥接器 - 在任意线程收集日志，按帧批量投递到 GUI 线程
+
+    - post() 可在任意线程调用，只做加锁入队，不产生跨线程 Qt 事件
+    - GUI 线程的 QTimer 每 interval_ms 取出一批，通过 batch_ready 一次性投递
+    - 连续重复的日志合并为一条；积压超过 max_pending 时丢弃最旧的记录
+    - 过载时每 report_interval 秒在界面上报告一次丢弃数量，未丢弃但积压超过 max_batch 时报告积压数量
+    - 合并/丢弃只影响界面显示，文件日志由 UnifiedLogger 完整保存
+    """
+
+    batch_ready = pyqtSignal(list)  # [(level, message), ...]
+
+    def __init__(self, interval_ms=40, max_batch=1000, max_pending=20000, report_interval=1.0, parent=None):
+        super().__init__(parent)
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.report_interval = report_interval
+
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self.coalesced_count = 0
+        self.dropped_count = 0
+        self._reported = (0, 0)
+        self._last_report = 0.0
+
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._deliver)
+        self._timer.start(interval_ms)
+
+    def post(self, level, message):
+        """收集一条日志（线程安全）"""
+        with self._lock:
+            pending = self._pending
+            if pending and pending[-1][0] == level and pending[-1][1] == message:
+                # 与上一条相同，合并计数
+                pending[-1][2] += 1
+                self.coalesced_count += 1
+                return
+
+            pending.append([level, message, 1])
+            if len(pending) > self.max_pending:
+                pending.popleft()
+                self.dropped_count += 1
+
+    def _take_batch(self):
+        """取出一批待显示的日志"""
+        with self._lock:
+            count = min(len(self._pending), self.max_batch)
+            items = [self._pending.popleft() for _ in range(count)]
+            backlog = len(self._pending)
+            stats = (self.coalesced_count, self.dropped_count)
+
+        batch = [
+            (level, message if repeat == 1 else f"{message} (重复 {repeat} 次)")
+            for level, message, repeat in items
+        ]
+
+        # 过载时定期在界面上报告: 有丢弃时报告合并/丢弃数量，否则积压超过一批时报告待显示数量
+        now = time.monotonic()
+        if now - self._last_report >= self.report_interval:
+            coalesced = stats[0] - self._reported[0]
+            dropped = stats[1] - self._reported[1]
+            warning = None
+            if dropped:
+                warning = f"界面日志过多: 已合并 {coalesced} 条, 丢弃 {dropped} 条 (文件日志完整保存)"
+            elif backlog > self.max_batch:
+                warning = f"界面日志积压: 还有 {backlog} 条待显示 (文件日志完整保存)"
+            if warning:
+                batch.append(("警告", warning))
+                self._last_report = now
+            self._reported = stats
+
+        return batch
+
+    def _deliver(self):
+        """定时器回调，在 GUI 线程中投递一批日志"""
+        batch = self._take_batch()
+        if batch:
+            self.batch_ready.emit(batch)
+
+    def stats(self):
+        """返回统计信息"""
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'coalesced': self.coalesced_count,
+                'dropped': self.dropped_count,
+            }
+
+    def stop(self):
+        """停止投递，并把剩余日志一次性投递出去"""
+        self._timer.stop()
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                break
+            self.batch_ready.emit(batch)
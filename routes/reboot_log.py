@@ -1,27 +1,127 @@
+import asyncio
+import json
 import re
 import time
 import pexpect
+from contextlib import nullcontext
+from datetime import datetime
 from pathlib import Path
 
+from utils import async_expect, cancellation
+from utils.archive_stream import ArchiveStream
+from utils.async_expect import AsyncSession
+from utils.console_broker import AUTO_PORT
+from utils.device_sync import MANIFEST_NAME, DeviceSync, write_manifest
+from utils.logger import TerminalLogger
+from utils.parallel_transfer import DEFAULT_STREAMS, ParallelTransfer
+from utils.ssh_transport import SshTransport
+from utils.transfer_checkpoint import TransferCheckpoint
+from utils.workflow import SUCCEEDED, WorkflowExecutor, load_workflow
+
+# 多设备模式下同时采集的最大设备数
+DEFAULT_FLEET_PARALLEL = 8
+
+# 默认工作流: 与“边采集边传输”相同的步骤，可复制后修改采集内容
+DEFAULT_WORKFLOW = Path(__file__).parent / "workflows" / "reboot_log.json"
+
+# 主机端传输方式: 完整 scp、增量同步、流式归档、多流并行
+TRANSFER_SCP = "scp"
+TRANSFER_SYNC = "sync"
+TRANSFER_STREAM = "stream"
+TRANSFER_PARALLEL = "parallel"
+TRANSFER_METHODS = (TRANSFER_SCP, TRANSFER_SYNC, TRANSFER_STREAM, TRANSFER_PARALLEL)
+# 传输失败后从断点重试的次数和间隔（秒）
+TRANSFER_RETRIES = 2
+RETRY_DELAY = 10
+
+# sysdiagnose 完成时输出的归档路径
+# 例: Output available at '/private/var/tmp/sysdiagnose_2024.01.01_12-00-00+0800_Mac_XXX.tar.gz'.
+SYSDIAGNOSE_OUTPUT_REGEX = r"Output available at:? '?(/\S+?\.tar\.gz)'?"
+# 没有从输出中得到归档路径时在设备上查找最新的归档
+SYSDIAGNOSE_LIST_COMMAND = "ls -t /var/tmp/sysdiagnose_*.tar.gz | head -1"
+SYSDIAGNOSE_ARCHIVE_REGEX = r"(/var/tmp/sysdiagnose_[^\s*]+\.tar\.gz)"
+
+# 串口步骤内部等待提示符的超时比步骤超时至少少这么多秒，由内部 expect 先超时并恢复串口，
+# 不与工作流的步骤超时（取消整个步骤）同时触发
+CONSOLE_STEP_MARGIN = 2
+# 辅助命令（test -e、test -f）等待提示符的超时
+CHECK_TIMEOUT = 5
+# 命令超时后发送 Ctrl+C，等待提示符的超时
+RECOVER_TIMEOUT = 10
+
+
+def find_all_ports(output_before):
+    """列出 nanocom 设备列表中所有可采集的端口，返回 [(编号, 设备路径), ...]
+
+    优先使用所有 C-line (-ch-0) 端口；没有时使用 S-line 'base' 端口，
+    规则与 sys_read.find_port_number 相同。
+    """
+    c_line_match = re.findall(r'Serial device \((\d+)\)\s*:\s*(/dev/cu\.chimp-\S+-ch-0)', output_before)
+    if c_line_match:
+        return c_line_match
+
+    port_map = dict(re.findall(r'Serial device \((\d+)\)\s*:\s*(\S+)', output_before))
+    port_paths = port_map.values()
+    return [
+        (number, path) for number, path in port_map.items()
+        if any(other.startswith(path + "-") for other in port_paths if other != path)
+    ]
+
 
 class RebootLogCollector:
-    def __init__(self):
+    def __init__(self, port=None, pipelined=False, workflow=None, method=TRANSFER_SCP, streams=DEFAULT_STREAMS,
+                 resume=None):
         self.host_desktop_path = Path.home() / "Desktop"
         self.child = None
         self.logger = None
         self.terminal_logger = None
         self.device_serial = None
+        self.cancel_token = None
+        # 指定端口时直接选择该端口（多设备模式），否则自动查找第一个 C-line 端口
+        self.port = port
+        # 边采集边传输: 每个日志在设备上准备好后立即开始 SCP，与 sysdiagnose 同时进行
+        self.pipelined = pipelined
+        # 工作流文件路径，设置后按文件中声明的步骤采集
+        self.workflow = workflow
+        # 传输方式（TRANSFER_METHODS）: 增量同步只传输与本地已有文件不同的文件；
+        # 流式归档把目录打包压缩后通过一个通道传输；多流并行用 streams 条连接同时传输，大文件分块；
+        # 这三种方式都只传输本次采集的内容，不再 scp -r 整个 /var/tmp
+        self.method = method
+        self.streams = streams
+        # 断点文件路径，设置后只继续其中未完成的传输，不执行设备端步骤
+        self.resume = resume
+        self.checkpoint = None
+        self.sync_results = []
+        self.sysdiagnose_archive = None
+        # 控制台会话代理和当前持有的会话
+        self.console_broker = None
+        self.console = None
+        # 已发送命令但还没等到提示符（超时或步骤被取消），下一条命令前需要先中断
+        self.console_busy = False
+        # SSH 传输层；未设置时在需要传输时创建本次采集专用的
+        self.ssh = None
+        self._own_ssh = None
 
     def set_logger(self, logger):
         self.logger = logger
         if logger:
             self.terminal_logger = logger.get_terminal_logger()
 
-    def log(self, level, message):
+    def set_cancel_token(self, cancel_token):
+        """设置取消令牌"""
+        self.cancel_token = cancel_token
+
+    def log(self, level, message, *args):
+        """args 非空时按 message % args 延迟格式化，端口前缀也作为参数传入"""
+        if self.port:
+            if args:
+                message, args = "[端口 %s] " + message, (self.port,) + args
+            else:
+                message = f"[端口 {self.port}] {message}"
         if self.logger:
-            self.logger.log(level, message)
+            self.logger.log(level, message, *args)
         else:
-            print(f"[{level}] {message}")
+            print(f"[{level}] {message % args if args else message}")
 
     def log_terminal_send(self, data):
         """记录发送到终端的数据"""
@@ -49,7 +149,7 @@ class RebootLogCollector:
             return [patterns]
         return list(patterns)
 
-    def expect_with_logging(self, patterns, timeout=None):
+    async def expect_with_logging(self, patterns, timeout=None):
         """带日志记录的expect方法，增加对quote>状态的检测"""
         # 确保模式是列表形式
         pattern_list = self._ensure_pattern_list(patterns)
@@ -59,7 +159,7 @@ class RebootLogCollector:
 
         self.log_terminal_expect(full_patterns)
         try:
-            result = self.child.expect(full_patterns, timeout=timeout)
+            result = await self.child.expect(full_patterns, timeout)
 
             # 记录匹配到的内容
             if self.child.before:
@@ -71,9 +171,9 @@ class RebootLogCollector:
             if result == len(full_patterns) - 1:  # quote>是最后一个模式
                 self.log("警告", "检测到 quote> 状态，发送 Ctrl+C 退出")
                 self.child.sendintr()  # 发送 Ctrl+C
-                time.sleep(0.5)
+                await async_expect.sleep(0.5, self.cancel_token)
                 # 重新尝试期望的模式
-                result = self.child.expect(pattern_list, timeout=timeout)
+                result = await self.child.expect(pattern_list, timeout)
 
             return result
 
@@ -83,7 +183,7 @@ class RebootLogCollector:
                 self.log_terminal_receive(self.child.before)
             raise
         except Exception as e:
-            self.log("错误", f"expect操作异常: {e}")
+            self.log("错误", "expect操作异常: %s", e)
             if self.child.before:
                 self.log_terminal_receive(self.child.before)
             raise
@@ -93,14 +193,14 @@ class RebootLogCollector:
         self.log_terminal_send(data + "\n")
         self.child.sendline(data)
 
-    def get_device_serial_number(self) -> str:
+    async def get_device_serial_number(self) -> str:
         """获取设备序列号"""
         if not self.child:
             return "unknown_device"
 
         self.log("程序输出", "正在获取设备序列号...")
         self.sendline_with_logging("sysconfig read -a")
-        self.expect_with_logging(["local@locals-Mac"], timeout=5)
+        await self.expect_with_logging(["local@locals-Mac"], timeout=5)
         response = self.child.before.decode()
 
         # 提取序列号
@@ -112,7 +212,7 @@ class RebootLogCollector:
                 return sn
 
         self.log("警告", "无法获取设备序列号，使用默认名称")
-        return "unknown_device"
+        return f"unknown_device_port{self.port}" if self.port else "unknown_device"
 
     def find_port_number(self, output_before):
         """获取端口"""
@@ -125,25 +225,76 @@ class RebootLogCollector:
             self.log("错误", "未找到合适的端口")
             return None
 
-    def auto_login_via_nanocom(self) -> bool:
+    def set_console_broker(self, console_broker):
+        """设置控制台会话代理，设置后复用已登录的 nanocom 会话"""
+        self.console_broker = console_broker
+
+    async def auto_login_via_nanocom(self) -> bool:
+        """取得已登录的设备控制台并读取序列号
+
+        有会话代理时优先复用该端口已登录的会话，否则启动 nanocom 登录。
+        """
+        if self.console_broker:
+            self.console = await self.console_broker.acquire(self.port or AUTO_PORT, self._connect_for_broker,
+                                                             self.cancel_token)
+            if self.console is None:
+                return False
+            self.child = self.console.session
+        elif not await self.connect_nanocom():
+            return False
+
+        self.device_serial = await self.get_device_serial_number()
+        self.open_checkpoint()
+        return True
+
+    def open_checkpoint(self):
+        """开始新的采集时创建断点: 会话目录中每台设备一个，保留之前记录的文件进度"""
+        if self.checkpoint is not None:
+            return
+        session_path = getattr(self.logger, 'session_path', None)
+        folder = session_path or self.host_desktop_path / self.device_serial
+        try:
+            self.checkpoint = TransferCheckpoint.for_device(folder, self.device_serial)
+            self.checkpoint.start_collection(
+                serial=self.device_serial, port=self.port, method=self.method, streams=self.streams,
+                host_folder=str(self.host_desktop_path / self.device_serial),
+            )
+        except (OSError, ValueError) as e:
+            self.checkpoint = None
+            self.log("警告", f"创建传输断点失败，传输中断后无法继续: {e}")
+
+    def update_checkpoint(self, **values):
+        if self.checkpoint:
+            self.checkpoint.update_context(**values)
+
+    async def _connect_for_broker(self):
+        """会话代理没有可用会话时调用: 登录成功返回会话，失败时关闭并返回 None"""
+        if await self.connect_nanocom():
+            return self.child
+        if self.child:
+            await self.child.aclose()
+            self.child = None
+        return None
+
+    async def connect_nanocom(self) -> bool:
         """通过nanocom自动登录设备"""
         self.log("程序输出", "开始通过nanocom连接设备...")
 
         try:
             # 启动nanocom并自动选择端口
-            self.child = pexpect.spawn('/usr/local/bin/nanocom -y')
+            self.child = AsyncSession('/usr/local/bin/nanocom -y', cancel_token=self.cancel_token)
             # 记录初始输出
             if self.child.before:
                 self.log_terminal_receive(self.child.before)
 
-            expect_result = self.expect_with_logging(
+            expect_result = await self.expect_with_logging(
                 [pexpect.TIMEOUT, "Select a device by its number"],
                 timeout=5
             )
 
             if expect_result == 1:
                 output_before = self.child.before.decode('utf-8', 'ignore')
-                port = self.find_port_number(output_before)
+                port = self.port or self.find_port_number(output_before)
 
                 if port is None:
                     self.log("错误", "未找到可用的串口设备")
@@ -152,10 +303,10 @@ class RebootLogCollector:
                 start_time = time.time()
                 while time.time() - start_time <= 2:
                     self.sendline_with_logging("")
-                    time.sleep(1)
+                    await async_expect.sleep(1, self.cancel_token)
 
             # 等待登录提示
-            expect_result = self.expect_with_logging(
+            expect_result = await self.expect_with_logging(
                 [pexpect.TIMEOUT, "login:", "local@locals-Mac"], timeout=30
             )
 
@@ -164,17 +315,14 @@ class RebootLogCollector:
                 self.sendline_with_logging("local")
 
                 # 检查是否需要密码
-                auth_result = self.expect_with_logging([pexpect.TIMEOUT, "Password:"], timeout=5)
+                auth_result = await self.expect_with_logging([pexpect.TIMEOUT, "Password:"], timeout=5)
                 if auth_result == 1:
                     self.log("程序输出", "输入密码local")
                     self.sendline_with_logging("local")
 
                 # 验证登录成功
-                if self.expect_with_logging([pexpect.TIMEOUT, "local@locals-Mac"], timeout=60) == 1:
+                if await self.expect_with_logging([pexpect.TIMEOUT, "local@locals-Mac"], timeout=60) == 1:
                     self.log("程序输出", "登录成功!")
-
-                    # 获取设备序列号和IP地址
-                    self.device_serial = self.get_device_serial_number()
                     return True
 
             if expect_result == 2:
@@ -188,7 +336,7 @@ class RebootLogCollector:
             self.log("错误", f"nanocom连接失败: {e}")
             return False
 
-    def run_command_and_save(self, command: str, filename: str) -> bool:
+    async def run_command_and_save(self, command: str, filename: str, timeout=10) -> bool:
         self.log("程序输出", f"开始在设备上运行命令: {command}")
 
         try:
@@ -199,16 +347,16 @@ class RebootLogCollector:
             full_command = f"{command} > {save_path}"
             self.sendline_with_logging(full_command)
 
-            except_result = self.expect_with_logging(
+            except_result = await self.expect_with_logging(
                 [pexpect.TIMEOUT, "local@locals-Mac"],
-                timeout=10
+                timeout=timeout
             )
 
             if except_result == 1:
 
                 # 验证文件是否创建成功
                 self.sendline_with_logging(f"test -f {save_path} && echo 'FILE_EXISTS' || echo 'FILE_MISSING'")
-                self.expect_with_logging(["local@locals-Mac"], timeout=5)
+                await self.expect_with_logging(["local@locals-Mac"], timeout=CHECK_TIMEOUT)
                 response = self.child.before.decode()
 
                 if "FILE_EXISTS" in response:
@@ -225,16 +373,16 @@ class RebootLogCollector:
             self.log("错误", f"运行命令 {command} 失败: {e}")
             return False
 
-    def run_nvram(self) -> bool:
+    async def run_nvram(self) -> bool:
         """运行nvram命令并保存结果"""
-        return self.run_command_and_save("nvram -p", "nvram")
+        return await self.run_command_and_save("nvram -p", "nvram")
 
-    def run_astro(self) -> bool:
+    async def run_astro(self) -> bool:
         """运行astro命令并保存结果"""
-        return self.run_command_and_save("astro status", "astro_status")
+        return await self.run_command_and_save("astro status", "astro_status")
 
-    def run_sysdiagnose(self) -> bool:
-        """在设备上运行sysdiagnose命令"""
+    async def run_sysdiagnose(self, timeout=600) -> bool:
+        """在设备上运行sysdiagnose命令，timeout 为等待其完成的秒数"""
         self.log("程序输出", "开始在设备上运行sysdiagnose...")
 
         try:
@@ -242,9 +390,9 @@ class RebootLogCollector:
             self.sendline_with_logging("sudo sysdiagnose")
 
             # 等待密码提示或继续提示
-            expect_result = self.expect_with_logging(
+            expect_result = await self.expect_with_logging(
                 [pexpect.TIMEOUT, "Press 'Enter' to continue"],
-                timeout=5
+                timeout=CHECK_TIMEOUT
             )
 
             if expect_result == 1:  # 检测到继续提示
@@ -253,13 +401,21 @@ class RebootLogCollector:
 
                 # 等待sysdiagnose完成
                 self.log("程序输出", "等待sysdiagnose完成")
-                expect_result = self.expect_with_logging(
-                    [pexpect.TIMEOUT, "Output available at", "local@locals-Mac"],
-                    timeout=600  # 10分钟超时
+                expect_result = await self.expect_with_logging(
+                    [pexpect.TIMEOUT, SYSDIAGNOSE_OUTPUT_REGEX, "local@locals-Mac"],
+                    timeout=timeout
                 )
 
                 if expect_result in [1, 2]:  # sysdiagnose完成
-                    self.log("程序输出", "sysdiagnose完成")
+                    if expect_result == 1:
+                        self.sysdiagnose_archive = self.child.match.group(1).decode('utf-8', 'ignore').strip()
+                    else:
+                        self.sysdiagnose_archive = await self.find_sysdiagnose_archive()
+                    if not self.sysdiagnose_archive:
+                        self.log("错误", "sysdiagnose 已结束，但在设备上找不到归档")
+                        return False
+                    self.update_checkpoint(sysdiagnose_archive=self.sysdiagnose_archive)
+                    self.log("程序输出", f"sysdiagnose完成: {self.sysdiagnose_archive}")
                     return True
                 else:
                     self.log("错误", "sysdiagnose执行超时")
@@ -272,8 +428,20 @@ class RebootLogCollector:
             self.log("错误", f"运行sysdiagnose失败: {e}")
             return False
 
-    def copy_files_on_device(self) -> str:
-        """在设备上创建文件夹并复制日志文件"""
+    async def find_sysdiagnose_archive(self):
+        """在设备上查找最新的 sysdiagnose 归档，找不到返回 None"""
+        self.sendline_with_logging(SYSDIAGNOSE_LIST_COMMAND)
+        if await self.expect_with_logging([pexpect.TIMEOUT, "local@locals-Mac"], timeout=CHECK_TIMEOUT) != 1:
+            return None
+        match = re.search(SYSDIAGNOSE_ARCHIVE_REGEX, self.child.before.decode('utf-8', 'ignore'))
+        return match.group(1) if match else None
+
+    async def copy_files_on_device(self, on_ready=None) -> str:
+        """在设备上创建文件夹并复制日志文件
+
+        Args:
+            on_ready: 每复制完一项后以设备上的路径调用，用于边采集边传输
+        """
         # 日志路径定义
         log_paths = {
             "crash_reporter": "/Library/logs/CrashReporter/CoreCapture",
@@ -283,42 +451,56 @@ class RebootLogCollector:
 
         # 在设备上创建文件夹
         device_folder = f"/var/tmp/{self.device_serial}"
+        self.update_checkpoint(device_folder=device_folder)
         self.log("程序输出", f"在设备上创建文件夹: {device_folder}")
         self.sendline_with_logging(f"mkdir -p {device_folder}")
-        self.expect_with_logging(["local@locals-Mac"], timeout=5)
+        await self.expect_with_logging(["local@locals-Mac"], timeout=5)
 
         # 复制文件到设备上的文件夹
         for log_name, device_path in log_paths.items():
-            self.log("程序输出", f"复制: {device_path} 到 {device_folder}")
+            if await self.copy_path_on_device(device_path, device_folder) and on_ready:
+                on_ready(f"{device_folder}/{Path(device_path).name}")
 
-            # 检查设备上路径是否存在
-            self.sendline_with_logging(f"test -e {device_path} && echo 'EXISTS' || echo 'NOT_EXISTS'")
-            self.expect_with_logging(["local@locals-Mac"], timeout=5)
-            response = self.child.before.decode()
+        return device_folder
 
-            if "EXISTS" in response:
-                # 复制文件或目录
-                self.sendline_with_logging(f"cp -r {device_path} {device_folder}/")
-                self.expect_with_logging(["local@locals-Mac"])
-                self.log("程序输出", f"已复制: {device_path}")
-            else:
-                self.log("警告", f"路径不存在: {device_path}")
+    async def copy_path_on_device(self, device_path: str, device_folder: str, timeout=None) -> bool:
+        """在设备上把单个文件或目录复制到 device_folder，路径不存在时返回 False"""
+        self.log("程序输出", f"复制: {device_path} 到 {device_folder}")
 
-        return device_folder
+        # 检查设备上路径是否存在
+        self.sendline_with_logging(f"test -e {device_path} && echo 'EXISTS' || echo 'NOT_EXISTS'")
+        await self.expect_with_logging(["local@locals-Mac"], timeout=CHECK_TIMEOUT)
+        response = self.child.before.decode()
 
-    def close_nanocom(self):
-        """关闭nanocom连接"""
+        if "EXISTS" in response:
+            # 复制文件或目录
+            # -p 保留修改时间，增量同步据此判断文件是否变化
+            self.sendline_with_logging(f"cp -Rp {device_path} {device_folder}/")
+            await self.expect_with_logging(["local@locals-Mac"], timeout=timeout)
+            self.log("程序输出", f"已复制: {device_path}")
+            return True
+
+        self.log("警告", f"路径不存在: {device_path}")
+        return False
+
+    async def close_nanocom(self, healthy=True):
+        """关闭nanocom连接；会话来自会话代理时归还给代理，healthy=False 时代理会关闭它"""
+        if self.console:
+            self.console_broker.release(self.console, healthy)
+            self.console = None
+            self.child = None
+            return
         if self.child and self.child.isalive():
             try:
                 self.sendline_with_logging("exit")
                 self.child.sendcontrol("a")
                 self.child.sendcontrol("x")
-                self.child.close()
+                await self.child.aclose()
                 self.log("程序输出", "nanocom连接已关闭")
             except:
                 pass
 
-    def get_device_ip(self) -> str:
+    async def get_device_ip(self) -> str:
         """获取设备的 IP 地址"""
         if not self.child:
             return "locals-Mac.local"
@@ -328,7 +510,7 @@ class RebootLogCollector:
         try:
             # 方法1: 使用 ifconfig 获取 IP
             self.sendline_with_logging("ifconfig | grep 'inet ' | grep -v 127.0.0.1 | head -1")
-            self.expect_with_logging(["local@locals-Mac"], timeout=5)
+            await self.expect_with_logging(["local@locals-Mac"], timeout=5)
             response = self.child.before.decode()
 
             # 提取 IP 地址
@@ -347,114 +529,666 @@ class RebootLogCollector:
             self.log("错误", f"获取设备 IP 地址失败: {e}")
             return "locals-Mac.local"
 
-    def scp_from_device(self, device_folder: str):
+    def set_ssh_transport(self, ssh_transport):
+        """设置 SSH 传输层，同一设备的多次传输复用一个主连接"""
+        self.ssh = ssh_transport
+
+    async def prepare_ssh(self, device_ip: str) -> bool:
+        """建立到设备的 SSH 主连接；没有外部传输层时创建本次采集专用的"""
+        if self.ssh is None:
+            self.ssh = self._own_ssh = SshTransport(logger=self.logger)
+        self.update_checkpoint(device_ip=device_ip)
+        if not await self.ssh.ensure_master(device_ip, self.cancel_token):
+            self.log("警告", "SSH 主连接建立失败，每次传输将单独连接")
+            return False
+        return True
+
+    async def scp_pull(self, device_ip: str, remote_path: str, local_dir: Path, timeout=600) -> bool:
+        """从设备拉取单个文件或目录到主机目录，复用 SSH 主连接；主连接不可用时自动处理主机密钥确认和密码"""
+        if self.ssh is None:
+            await self.prepare_ssh(device_ip)
+        local_dir.mkdir(parents=True, exist_ok=True)
+        self.log("程序输出", f"执行SCP命令: scp -r local@{device_ip}:{remote_path} {local_dir}")
+
+        ok, error = await self.ssh.copy(device_ip, remote_path, local_dir, timeout, self.cancel_token,
+                                        logfile=self.terminal_logger.log_file if self.terminal_logger else None)
+        if not ok:
+            self.log("错误", f"SCP传输失败 ({error}): {remote_path}")
+        return ok
+
+    async def transfer(self, device_ip: str, remote_path: str, local_dir: Path, timeout=600, method=None,
+                       use_hash=False) -> bool:
+        """按传输方式（默认为采集的 method）拉取设备上的文件或目录，失败时从断点重试；传输状态记入断点"""
+        method = method or self.method
+        if self.checkpoint:
+            self.checkpoint.begin_transfer(remote_path, str(local_dir), method)
+        ok = await self.transfer_once(device_ip, remote_path, local_dir, timeout, method, use_hash)
+        if not ok:
+            ok = await self.retry_transfer(device_ip, [remote_path], local_dir, method)
+        if self.checkpoint:
+            self.checkpoint.end_transfer(remote_path, str(local_dir), ok)
+        return ok
+
+    async def retry_transfer(self, device_ip: str, remote_paths, local_dir: Path, method) -> bool:
+        """从断点重试: 跳过已完成的文件，大文件从已接收的字节偏移（并行传输时从未完成的分块）继续"""
+        for attempt in range(1, TRANSFER_RETRIES + 1):
+            self.log("警告", f"传输中断，{RETRY_DELAY}s 后从断点继续（第 {attempt}/{TRANSFER_RETRIES} 次）: "
+                           f"{', '.join(remote_paths)}")
+            await async_expect.sleep(RETRY_DELAY, self.cancel_token)
+            if not await self.prepare_ssh(device_ip):
+                continue
+            if method == TRANSFER_PARALLEL:
+                ok = await self.parallel_pull(device_ip, remote_paths, local_dir)
+            else:
+                ok = all([await self.sync_pull(device_ip, remote_path, local_dir) for remote_path in remote_paths])
+            if ok:
+                self.log("程序输出", "断点续传完成")
+                return True
+        return False
+
+    async def transfer_once(self, device_ip: str, remote_path: str, local_dir: Path, timeout, method,
+                            use_hash) -> bool:
+        if method == TRANSFER_SYNC:
+            return await self.sync_pull(device_ip, remote_path, local_dir, use_hash)
+        if method == TRANSFER_STREAM:
+            return await self.stream_pull(device_ip, remote_path, local_dir)
+        if method == TRANSFER_PARALLEL:
+            return await self.parallel_pull(device_ip, [remote_path], local_dir)
+        return await self.scp_pull(device_ip, remote_path, local_dir, timeout)
+
+    async def parallel_pull(self, device_ip: str, remote_paths, local_dir: Path) -> bool:
+        """多流并行传输一组设备路径；没有可用的主连接时逐个退回 scp
+
+        部分传输项失败时返回 False，由 retry_transfer 从断点补传未完成的文件和分块，不整体重新 scp。
+        """
+        if self.ssh is None:
+            await self.prepare_ssh(device_ip)
+        self.log("程序输出", f"并行传输（{self.streams} 个流）: {', '.join(remote_paths)} -> {local_dir}")
+        transfer = ParallelTransfer(self.ssh, device_ip, self, self.cancel_token, self.streams,
+                                    logfile=self.terminal_logger.log_file if self.terminal_logger else None,
+                                    checkpoint=self.checkpoint)
+        ok, error = await transfer.pull(remote_paths, local_dir)
+        if ok:
+            return True
+        if transfer.lanes:
+            self.log("错误", f"并行传输失败: {error}")
+            return False
+        self.log("警告", f"并行传输失败 ({error})，改用 SCP")
+        results = [await self.scp_pull(device_ip, remote_path, local_dir) for remote_path in remote_paths]
+        return all(results)
+
+    async def stream_pull(self, device_ip: str, remote_path: str, local_dir: Path, level=None) -> bool:
+        """流式归档传输: 设备端 tar 压缩输出，主机端边接收边解包；主机连接不可用时退回 scp"""
+        if self.ssh is None:
+            await self.prepare_ssh(device_ip)
+        self.log("程序输出", f"流式传输: {remote_path} -> {local_dir}")
+        ok, error = await ArchiveStream(self.ssh, device_ip, self, self.cancel_token, level).pull(remote_path, local_dir)
+        if ok:
+            return True
+        self.log("警告", f"流式传输失败 ({error})，改用 SCP: {remote_path}")
+        return await self.scp_pull(device_ip, remote_path, local_dir)
+
+    async def sync_pull(self, device_ip: str, remote_path: str, local_dir: Path, use_hash=False) -> bool:
+        """增量同步设备上的文件或目录到主机目录，结果记录到 sync_results"""
+        if self.ssh is None:
+            await self.prepare_ssh(device_ip)
+        syncer = DeviceSync(self.ssh, device_ip, self, self.cancel_token, use_hash,
+                            self.terminal_logger.log_file if self.terminal_logger else None, self.checkpoint)
+        try:
+            result = await syncer.sync(remote_path, local_dir)
+        except Exception as e:
+            self.log("错误", f"同步失败 {remote_path}: {e}")
+            return False
+        self.sync_results.append(result)
+        return not result["failed"]
+
+    def save_sync_manifest(self, host_folder: Path):
+        """保存本次同步清单: 设备目录中保留最新一份，会话目录中按设备保存一份"""
+        if not self.sync_results:
+            return
+        try:
+            path = write_manifest(host_folder / MANIFEST_NAME, self.sync_results)
+            self.log("程序输出", f"同步清单已保存: {path}")
+            session_path = getattr(self.logger, 'session_path', None)
+            if session_path:
+                write_manifest(Path(session_path) / f"sync_manifest_{self.device_serial}.json", self.sync_results)
+        except Exception as e:
+            self.log("警告", f"保存同步清单失败: {e}")
+
+    async def transfer_collected(self, device_folder: str) -> bool:
+        """按传输方式拉取本次采集的设备目录和 sysdiagnose 归档，不再复制整个 /var/tmp
+
+        主机端目录结构与 scp -r /var/tmp 相同: <桌面>/<序列号>/tmp/...
+        """
+        host_folder = self.host_desktop_path / self.device_serial
+        host_tmp = host_folder / "tmp"
+        device_ip = await self.get_device_ip()
+        await self.prepare_ssh(device_ip)
+
+        started = time.monotonic()
+        self.log("程序输出", f"开始传输（{self.method}）...")
+        remote_paths = [device_folder]
+        if self.sysdiagnose_archive:
+            remote_paths.append(self.sysdiagnose_archive)
+        else:
+            self.log("错误", "未获取到 sysdiagnose 归档路径，无法传输")
+        if self.method == TRANSFER_PARALLEL:
+            # 所有内容一起拆分，各个流同时传输
+            if self.checkpoint:
+                for remote_path in remote_paths:
+                    self.checkpoint.begin_transfer(remote_path, str(host_tmp), self.method)
+            success = await self.parallel_pull(device_ip, remote_paths, host_tmp)
+            if not success:
+                success = await self.retry_transfer(device_ip, remote_paths, host_tmp, self.method)
+            if self.checkpoint:
+                for remote_path in remote_paths:
+                    self.checkpoint.end_transfer(remote_path, str(host_tmp), success)
+        else:
+            success = True
+            for remote_path in remote_paths:
+                success = await self.transfer(device_ip, remote_path, host_tmp) and success
+        self.log("程序输出", f"传输{'完成' if success else '失败'}，耗时 {time.monotonic() - started:.1f}s")
+        self.save_sync_manifest(host_folder)
+        return success and bool(self.sysdiagnose_archive)
+
+    async def scp_from_device(self, device_folder: str) -> bool:
         """在主机上执行SCP命令从设备复制文件夹"""
         # 在主机上创建目标文件夹
         host_folder = self.host_desktop_path / self.device_serial
         host_folder.mkdir(parents=True, exist_ok=True)
 
-        device_ip = self.get_device_ip()
+        device_ip = await self.get_device_ip()
+        await self.prepare_ssh(device_ip)
 
+        # 通过scp将文件夹（含 device_folder 的整个 /var/tmp）从设备复制到主机
+        self.log("程序输出", f"开始SCP传输: /var/tmp -> {host_folder}（采集目录 {device_folder}）")
         try:
-            ssh_known_hosts_path = Path.home() / ".ssh" / "known_hosts"
-            if ssh_known_hosts_path.exists():
-                ssh_known_hosts_path.unlink()
-                self.log("程序输出", "已删除 ~/.ssh/known_hosts 文件")
+            if await self.transfer(device_ip, "/var/tmp", host_folder):
+                self.log("程序输出", "SCP传输完成")
+                return True
+            self.log("错误", "SCP传输失败或超时")
+            return False
         except Exception as e:
-            self.log("警告", f"删除 known_hosts 文件失败: {e}")
+            self.log("错误", f"SCP传输失败: {e}")
+            return False
 
-        # 通过scp将文件夹从设备复制到主机
-        self.log("程序输出", "在主机上执行SCP命令...")
-        scp_command = f"scp -r local@{device_ip}:/var/tmp {host_folder}"
-        self.log("程序输出", f"执行SCP命令: {scp_command}")
+    def main(self) -> bool:
+        """同步入口: 在当前线程的事件循环中运行 main_async"""
+        return async_expect.run(self.main_async())
 
+    async def main_async(self) -> bool:
         try:
-            # 记录命令
-            if self.logger:
-                self.logger.log_command(
-                    "文件传输",
-                    f"SCP从设备复制文件夹: {device_folder}",
-                    "开始",
-                    {"源路径": device_folder, "目标路径": str(host_folder)}
-                )
-
-            # 使用pexpect执行SCP命令并自动输入密码
-            scp_child = pexpect.spawn(scp_command, encoding='utf-8')
-
-            # 设置终端日志记录
-            if self.terminal_logger:
-                scp_child.logfile_read = self.terminal_logger.log_file
-                scp_child.logfile_send = self.terminal_logger.log_file
-
-            scp_result = scp_child.expect(['Are you sure you want to continue connecting',
-                                           pexpect.TIMEOUT,
-                                           pexpect.EOF], timeout=10)
-
-            if scp_result == 0:  # 首次连接确认
-                scp_child.sendline("yes")
-                scp_result = scp_child.expect(['Password:', pexpect.TIMEOUT, pexpect.EOF], timeout=5)
-
-                if scp_result == 0:  # 需要密码
-                    scp_child.sendline("local")
-                    self.log("程序输出", "开始SCP传输")
-
-                    # 等待传输完成
-                    scp_child.expect(pexpect.EOF, timeout=600)
-                    self.log("程序输出", "SCP传输完成")
-
-                    # 记录成功
-                    if self.logger:
-                        self.logger.log_command(
-                            "文件传输",
-                            f"SCP从设备复制文件夹: {device_folder}",
-                            "成功",
-                            {"源路径": device_folder, "目标路径": str(host_folder)}
-                        )
-            else:
-                self.log("错误", "SCP传输失败或超时")
-                if self.logger:
-                    self.logger.log_command(
-                        "文件传输",
-                        f"SCP从设备复制文件夹: {device_folder}",
-                        "失败",
-                        {"错误": "连接失败或超时"}
-                    )
+            if self.resume:
+                return await self.main_resume()
+            if self.workflow:
+                return await self.main_workflow()
+            if self.pipelined:
+                return await self.main_pipelined()
+            return await self.main_sequential()
+        finally:
+            # 正常结束时已归还会话；走到这里仍持有说明被取消或中途退出，控制台状态未知，不再复用
+            await self.close_nanocom(healthy=False)
+            if self._own_ssh:
+                self._own_ssh.stop()
+                self.ssh = self._own_ssh = None
+
+    def finish_checkpoint(self):
+        """采集结束: 所有传输都完成时在断点中标记完成，否则提示可以继续采集"""
+        if not self.checkpoint:
+            return
+        pending = self.checkpoint.pending_transfers()
+        self.checkpoint.update_context(completed=not pending)
+        if pending:
+            self.log("警告", f"{len(pending)} 项传输未完成，可在 Reboot Log 配置中选择“继续未完成的采集”: "
+                           f"{self.checkpoint.path}")
+
+    async def main_resume(self) -> bool:
+        """继续未完成的采集: 按断点文件传输未完成的内容，不再执行 sysdiagnose 等设备端步骤"""
+        self.log("系统", f"=== 继续未完成的采集: {self.resume} ===")
+        try:
+            self.checkpoint = TransferCheckpoint.load(self.resume)
+        except (OSError, ValueError) as e:
+            self.log("错误", f"读取断点文件失败: {e}")
+            return False
 
-        except Exception as e:
-            self.log("错误", f"SCP传输失败: {e}")
-            if self.logger:
-                self.logger.log_command(
-                    "文件传输",
-                    f"SCP从设备复制文件夹: {device_folder}",
-                    "失败",
-                    {"错误": str(e)}
-                )
+        context = self.checkpoint.context
+        self.device_serial = context.get("serial")
+        self.sysdiagnose_archive = context.get("sysdiagnose_archive")
+        self.streams = context.get("streams", self.streams)
+        self.port = self.port or context.get("port")
+        host_folder = Path(context.get("host_folder") or self.host_desktop_path / self.device_serial)
+        pending = self.checkpoint.pending_transfers()
+        if not context.get("collected"):
+            self.log("警告", "设备端采集未全部完成，只继续已开始的传输")
+        if not pending:
+            self.log("系统", "没有未完成的传输")
+            return True
+
+        device_ip = context.get("device_ip")
+        if not device_ip or not await self.prepare_ssh(device_ip):
+            # 设备 IP 可能已变化: 通过控制台重新读取
+            self.log("程序输出", "通过控制台重新获取设备 IP 地址...")
+            if not await self.auto_login_via_nanocom():
+                self.log("错误", "设备连接失败")
+                return False
+            if self.device_serial != context.get("serial"):
+                self.log("错误", f"设备序列号 {self.device_serial} 与断点中的 {context.get('serial')} 不一致")
+                await self.close_nanocom()
+                return False
+            device_ip = await self.get_device_ip()
+            await self.close_nanocom()
+            await self.prepare_ssh(device_ip)
+
+        started = time.monotonic()
+        failures = []
+        for transfer in pending:
+            # 已开始的文件从断点继续: 并行传输按分块，其他方式按文件和字节偏移
+            method = TRANSFER_PARALLEL if transfer.get("method") == TRANSFER_PARALLEL else TRANSFER_SYNC
+            if not await self.transfer(device_ip, transfer["remote"], Path(transfer["local"]), method=method):
+                failures.append(transfer["remote"])
+
+        self.save_sync_manifest(host_folder)
+        self.log("系统", f"继续传输耗时 {time.monotonic() - started:.0f}s")
+        if failures:
+            self.log("错误", f"以下内容仍未传输完成: {', '.join(failures)}")
+        else:
+            self.log("系统", f"日志收集完成! 保存到: {host_folder}")
+        self.finish_checkpoint()
+        return not failures
 
-    def main(self):
+    async def main_sequential(self) -> bool:
+        """采集完成后统一传输"""
         self.log("系统", "=== 设备日志自动收集脚本 ===")
 
         try:
-            if self.auto_login_via_nanocom():
+            if await self.auto_login_via_nanocom():
                 # 在设备上运行sysdiagnose
-                self.run_sysdiagnose()
+                sysdiagnose_ok = await self.run_sysdiagnose()
                 # 在设备上复制文件
-                device_folder = self.copy_files_on_device()
+                device_folder = await self.copy_files_on_device()
 
-                self.run_nvram()
-                self.run_astro()
+                await self.run_nvram()
+                await self.run_astro()
+                self.update_checkpoint(collected=True)
 
-                # 在主机上执行SCP命令
-                self.scp_from_device(device_folder)
+                # 在主机上执行SCP命令（增量同步、流式归档时只传输本次采集的内容）
+                if self.method != TRANSFER_SCP:
+                    transferred = await self.transfer_collected(device_folder)
+                else:
+                    transferred = await self.scp_from_device(device_folder)
 
                 host_folder = self.host_desktop_path / self.device_serial
-                self.log("系统", f"日志收集完成! 保存到: {host_folder}")
-                self.close_nanocom()
+                success = sysdiagnose_ok and transferred
+                self.log("系统" if success else "错误", f"日志收集{'完成' if success else '未全部成功'}! "
+                                                       f"保存到: {host_folder}")
+                self.finish_checkpoint()
+                await self.close_nanocom()
+                return success
             else:
                 self.log("错误", "设备连接失败")
+                return False
+
+        except Exception as e:
+            self.log("错误", f"脚本执行错误: {e}")
+            await self.close_nanocom()
+            return False
+
+    async def main_pipelined(self) -> bool:
+        """边采集边传输
+
+        串口上先执行耗时短的步骤（复制日志、nvram、astro），每项准备好后立即交给后台 SCP 传输，
+        然后在 SCP 进行的同时运行 sysdiagnose，最后只传输 sysdiagnose 归档。
+        主机端目录结构与 scp -r /var/tmp 相同: <桌面>/<序列号>/tmp/...
+        """
+        self.log("系统", "=== 设备日志自动收集脚本（边采集边传输） ===")
+
+        try:
+            if not await self.auto_login_via_nanocom():
+                self.log("错误", "设备连接失败")
+                return False
+
+            started = time.monotonic()
+            device_ip = await self.get_device_ip()
+            await self.prepare_ssh(device_ip)
+            host_folder = self.host_desktop_path / self.device_serial
+            host_tmp = host_folder / "tmp"
+
+            transfers = asyncio.Queue()
+            failures = []
+
+            async def transfer_worker():
+                transfer_time = 0.0
+                while True:
+                    item = await transfers.get()
+                    if item is None:
+                        return transfer_time
+                    remote_path, local_dir = item
+                    transfer_started = time.monotonic()
+                    if not await self.transfer(device_ip, remote_path, local_dir):
+                        failures.append(remote_path)
+                    transfer_time += time.monotonic() - transfer_started
+
+            worker = asyncio.create_task(transfer_worker())
+            try:
+                device_folder = await self.copy_files_on_device(
+                    on_ready=lambda path: transfers.put_nowait((path, host_tmp / self.device_serial))
+                )
+                for run_step, filename in ((self.run_nvram, "nvram"), (self.run_astro, "astro_status")):
+                    if await run_step():
+                        transfers.put_nowait((f"{device_folder}/{filename}.txt", host_tmp / self.device_serial))
+
+                # SCP 在后台继续，串口上运行 sysdiagnose
+                await self.run_sysdiagnose()
+                self.update_checkpoint(collected=True)
+                collection_time = time.monotonic() - started
+                if self.sysdiagnose_archive:
+                    transfers.put_nowait((self.sysdiagnose_archive, host_tmp))
+                else:
+                    self.log("错误", "未获取到 sysdiagnose 归档路径，无法传输")
+                    failures.append("sysdiagnose")
+
+                transfers.put_nowait(None)
+                transfer_time = await worker
+            finally:
+                if not worker.done():
+                    worker.cancel()
+
+            self.log("系统", f"采集耗时 {collection_time:.0f}s，传输耗时 {transfer_time:.0f}s，"
+                           f"总耗时 {time.monotonic() - started:.0f}s")
+            if failures:
+                self.log("错误", f"以下文件传输失败: {', '.join(failures)}")
+            self.save_sync_manifest(host_folder)
+            self.log("系统" if not failures else "错误", f"日志收集{'未全部成功' if failures else '完成'}! "
+                                                        f"保存到: {host_folder}")
+            self.finish_checkpoint()
+            await self.close_nanocom()
+            return not failures
+
+        except Exception as e:
+            self.log("错误", f"脚本执行错误: {e}")
+            await self.close_nanocom()
+            return False
+
+
+    async def main_workflow(self) -> bool:
+        """按工作流文件采集
+
+        串口步骤（console）依次执行，主机 SCP 步骤（scp）在依赖完成后立即开始，与串口步骤并发。
+        步骤中可以使用变量 {serial}、{device_folder}、{device_ip}、{sysdiagnose_archive}。
+        每个步骤的耗时保存到 <桌面>/<序列号>/workflow_report.json。
+        """
+        try:
+            workflow = load_workflow(self.workflow)
+        except Exception as e:
+            self.log("错误", f"读取工作流失败 {self.workflow}: {e}")
+            return False
+
+        self.log("系统", f"=== 设备日志自动收集脚本（工作流 {workflow.name}） ===")
+
+        try:
+            if not await self.auto_login_via_nanocom():
+                self.log("错误", "设备连接失败")
+                return False
+
+            context = {
+                "serial": self.device_serial,
+                "device_folder": f"/var/tmp/{self.device_serial}",
+                "host_folder": str(self.host_desktop_path / self.device_serial),
+            }
+            if workflow.transports() & {"scp", "ssh"}:
+                context["device_ip"] = await self.get_device_ip()
+                await self.prepare_ssh(context["device_ip"])
+
+            executor = WorkflowExecutor(workflow, self, self.cancel_token)
+            executor.add_transport("console", self.run_console_step, limit=1)
+            executor.add_transport("scp", self.run_scp_step, limit=1)
+            executor.add_transport("ssh", self.run_ssh_step)
+            success = await executor.run_async(context)
+            if self.console_busy:
+                # 最后一个串口步骤超时被取消，串口上可能还在执行
+                await self.recover_console()
+            console_steps = [step for step in workflow.steps if step.transport == "console"]
+            self.update_checkpoint(collected=all(executor.results[step.id].state == SUCCEEDED or step.optional
+                                                 for step in console_steps))
+
+            executor.summary()
+            self.save_sync_manifest(Path(context["host_folder"]))
+            try:
+                report_path = executor.write_report(Path(context["host_folder"]) / "workflow_report.json")
+                self.log("系统", f"步骤耗时已保存: {report_path}")
+            except Exception as e:
+                self.log("警告", f"保存步骤耗时失败: {e}")
+
+            self.log("系统" if success else "错误", f"日志收集{'完成' if success else '未全部成功'}! "
+                                                   f"保存到: {context['host_folder']}")
+            self.finish_checkpoint()
+            await self.close_nanocom(healthy=not self.console_busy)
+            return success
 
         except Exception as e:
             self.log("错误", f"脚本执行错误: {e}")
-            self.close_nanocom()
+            await self.close_nanocom(healthy=not self.console_busy)
+            return False
+
+    async def recover_console(self, timeout=RECOVER_TIMEOUT):
+        """命令超时后发送 Ctrl+C 并等待提示符，丢弃残留输出；回到提示符返回 True，否则串口保持 console_busy，归还时关闭"""
+        self.log("警告", "发送 Ctrl+C 中断未完成的命令")
+        self.child.sendintr()
+        try:
+            await self.expect_with_logging(["local@locals-Mac"], timeout=timeout)
+            await self.child.discard_pending()
+            self.console_busy = False
+        except (pexpect.TIMEOUT, pexpect.EOF):
+            self.log("错误", "串口未回到提示符")
+        return not self.console_busy
+
+    @staticmethod
+    def step_timeout(step, reserved=0, default=None):
+        """串口步骤内部等待提示符的超时: 步骤超时减去其他 expect 占用的 reserved 秒和 CONSOLE_STEP_MARGIN"""
+        if not step.timeout:
+            return default
+        return max(1, step.timeout - reserved - CONSOLE_STEP_MARGIN)
+
+    async def run_console_step(self, step, context) -> bool:
+        """串口步骤: 上一个步骤超时被取消时先中断并等回提示符；步骤失败后同样恢复串口"""
+        if self.console_busy and not await self.recover_console():
+            raise RuntimeError("串口未回到提示符")
+        self.console_busy = True
+        ok = await self.execute_console_step(step, context)
+        if ok:
+            self.console_busy = False
+        else:
+            await self.recover_console()
+        return ok
+
+    async def execute_console_step(self, step, context) -> bool:
+        """执行串口步骤，内部 expect 的超时都小于步骤超时
+
+        - action "copy": 把 path 复制到设备上的 {device_folder}
+        - action "sysdiagnose": 运行 sysdiagnose，归档路径写入 {sysdiagnose_archive}
+        - command: 执行命令并等待提示符；有 save_as 时输出重定向到 {device_folder}/<save_as>.txt
+        """
+        action = step.get("action")
+        if action == "copy":
+            return await self.copy_path_on_device(step.render("path", context), context["device_folder"],
+                                                  self.step_timeout(step, CHECK_TIMEOUT))
+        if action == "sysdiagnose":
+            # 另有等待继续提示和查找归档两次 expect
+            if not await self.run_sysdiagnose(self.step_timeout(step, 2 * CHECK_TIMEOUT, 600)):
+                return False
+            if self.sysdiagnose_archive:
+                context["sysdiagnose_archive"] = self.sysdiagnose_archive
+            return True
+        if action:
+            raise ValueError(f"未知的串口操作: {action}")
+
+        command = step.render("command", context)
+        if not command:
+            raise ValueError("串口步骤缺少 command 或 action")
+        save_as = step.render("save_as", context)
+        if save_as:
+            return await self.run_command_and_save(command, save_as, self.step_timeout(step, CHECK_TIMEOUT, 10))
+
+        self.sendline_with_logging(command)
+        return await self.expect_with_logging([pexpect.TIMEOUT, "local@locals-Mac"],
+                                              timeout=self.step_timeout(step)) == 1
+
+    async def run_scp_step(self, step, context) -> bool:
+        """主机 SCP 步骤: 把设备上的 source 拉取到 <桌面>/<序列号>/<dest>
+
+        步骤中 "method" 指定传输方式（scp/sync/stream/parallel，默认为采集的传输方式）；
+        "sync": true 等同 "method": "sync"，"hash": true 时增量同步按 SHA-256 比较。
+        """
+        local_dir = Path(context["host_folder"]) / step.render("dest", context, "")
+        source = step.render("source", context)
+        method = step.get("method") or (TRANSFER_SYNC if step.get("sync") else self.method)
+        if method not in TRANSFER_METHODS:
+            raise ValueError(f"未知的传输方式: {method}")
+        return await self.transfer(context["device_ip"], source, local_dir, step.timeout or 600, method,
+                                   bool(step.get("hash")))
+
+
+    async def run_ssh_step(self, step, context) -> bool:
+        """SSH 步骤: 通过主连接在设备上执行 command，不占用串口；有 save_as 时输出保存到 <桌面>/<序列号>/<save_as>"""
+        command = step.render("command", context)
+        if not command:
+            raise ValueError("SSH 步骤缺少 command")
+        self.log("程序输出", f"通过SSH执行: {command}")
+        status, output = await self.ssh.run(context["device_ip"], command, step.timeout or 60, self.cancel_token)
+        save_as = step.render("save_as", context)
+        if save_as:
+            path = Path(context["host_folder"]) / save_as
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(output, encoding='utf-8')
+        if status != 0:
+            self.log("错误", f"SSH 命令失败 ({status}): {command}")
+            return False
+        return True
+
+
+class RebootLogFleet:
+    """多设备模式 - 为每个 chimp 端口启动一个 RebootLogCollector，在同一个事件循环中并发采集
+
+    每个端口有独立的会话目录（终端日志）和日志通道 reboot_log/<端口>，
+    全部结束后输出按设备的成功情况和耗时汇总，并写入 fleet_report.json。
+    """
+
+    def __init__(self, logger=None, cancel_token=None, max_parallel=DEFAULT_FLEET_PARALLEL, session_path=None,
+                 pipelined=False, workflow=None, method=TRANSFER_SCP, streams=DEFAULT_STREAMS):
+        self.logger = logger
+        self.cancel_token = cancel_token
+        self.max_parallel = max_parallel
+        self.pipelined = pipelined
+        self.workflow = workflow
+        self.method = method
+        self.streams = streams
+        self.console_broker = None
+        self.ssh = None
+        self.session_dir = None
+        if session_path:
+            self.session_dir = Path(session_path) / f"reboot_log_fleet_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+    def log(self, level, message, *args):
+        if self.logger:
+            self.logger.log(level, message, *args)
+        else:
+            print(f"[{level}] {message % args if args else message}")
+
+    def set_console_broker(self, console_broker):
+        """设置控制台会话代理，每个端口复用各自已登录的会话"""
+        self.console_broker = console_broker
+
+    def set_ssh_transport(self, ssh_transport):
+        """设置 SSH 传输层，各设备的主连接由它统一管理"""
+        self.ssh = ssh_transport
+
+    async def discover_ports(self):
+        """启动一次 nanocom 读取设备列表，返回所有可采集的端口"""
+        child = AsyncSession('/usr/local/bin/nanocom -y', cancel_token=self.cancel_token)
+        try:
+            result = await child.expect([pexpect.TIMEOUT, pexpect.EOF, "Select a device by its number"], timeout=5)
+            if result != 2:
+                return []
+            return find_all_ports(child.before.decode('utf-8', 'ignore'))
+        finally:
+            await child.aclose()
+
+    async def collect_port(self, number, path):
+        """采集单个端口（协程）"""
+        collector = RebootLogCollector(port=number, pipelined=self.pipelined, workflow=self.workflow,
+                                       method=self.method, streams=self.streams)
+        collector.set_logger(self.logger)
+        collector.set_cancel_token(self.cancel_token)
+        collector.set_console_broker(self.console_broker)
+        collector.set_ssh_transport(self.ssh)
+
+        terminal_logger = None
+        if self.session_dir:
+            port_dir = self.session_dir / f"port_{number}"
+            port_dir.mkdir(parents=True, exist_ok=True)
+            terminal_logger = TerminalLogger(port_dir / "terminal.log")
+            collector.terminal_logger = terminal_logger
+
+        report = {"port": number, "path": path, "device": None, "success": False, "duration": 0.0, "error": None}
+        started = time.monotonic()
+        channel = self.logger.command_context(f"reboot_log/{number}") if self.logger else nullcontext()
+        try:
+            with channel:
+                report["success"] = await collector.main_async()
+        except cancellation.OperationCancelled as e:
+            report["error"] = f"已取消: {e}"
+        except Exception as e:
+            report["error"] = str(e)
+        finally:
+            report["duration"] = time.monotonic() - started
+            report["device"] = collector.device_serial
+            if terminal_logger:
+                terminal_logger.close()
+        return report
+
+    def run(self) -> bool:
+        """同步入口"""
+        return async_expect.run(self.run_async())
+
+    async def run_async(self) -> bool:
+        self.log("系统", "=== 多设备日志收集 ===")
+        ports = await self.discover_ports()
+        if not ports:
+            self.log("错误", "未找到任何可用的串口设备")
+            return False
+
+        self.log("程序输出", f"找到 {len(ports)} 个端口: {', '.join(number for number, _ in ports)}")
+        started = time.monotonic()
+        reports = await async_expect.gather_limited(
+            [self.collect_port(number, path) for number, path in ports], self.max_parallel
+        )
+
+        self.write_report(reports, time.monotonic() - started)
+        if self.cancel_token:
+            self.cancel_token.raise_if_cancelled()
+        return all(report["success"] for report in reports)
+
+    def write_report(self, reports, total_duration):
+        """输出汇总"""
+        succeeded = sum(1 for report in reports if report["success"])
+        self.log("系统", "=== 多设备采集汇总 ===")
+        for report in reports:
+            status = "成功" if report["success"] else f"失败 {report['error'] or ''}".rstrip()
+            self.log("系统" if report["success"] else "错误",
+                     f"端口 {report['port']} ({report['path']}) 设备 {report['device'] or '-'}: "
+                     f"{status}，耗时 {report['duration']:.0f}s")
+        self.log("系统", f"成功 {succeeded}/{len(reports)}，总耗时 {total_duration:.0f}s")
+
+        if self.session_dir:
+            try:
+                self.session_dir.mkdir(parents=True, exist_ok=True)
+                report_path = self.session_dir / "fleet_report.json"
+                with open(report_path, 'w', encoding='utf-8') as f:
+                    json.dump({"total_duration": total_duration, "succeeded": succeeded, "devices": reports},
+                              f, ensure_ascii=False, indent=2)
+                self.log("系统", f"汇总已保存: {report_path}")
+            except Exception as e:
+                self.log("警告", f"保存汇总失败: {e}")
 
 
 def main():
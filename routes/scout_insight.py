@@ -1,12 +1,17 @@
+import csv
+import json
 import pexpect
 import re
 import time
 import os
+from contextlib import nullcontext
 from typing import Optional, List, Tuple
 from pathlib import Path
 
 # 导入工具类
 from utils.session_manager import SessionManager, EventHandlers
+from utils import async_expect
+from utils.async_expect import AsyncSession
 
 
 class ScoutAutomation:
@@ -14,6 +19,8 @@ class ScoutAutomation:
         self.logger = logger
         self.terminal_logger = None
         self.child = None
+        self.cancel_token = None
+        self.access_service = None
         self.session_manager = SessionManager("Scout_Logs", logger)
 
         if logger:
@@ -26,12 +33,20 @@ class ScoutAutomation:
         if logger:
             self.terminal_logger = logger.get_terminal_logger()
 
-    def log(self, level, message):
-        """统一的日志记录方法"""
+    def set_cancel_token(self, cancel_token):
+        """设置取消令牌"""
+        self.cancel_token = cancel_token
+
+    def set_access_service(self, access_service):
+        """设置访问状态服务，认证失败时使缓存失效"""
+        self.access_service = access_service
+
+    def log(self, level, message, *args):
+        """统一的日志记录方法，args 用于延迟格式化"""
         if self.logger:
-            self.logger.log(level, message)
+            self.logger.log(level, message, *args)
         else:
-            print(f"[{level}] {message}")
+            print(f"[{level}] {message % args if args else message}")
 
     def log_terminal_send(self, data):
         """记录发送到终端的数据"""
@@ -53,11 +68,11 @@ class ScoutAutomation:
         if self.terminal_logger:
             self.terminal_logger.log_timeout()
 
-    def expect_with_logging(self, patterns, timeout=None):
+    async def expect_with_logging(self, patterns, timeout=None):
         """带日志记录的expect方法"""
         self.log_terminal_expect(patterns)
         try:
-            result = self.child.expect(patterns, timeout=timeout)
+            result = await self.child.expect(patterns, timeout)
 
             # 记录匹配到的内容
             if self.child.before:
@@ -72,7 +87,7 @@ class ScoutAutomation:
                 self.log_terminal_receive(self.child.before)
             raise
         except Exception as e:
-            self.log("错误", f"expect操作异常: {e}")
+            self.log("错误", "expect操作异常: %s", e)
             if self.child.before:
                 self.log_terminal_receive(self.child.before)
             raise
@@ -103,7 +118,8 @@ class ScoutAutomation:
             self.log("程序输出", f"执行命令: {scout_cmd}")
 
             # 启动scout进程
-            self.child = pexpect.spawn('/bin/bash', ['-c', scout_cmd], encoding='utf-8', timeout=60)
+            self.child = AsyncSession('/bin/bash', ['-c', scout_cmd], encoding='utf-8', timeout=60,
+                                      cancel_token=self.cancel_token)
 
             # 设置终端日志记录
             if self.session_manager.raw_terminal_logger:
@@ -119,7 +135,7 @@ class ScoutAutomation:
             self.log("错误", f"启动scout会话失败: {e}")
             return False
 
-    def wait_for_authentication(self):
+    async def wait_for_authentication(self):
         """等待认证完成"""
         try:
             # 等待认证阶段完成
@@ -130,13 +146,16 @@ class ScoutAutomation:
             ]
 
             for pattern in auth_patterns:
-                self.expect_with_logging(pattern, timeout=30)
+                await self.expect_with_logging(pattern, timeout=30)
                 self.log("程序输出", f"检测到: {self.child.after}")
 
             return True
 
         except pexpect.TIMEOUT:
             self.log("错误", "认证阶段超时")
+            if self.access_service:
+                self.access_service.invalidate("appleconnect")
+                self.access_service.invalidate("scout")
             return False
         except Exception as e:
             self.log("错误", f"认证过程中出错: {e}")
@@ -201,7 +220,7 @@ class ScoutAutomation:
             self.log("错误", f"选择文件失败: {e}")
             return False
 
-    def wait_for_completion(self, timeout=60) -> bool:
+    async def wait_for_completion(self, timeout=60) -> bool:
         """等待下载完成"""
         try:
             # 等待完成消息
@@ -212,7 +231,7 @@ class ScoutAutomation:
                 pexpect.EOF  # 进程结束
             ]
 
-            result_index = self.expect_with_logging(completion_patterns, timeout=timeout)
+            result_index = await self.expect_with_logging(completion_patterns, timeout=timeout)
 
             if result_index in [0, 1, 2]:
                 self.log("程序输出", "文件下载成功完成")
@@ -232,6 +251,11 @@ class ScoutAutomation:
             return False
 
     def run_automated_download(self, sn: str, station: str, user_path: str, target_timestamp: str) -> bool:
+        """同步入口: 在当前线程的事件循环中运行 run_automated_download_async"""
+        return async_expect.run(self.run_automated_download_async(sn, station, user_path, target_timestamp))
+
+    async def run_automated_download_async(self, sn: str, station: str, user_path: str,
+                                           target_timestamp: str) -> bool:
         """运行自动下载流程"""
         self.log("系统", "开始自动化scout下载流程")
 
@@ -241,7 +265,7 @@ class ScoutAutomation:
                 return False
 
             # 2. 等待认证
-            if not self.wait_for_authentication():
+            if not await self.wait_for_authentication():
                 return False
 
             # 3. 选择文件
@@ -249,7 +273,7 @@ class ScoutAutomation:
                 return False
 
             # 4. 等待完成
-            if not self.wait_for_completion():
+            if not await self.wait_for_completion():
                 return False
 
             self.log("系统", "自动化scout下载流程成功完成")
@@ -261,14 +285,15 @@ class ScoutAutomation:
         finally:
             # 清理资源
             if self.child and self.child.isalive():
-                self.child.close()
+                await self.child.aclose()
 
             # 清理会话管理器资源
             self.session_manager.cleanup()
 
 
 # 使用示例和外部接口函数
-def download_scout_log(sn: str, station: str, user_path: str, target_timestamp: str, logger=None) -> bool:
+def download_scout_log(sn: str, station: str, user_path: str, target_timestamp: str, logger=None,
+                       cancel_token=None, access_service=None) -> bool:
     """
     外部调用接口：下载指定时间戳的scout日志
 
@@ -278,56 +303,191 @@ def download_scout_log(sn: str, station: str, user_path: str, target_timestamp:
         user_path: 用户路径
         target_timestamp: 目标时间戳 (例如: "20250523-210217")
         logger: 统一的日志记录器
+        cancel_token: 取消令牌
+        access_service: 访问状态服务
 
     Returns:
         bool: 下载是否成功
     """
+    return async_expect.run(download_scout_log_async(sn, station, user_path, target_timestamp, logger, cancel_token,
+                                                     access_service))
+
+
+async def download_scout_log_async(sn: str, station: str, user_path: str, target_timestamp: str, logger=None,
+                                   cancel_token=None, access_service=None) -> bool:
+    """download_scout_log 的协程版本，可在同一个事件循环中并发运行多个"""
     automation = ScoutAutomation(logger)
-    return automation.run_automated_download(sn, station, user_path, target_timestamp)
+    automation.set_cancel_token(cancel_token)
+    automation.set_access_service(access_service)
+    return await automation.run_automated_download_async(sn, station, user_path, target_timestamp)
 
 
-# 批量处理函数
-def batch_download_scout_logs(config_list: List[dict], logger=None) -> dict:
+# 批量处理
+BATCH_FIELDS = ('sn', 'station', 'user_path', 'target_timestamp')
+DEFAULT_BATCH_PARALLEL = 4
+DEFAULT_BATCH_RETRIES = 2
+DEFAULT_RETRY_BACKOFF = 5.0
+
+
+def load_batch_file(path) -> List[dict]:
+    """读取批量任务文件
+
+    - CSV: 表头包含 sn, station, user_path, target_timestamp
+    - JSON: 任务列表，或 {"items": [...]}
+    """
+    path = Path(path)
+    if path.suffix.lower() == '.csv':
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            items = list(csv.DictReader(f))
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        items = data.get('items', []) if isinstance(data, dict) else data
+
+    config_list = []
+    for number, item in enumerate(items, 1):
+        config = {field: str(item.get(field) or '').strip() for field in BATCH_FIELDS}
+        missing = [field for field in BATCH_FIELDS if not config[field]]
+        if missing:
+            raise ValueError(f"第 {number} 条任务缺少字段: {', '.join(missing)}")
+        config_list.append(config)
+    return config_list
+
+
+class BatchLedger:
+    """批量下载台账 - 记录已完成的 (sn, station, target_timestamp)，重新运行同一批任务时跳过
+
+    每完成一条追加一行 JSON，中途退出也不会丢失已完成的记录。
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.completed = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # 写入中断的最后一行
+                    self.completed[self.key(entry)] = entry
+
+    @staticmethod
+    def key(config):
+        return config['sn'], config['station'], config['target_timestamp']
+
+    def is_done(self, config):
+        return self.key(config) in self.completed
+
+    def mark_done(self, config, attempts, duration):
+        entry = {field: config[field] for field in BATCH_FIELDS}
+        entry.update(attempts=attempts, duration=round(duration, 1), finished=time.time())
+        self.completed[self.key(config)] = entry
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def default_ledger_path(batch_file):
+    """批量文件旁边的台账文件: jobs.csv -> jobs.ledger.jsonl"""
+    batch_file = Path(batch_file)
+    return batch_file.with_name(f"{batch_file.stem}.ledger.jsonl")
+
+
+def batch_download_scout_logs(config_list: List[dict], logger=None, max_parallel=DEFAULT_BATCH_PARALLEL,
+                              retries=DEFAULT_BATCH_RETRIES, backoff=DEFAULT_RETRY_BACKOFF,
+                              ledger_path=None, cancel_token=None, access_service=None) -> dict:
     """
     批量下载多个scout日志
 
     Args:
         config_list: 配置列表，每个元素包含sn, station, user_path, target_timestamp
         logger: 统一的日志记录器
+        max_parallel: 同时下载的最大数量
+        retries: 每条任务失败后的重试次数
+        backoff: 首次重试前的等待秒数，之后每次翻倍
+        ledger_path: 台账文件路径，为空时不跳过也不记录
+        cancel_token: 取消令牌
+        access_service: 访问状态服务，缓存状态为未通过时剩余任务直接失败，不再等待认证超时
 
     Returns:
         dict: 结果统计
     """
+    return async_expect.run(batch_download_scout_logs_async(
+        config_list, logger, max_parallel, retries, backoff, ledger_path, cancel_token, access_service
+    ))
+
+
+async def batch_download_scout_logs_async(config_list: List[dict], logger=None, max_parallel=DEFAULT_BATCH_PARALLEL,
+                                          retries=DEFAULT_BATCH_RETRIES, backoff=DEFAULT_RETRY_BACKOFF,
+                                          ledger_path=None, cancel_token=None, access_service=None) -> dict:
+    """batch_download_scout_logs 的协程版本 - 所有任务在同一个事件循环中并发执行"""
+
+    def log(level, message):
+        if logger:
+            logger.log(level, message)
+        else:
+            print(f"[{level}] {message}")
+
     results = {
         'total': len(config_list),
         'success': 0,
         'failed': 0,
+        'skipped': 0,
         'details': []
     }
-
-    for i, config in enumerate(config_list, 1):
-        if logger:
-            logger.log("系统", f"处理第 {i}/{len(config_list)} 个任务: SN={config['sn']}")
-
-        success = download_scout_log(
-            sn=config['sn'],
-            station=config['station'],
-            user_path=config['user_path'],
-            target_timestamp=config['target_timestamp'],
-            logger=logger
-        )
-
-        result_detail = {
-            'sn': config['sn'],
-            'timestamp': config['target_timestamp'],
-            'success': success
-        }
-
-        if success:
-            results['success'] += 1
+    ledger = BatchLedger(ledger_path) if ledger_path else None
+
+    pending = []
+    for config in config_list:
+        if ledger and ledger.is_done(config):
+            results['skipped'] += 1
+            results['details'].append({'sn': config['sn'], 'timestamp': config['target_timestamp'],
+                                       'success': True, 'skipped': True, 'attempts': 0})
         else:
-            results['failed'] += 1
-
-        results['details'].append(result_detail)
-
-    return results
\ No newline at end of file
+            pending.append(config)
+    if results['skipped']:
+        log("系统", f"台账中已完成 {results['skipped']} 条，跳过")
+
+    async def run_item(number, config):
+        label = f"{number}/{len(pending)} SN={config['sn']}"
+        channel = logger.command_context(f"scout_insight/{config['sn']}") if logger else nullcontext()
+        started = time.monotonic()
+        with channel:
+            for attempt in range(1, retries + 2):
+                if access_service and access_service.require("appleconnect", wait=0) is False:
+                    log("错误", f"任务 {label} 跳过: AppleConnect 未登录")
+                    return {'sn': config['sn'], 'timestamp': config['target_timestamp'],
+                            'success': False, 'attempts': attempt - 1, 'error': "AppleConnect 未登录"}
+                log("系统", f"处理任务 {label}（第 {attempt} 次）")
+                success = await download_scout_log_async(
+                    config['sn'], config['station'], config['user_path'], config['target_timestamp'],
+                    logger, cancel_token, access_service
+                )
+                if success:
+                    if ledger:
+                        ledger.mark_done(config, attempt, time.monotonic() - started)
+                    return {'sn': config['sn'], 'timestamp': config['target_timestamp'],
+                            'success': True, 'attempts': attempt}
+                if attempt <= retries:
+                    delay = backoff * 2 ** (attempt - 1)
+                    log("警告", f"任务 {label} 失败，{delay:g} 秒后重试")
+                    await async_expect.sleep(delay, cancel_token)
+        return {'sn': config['sn'], 'timestamp': config['target_timestamp'],
+                'success': False, 'attempts': retries + 1}
+
+    outcomes = await async_expect.gather_limited(
+        [run_item(number, config) for number, config in enumerate(pending, 1)], max_parallel
+    )
+    for config, outcome in zip(pending, outcomes):
+        if isinstance(outcome, BaseException):
+            log("错误", f"任务 SN={config['sn']} 异常: {outcome}")
+            outcome = {'sn': config['sn'], 'timestamp': config['target_timestamp'],
+                       'success': False, 'error': str(outcome)}
+        results['success' if outcome['success'] else 'failed'] += 1
+        results['details'].append(outcome)
+
+    log("系统", f"批量下载完成: 成功 {results['success']}，失败 {results['failed']}，跳过 {results['skipped']}")
+    if cancel_token:
+        cancel_token.raise_if_cancelled()
+    return results
@@ -1,12 +1,22 @@
+import contextvars
 import json
+import os
 import subprocess
+import tempfile
 import time
 
 import pexpect
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Union, Dict
 
+from utils import cancellation
+
+TMP_SCOUT_PATH = Path("/tmp/scout")
+# 并行模式下把这些临时目录环境变量指向每条命令独立的临时目录，scout 会在其中创建 scout 文件夹
+SCRATCH_ENV_VARS = ("TMPDIR", "TMP", "TEMP")
+
 
 class ScoutValidate:
     def __init__(self):
@@ -15,23 +25,30 @@ class ScoutValidate:
         self.session_path = None
         self.child = None
         self.radar_id = None # 默认雷达号
+        self.cancel_token = None
+        # 非交互式命令的并行数，0 或 1 表示串行执行
+        self.parallel_workers = 0
 
     def set_logger(self, logger):
         self.logger = logger
         if logger:
             self.terminal_logger = logger.get_terminal_logger()
 
+    def set_cancel_token(self, cancel_token):
+        """设置取消令牌"""
+        self.cancel_token = cancel_token
+
     def set_session_path(self, session_path):
         """设置会话路径"""
         self.session_path = session_path
         if self.logger:
             self.logger.set_session_path(session_path)
 
-    def log(self, level, message):
+    def log(self, level, message, *args):
         if self.logger:
-            self.logger.log(level, message)
+            self.logger.log(level, message, *args)
         else:
-            print(f"[{level}] {message}")
+            print(f"[{level}] {message % args if args else message}")
 
     def log_terminal_send(self, data):
         """记录发送到终端的数据"""
@@ -66,7 +83,7 @@ class ScoutValidate:
 
         self.log_terminal_expect(pattern_list)
         try:
-            result = self.child.expect(pattern_list, timeout=timeout)
+            result = cancellation.expect(self.child, pattern_list, timeout, self.cancel_token)
 
             # 记录匹配到的内容
             if self.child.before:
@@ -89,7 +106,7 @@ class ScoutValidate:
                 self.log_terminal_receive(self.child.before)
             raise
         except Exception as e:
-            self.log("错误", f"expect操作异常: {e}")
+            self.log("错误", "expect操作异常: %s", e)
             if self.child.before:
                 self.log_terminal_receive(self.child.before)
             raise
@@ -99,18 +116,22 @@ class ScoutValidate:
         self.log_terminal_send(data + "\n")
         self.child.sendline(data)
 
-    def move_scout_folder(self, output_dir: Path):
+    def set_parallel_workers(self, workers):
+        """设置非交互式命令的并行数"""
+        self.parallel_workers = max(0, int(workers or 0))
+
+    def move_scout_folder(self, output_dir: Path, tmp_scout_path: Path = TMP_SCOUT_PATH):
         """
-        移动/tmp/scout文件夹到输出目录
+        移动scout文件夹到输出目录
 
         Args:
             output_dir: 命令输出目录
+            tmp_scout_path: scout 文件夹位置，串行模式为 /tmp/scout，并行模式为命令独立的临时目录
         """
-        tmp_scout_path = Path("/tmp/scout")
         dest_scout_path = output_dir / "scout"
 
         if not tmp_scout_path.exists():
-            self.log("系统", f"/tmp/scout 文件夹不存在，跳过移动")
+            self.log("系统", f"{tmp_scout_path} 文件夹不存在，跳过移动")
             return
 
         try:
@@ -121,10 +142,10 @@ class ScoutValidate:
 
             # 移动文件夹
             shutil.move(str(tmp_scout_path), str(dest_scout_path))
-            self.log("系统", f"已将 /tmp/scout 移动到 {dest_scout_path}")
+            self.log("系统", f"已将 {tmp_scout_path} 移动到 {dest_scout_path}")
 
         except Exception as e:
-            self.log("错误", f"移动 /tmp/scout 失败: {str(e)}")
+            self.log("错误", f"移动 {tmp_scout_path} 失败: {str(e)}")
 
     def replace_radar_id_in_command(self, command: str) -> str:
         """替换命令中的雷达号占位符"""
@@ -157,6 +178,62 @@ class ScoutValidate:
                 # 每条命令执行后，移动scout文件夹
                 self.move_scout_folder(current_path)
 
+    def collect_leaf_commands(self, config: Dict, base_path: Path, leaves=None):
+        """按配置顺序创建目录，收集所有叶子命令 [(输出目录, 命令), ...]"""
+        if leaves is None:
+            leaves = []
+        for key, value in config.items():
+            current_path = base_path / key
+            current_path.mkdir(exist_ok=True)
+
+            if isinstance(value, dict):
+                self.collect_leaf_commands(value, current_path, leaves)
+            elif isinstance(value, str):
+                leaves.append((current_path, self.replace_radar_id_in_command(value)))
+        return leaves
+
+    def run_leaves_in_parallel(self, config: Dict, base_path: Path):
+        """并行执行非交互式命令
+
+        每条命令有独立的临时目录（通过 TMPDIR 等环境变量重定向），scout 文件夹不再共用 /tmp/scout，
+        命令之间互不影响，可以在有界的工作池中同时执行；输出目录结构和 output.txt 内容与串行模式相同。
+        """
+        leaves = self.collect_leaf_commands(config, base_path)
+        if not leaves:
+            return
+
+        workers = min(self.parallel_workers, len(leaves))
+        self.log("系统", f"并行执行 {len(leaves)} 条非交互式命令，并行数: {workers}")
+        scratch_root = Path(tempfile.mkdtemp(prefix="scout_validate_"))
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scout-validate")
+        try:
+            futures = [
+                # 复制上下文，工作线程中的日志仍归属当前命令
+                pool.submit(contextvars.copy_context().run, self.run_isolated_leaf,
+                            command, output_dir, scratch_root / f"{index:04d}")
+                for index, (output_dir, command) in enumerate(leaves)
+            ]
+            for future in futures:
+                future.result()
+        except BaseException:
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+        finally:
+            pool.shutdown(wait=True)
+            shutil.rmtree(scratch_root, ignore_errors=True)
+
+        if TMP_SCOUT_PATH.exists():
+            self.log("警告", "并行模式下仍生成了 /tmp/scout，scout 可能未使用 TMPDIR，请改用串行模式")
+
+    def run_isolated_leaf(self, command: str, output_dir: Path, scratch_dir: Path):
+        """在独立临时目录中执行一条非交互式命令，并移动其 scout 文件夹"""
+        scratch_dir.mkdir(parents=True)
+        env = dict(os.environ)
+        for name in SCRATCH_ENV_VARS:
+            env[name] = str(scratch_dir)
+        self.execute_with_subprocess(command, output_dir, env=env)
+        self.move_scout_folder(output_dir, scratch_dir / "scout")
+
     def execute_commands_from_config(self, config_file: Union[str, Path], use_pexpect=False):
         """从配置文件执行命令"""
         # 读取配置文件
@@ -170,11 +247,19 @@ class ScoutValidate:
         # 设置会话路径，确保日志文件在正确的位置创建
         self.set_session_path(main_dir)
 
-        # 使用递归方法创建目录结构并执行命令
-        self.create_directory_structure(config, main_dir, use_pexpect)
+        # 交互式命令会选择串口设备，只能串行执行
+        if not use_pexpect and self.parallel_workers > 1:
+            self.run_leaves_in_parallel(config, main_dir)
+        else:
+            # 使用递归方法创建目录结构并执行命令
+            self.create_directory_structure(config, main_dir, use_pexpect)
+
+    def execute_with_subprocess(self, command: str, output_dir: Path, env=None):
+        """使用 subprocess 执行非交互式命令并保存输出
 
-    def execute_with_subprocess(self, command: str, output_dir: Path):
-        """使用 subprocess 执行非交互式命令并保存输出"""
+        Args:
+            env: 子进程环境变量，None 表示继承当前环境
+        """
         output_file = output_dir / "output.txt"
 
         self.log("程序输出", f"开始执行命令(非交互式): {command}")
@@ -184,13 +269,15 @@ class ScoutValidate:
 
         try:
             # 使用 subprocess 执行命令
-            result = subprocess.run(
+            result = cancellation.run_subprocess(
                 command,
+                self.cancel_token,
                 shell=True,
                 capture_output=True,
                 text=True,
                 encoding='utf-8',
-                timeout=600
+                timeout=600,
+                env=env
             )
 
             # 组合标准输出和错误输出
@@ -237,6 +324,8 @@ class ScoutValidate:
         try:
             # 使用 pexpect 执行命令
             self.child = pexpect.spawn(command, encoding='utf-8', timeout=600)
+            if self.cancel_token:
+                self.cancel_token.register(self.child)
             output = ""
 
             # 设置交互处理模式列表
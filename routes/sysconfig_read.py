@@ -1,30 +1,47 @@
 import pexpect
 import sys
 import re
-import time
 import os
 import os.path
 from datetime import datetime
 
 # 导入工具类
 from utils.session_manager import SessionManager, EventHandlers
+from utils.line_assembler import LineAssembler
+from utils import async_expect
+from utils.async_expect import AsyncSession
+from utils.console_broker import AUTO_PORT
+from utils.workflow import WorkflowExecutor, load_workflow
 
 # --- 配置区: 请根据你的需求修改 ---
 
 # --- 配置区: 请根据你的需求修改 ---
 COMMANDS_TO_RUN = ["pwd", "ls", "date"]
+# 与 COMMANDS_TO_RUN 相同的工作流示例，可复制后修改
+DEFAULT_WORKFLOW = os.path.join(os.path.dirname(os.path.abspath(__file__)), "workflows", "sysconfig_read.json")
 USERNAME = 'local'
 PASSWORD = 'local'
 TARGET_PROMPT_STRING = "local@locals-Mac ~ %"
 TARGET_PROMPT_REGEX = re.escape(TARGET_PROMPT_STRING)
 LOG_FILE_NAME = "nanocom_session.log"
 TIMEOUT = 15
+# 串口步骤内部等待提示符的超时比步骤超时少这么多秒，由内部等待先超时并中断命令，不与步骤超时同时触发
+CONSOLE_STEP_MARGIN = 2
 
 
 class sys_read:
     def __init__(self):
         self.logger = None
         self.child = None
+        self.terminal_logger = None  # 终端原始数据由会话管理器的 raw_terminal_logger 记录
+        self.cancel_token = None
+        # 工作流文件路径，设置后代替 COMMANDS_TO_RUN
+        self.workflow = None
+        # 控制台会话代理和当前持有的会话
+        self.console_broker = None
+        self.console = None
+        # 已发送命令但还没等到提示符（超时或步骤被取消），下一条命令前需要先中断
+        self.console_busy = False
         self.session_manager = SessionManager("ATC_Logs")
 
     def set_logger(self, logger):
@@ -32,9 +49,21 @@ class sys_read:
         self.logger = logger
         self.session_manager.set_logger(logger)
 
-    def log(self, level, message):
-        """统一的日志方法"""
-        self.session_manager.log(level, message)
+    def set_cancel_token(self, cancel_token):
+        """设置取消令牌"""
+        self.cancel_token = cancel_token
+
+    def set_console_broker(self, console_broker):
+        """设置控制台会话代理，设置后复用已登录的 nanocom 会话"""
+        self.console_broker = console_broker
+
+    def set_workflow(self, workflow):
+        """设置工作流文件路径"""
+        self.workflow = workflow
+
+    def log(self, level, message, *args):
+        """统一的日志方法，args 用于延迟格式化"""
+        self.session_manager.log(level, message, *args)
 
     def log_terminal_send(self, data):
         """记录发送到终端的数据"""
@@ -56,11 +85,11 @@ class sys_read:
         if self.terminal_logger:
             self.terminal_logger.log_timeout()
 
-    def expect_with_logging(self, pattern_list, timeout=None):
+    async def expect_with_logging(self, pattern_list, timeout=None):
         """带日志记录的expect方法"""
         self.log_terminal_expect(pattern_list)
         try:
-            result = self.child.expect(pattern_list, timeout=timeout)
+            result = await self.child.expect(pattern_list, timeout)
             # 记录匹配到的内容
             if self.child.before:
                 self.log_terminal_receive(self.child.before)
@@ -73,7 +102,7 @@ class sys_read:
                 self.log_terminal_receive(self.child.before)
             raise
         except Exception as e:
-            self.log("错误", f"expect操作异常: {e}")
+            self.log("错误", "expect操作异常: %s", e)
             if self.child.before:
                 self.log_terminal_receive(self.child.before)
             raise
@@ -85,46 +114,21 @@ class sys_read:
 
     def create_session_directory(self):
         """创建测试会话目录结构"""
-        try:
-            desktop_path = os.path.expanduser("~/Desktop")
-
-            # 创建日期文件夹
-            date_str = datetime.now().strftime("%Y-%m-%d")
-            date_folder = os.path.join(desktop_path, f"ATC_Logs_{date_str}")
-            os.makedirs(date_folder, exist_ok=True)
-
-            # 创建测试会话文件夹
-            session_time = datetime.now().strftime("%H%M%S")
-            self.test_session_path = os.path.join(date_folder, f"test_session_{session_time}")
-            os.makedirs(self.test_session_path, exist_ok=True)
-
-            self.log("系统", f"测试会话目录已创建: {self.test_session_path}")
-            return True
-
-        except Exception as e:
-            self.log("错误", f"创建会话目录失败: {e}")
-            return False
+        self.test_session_path = self.session_manager.create_session_directory("test")
+        return self.test_session_path is not None
 
     def setup_logging(self):
-        """设置日志文件 - 完整的终端会话记录"""
+        """设置日志文件 - 完整的终端会话记录（分段滚动并压缩，与会话管理器共用实现）"""
         if not self.create_session_directory():
             return False
 
-        try:
-            # 完整的终端会话日志文件路径
-            log_file_path = os.path.join(self.test_session_path, LOG_FILE_NAME)
-
-            # 打开原始日志文件 - 使用二进制写入模式，避免编码问题
-            self.raw_log_file = open(log_file_path, 'wb')
-            self.session_start_time = datetime.now()
-
-            self.log("系统", f"完整终端会话日志将保存到: {log_file_path}")
-            return True
-
-        except Exception as e:
-            self.log("错误", f"设置日志文件失败: {e}")
+        if not self.session_manager.setup_terminal_logging(LOG_FILE_NAME):
             return False
 
+        self.raw_log_file = self.session_manager.terminal_log_file
+        self.session_start_time = datetime.now()
+        return True
+
     def create_raw_terminal_logger(self):
         """创建原始终端日志记录器 - 直接记录所有原始数据，不进行额外处理"""
 
@@ -132,7 +136,7 @@ class sys_read:
             def __init__(self, raw_log_file, ui_logger):
                 self.raw_log_file = raw_log_file
                 self.ui_logger = ui_logger
-                self.buffer = b''  # 使用字节缓冲区
+                self.line_assembler = LineAssembler()  # 增量行组装
 
             def write(self, data):
                 # 如果是字符串，转换为字节
@@ -145,35 +149,21 @@ class sys_read:
                 self.raw_log_file.write(data_bytes)
                 self.raw_log_file.flush()
 
-                # 同时更新缓冲区用于UI显示
-                self.buffer += data_bytes
-                self._process_buffer_for_ui()
+                # 同时增量组装完整行用于UI显示
+                self._process_buffer_for_ui(data_bytes)
 
-            def _process_buffer_for_ui(self):
-                """处理缓冲区数据用于UI显示"""
+            def _process_buffer_for_ui(self, data_bytes):
+                """处理新到达的数据用于UI显示"""
                 try:
-                    # 尝试解码为UTF-8
-                    decoded = self.buffer.decode('utf-8', errors='ignore')
-
-                    # 按行分割，处理完整的行
-                    lines = decoded.split('\n')
-
-                    # 如果最后一行不完整，保留在缓冲区中
-                    if not decoded.endswith('\n'):
-                        self.buffer = lines[-1].encode('utf-8')
-                        lines = lines[:-1]
-                    else:
-                        self.buffer = b''
-
-                    # 处理完整的行
-                    for line in lines:
+                    # 只处理新数据中产生的完整行
+                    for line in self.line_assembler.feed(data_bytes):
                         line = line.strip()
                         if not line:
                             continue
 
                         # 检测重要事件
                         if 'Serial device' in line:
-                            self.ui_logger.log("系统输出", f"发现设备: {line}")
+                            self.ui_logger.log("系统输出", "发现设备: %s", line)
                         elif 'Select a device by its number' in line:
                             self.ui_logger.log("系统输出", "等待选择设备...")
                         elif 'login:' in line.lower() or 'username:' in line.lower():
@@ -184,8 +174,8 @@ class sys_read:
                             self.ui_logger.log("系统输出", "进入目标系统")
 
                 except Exception as e:
-                    # 如果解码失败，清空缓冲区
-                    self.buffer = b''
+                    # 如果处理失败，清空缓冲区
+                    self.line_assembler.reset()
 
             def flush(self):
                 self.raw_log_file.flush()
@@ -194,7 +184,7 @@ class sys_read:
                 """专门记录命令"""
                 timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 # 在UI中显示命令
-                self.ui_logger.log("命令输入", f"执行命令: {command}")
+                self.ui_logger.log("命令输入", "执行命令: %s", command)
                 # 同时确保命令被写入日志文件
                 command_bytes = f"\n[{timestamp}] [COMMAND] 执行命令: {command}\n".encode('utf-8')
                 self.raw_log_file.write(command_bytes)
@@ -234,10 +224,10 @@ class sys_read:
 
         return None
 
-    def wait_for_prompt(self, timeout=30):
+    async def wait_for_prompt(self, timeout=30):
         """等待目标提示符出现"""
         try:
-            self.expect_with_logging(TARGET_PROMPT_REGEX, timeout=timeout)
+            await self.expect_with_logging(TARGET_PROMPT_REGEX, timeout=timeout)
             return True
         except pexpect.TIMEOUT:
             self.log("错误", f"等待提示符超时 ({timeout}秒)")
@@ -246,10 +236,194 @@ class sys_read:
             self.log("错误", "终端会话意外结束")
             return False
 
+    async def recover_console(self, timeout=TIMEOUT):
+        """命令超时后发送 Ctrl+C 并等待提示符；回到提示符返回 True，否则串口保持 console_busy，归还时关闭"""
+        self.log("警告", "发送 Ctrl+C 中断未完成的命令")
+        self.child.sendintr()
+        self.console_busy = not await self.wait_for_prompt(timeout)
+        if not self.console_busy:
+            await self.child.discard_pending()
+        return not self.console_busy
+
+    async def run_commands(self):
+        """依次执行 COMMANDS_TO_RUN，全部完成返回 True"""
+        for cmd in COMMANDS_TO_RUN:
+            # 发送命令
+            self.console_busy = True
+            self.child.sendline(cmd)
+            if self.session_manager.raw_terminal_logger:
+                self.session_manager.raw_terminal_logger.log_command(cmd)
+
+            # 等待命令完成
+            if not await self.wait_for_prompt():
+                await self.recover_console()
+                return False
+            self.console_busy = False
+
+            await async_expect.sleep(0.5, self.cancel_token)
+        return True
+
+    async def run_workflow(self):
+        """按工作流文件执行命令，步骤耗时保存到会话目录的 workflow_report.json"""
+        try:
+            workflow = load_workflow(self.workflow)
+        except Exception as e:
+            self.log("错误", f"读取工作流失败 {self.workflow}: {e}")
+            return False
+
+        executor = WorkflowExecutor(workflow, self, self.cancel_token)
+        executor.add_transport("console", self.run_console_step, limit=1)
+        success = await executor.run_async({"session_path": self.session_manager.get_session_path()})
+        if self.console_busy:
+            # 最后一个串口步骤超时被取消，串口上可能还在执行
+            await self.recover_console()
+        executor.summary()
+        try:
+            executor.write_report(os.path.join(self.session_manager.get_session_path(), "workflow_report.json"))
+        except Exception as e:
+            self.log("警告", f"保存步骤耗时失败: {e}")
+        return success
+
+    async def run_console_step(self, step, context):
+        """串口步骤: 执行 command 并等待提示符，有 save_as 时把命令输出保存到会话目录"""
+        command = step.render("command", context)
+        if not command:
+            raise ValueError("串口步骤缺少 command")
+        # 上一个串口步骤超时被取消时命令可能还在执行，先中断并等回提示符
+        if self.console_busy and not await self.recover_console():
+            raise RuntimeError("串口未回到提示符")
+        self.console_busy = True
+        self.child.sendline(command)
+        if self.session_manager.raw_terminal_logger:
+            self.session_manager.raw_terminal_logger.log_command(command)
+        if not await self.wait_for_prompt(max(1, step.timeout - CONSOLE_STEP_MARGIN) if step.timeout else 30):
+            await self.recover_console()
+            return False
+        self.console_busy = False
+
+        save_as = step.render("save_as", context)
+        if save_as:
+            output = self.child.before.decode('utf-8', errors='replace') if self.child.before else ""
+            with open(os.path.join(context["session_path"], save_as), 'w', encoding='utf-8') as f:
+                f.write(output)
+        return True
+
+    async def connect_nanocom(self):
+        """启动 nanocom、选择端口并登录到 OS 提示符，成功返回 True"""
+        # 启动 nanocom 进程
+        self.child = AsyncSession('/usr/local/bin/nanocom -y', timeout=TIMEOUT, cancel_token=self.cancel_token)
+
+        # 设置终端日志记录
+        if self.session_manager.raw_terminal_logger:
+            self.child.logfile = self.session_manager.raw_terminal_logger
+
+        # 动态端口选择
+        self.log("程序输出", "正在等待 nanocom 加载设备列表...")
+
+        # 等待设备列表
+        try:
+            await self.expect_with_logging([r'Select a device by its number'], timeout=TIMEOUT)
+        except (pexpect.TIMEOUT, pexpect.EOF) as e:
+            self.log("错误", "启动 nanocom 后未找到 'Select a device' 提示")
+            return False
+
+        # 获取设备列表输出并查找端口
+        output_before = self.child.before.decode('utf-8', errors='ignore') if self.child.before else ""
+        port_number = self.find_port_number(output_before)
+
+        if not port_number:
+            self.log("错误", "没有找到可用端口 (C-line 或 S-line)")
+            return False
+
+        self.log("程序输出", f"最终选择端口: {port_number}")
+
+        # 发送端口选择命令
+        self.sendline_with_logging(port_number)
+
+        # 等待连接建立
+        await async_expect.sleep(2, self.cancel_token)
+
+        # 发送回车唤醒提示符
+        self.sendline_with_logging("")
+
+        # 检测系统状态
+        self.log("程序输出", "正在检测机台状态...")
+
+        index = await self.expect_with_logging([
+            TARGET_PROMPT_REGEX,  # 索引 0 (OS Mode)
+            r'(?i)login:|username:',  # 索引 1 (Login needed)
+            r'(?i)password:',  # 索引 2 (Password only)
+            re.escape(":)"),  # 索引 3 (Diags)
+            pexpect.TIMEOUT,  # 索引 4 (Booting/Unknown)
+            pexpect.EOF  # 索引 5 (Crashed)
+        ], timeout=TIMEOUT)
+
+        if index == 0:  # OS Mode
+            self.log("程序输出", f"状态: OS 模式 (检测到 '{TARGET_PROMPT_STRING}')")
+            self.log("程序输出", "无需登录, 准备执行命令")
+
+        elif index == 1:  # login/username
+            if not USERNAME or not PASSWORD:
+                self.log("错误", "检测到登录提示, 但脚本中未配置 USERNAME/PASSWORD")
+                return False
+            self.log("程序输出", "状态: 需要登录。正在发送用户名")
+            self.sendline_with_logging(USERNAME)
+            await self.expect_with_logging([r'(?i)password:'], timeout=5)
+            self.log("程序输出", "正在发送密码")
+            self.sendline_with_logging(PASSWORD)
+            if not await self.wait_for_prompt():
+                return False
+            self.log("程序输出", f"登录成功, 已进入 OS 模式 ({TARGET_PROMPT_STRING})")
+
+        elif index == 2:  # password only
+            if not PASSWORD:
+                self.log("错误", "检测到密码提示, 但脚本中未配置 PASSWORD")
+                return False
+            self.log("程序输出", "状态: 需要密码。正在发送密码")
+            self.sendline_with_logging(PASSWORD)
+            if not await self.wait_for_prompt():
+                return False
+            self.log("程序输出", f"登录成功, 已进入 OS 模式 ({TARGET_PROMPT_STRING})")
+
+        elif index == 3:  # Diags
+            self.log("错误", "检测到 Diags 模式 (':)')")
+            self.log("错误", "命令无法在此模式下执行, 脚本终止。")
+            return False
+
+        elif index == 4:  # TIMEOUT
+            self.log("错误", f"发送 'Enter' 后超时 ({TIMEOUT}秒)")
+            self.log("错误", "状态: 未知或正在 Booting (未收到任何已知提示符)")
+            return False
+
+        elif index == 5:  # EOF
+            self.log("错误", "进程在检测状态时意外终止 (EOF)")
+            return False
+
+        return True
+
+    async def _connect_for_broker(self):
+        """会话代理没有可用会话时调用: 登录成功返回会话，否则关闭并返回 None"""
+        try:
+            if await self.connect_nanocom():
+                return self.child
+        except BaseException:
+            if self.child:
+                await self.child.aclose()
+                self.child = None
+            raise
+        if self.child:
+            await self.child.aclose()
+            self.child = None
+        return None
+
     def main(self, keep_alive=False):
+        """同步入口: 在当前线程的事件循环中运行 main_async"""
+        return async_expect.run(self.main_async(keep_alive))
+
+    async def main_async(self, keep_alive=False):
         # 使用会话管理器设置完整会话
         event_handlers = {
-            r'serial device': lambda line: self.logger.log("系统输出", f"发现设备: {line}"),
+            r'serial device': lambda line: self.logger.log("系统输出", "发现设备: %s", line),
             r'select a device by its number': lambda line: self.logger.log("系统输出", "等待选择设备..."),
             r'login:|username:': EventHandlers.create_login_handler(self.logger),
             r'password:': lambda line: self.logger.log("系统输出", "需要密码"),
@@ -258,130 +432,58 @@ class sys_read:
 
         if not self.session_manager.setup_complete_session("nanocom", LOG_FILE_NAME, event_handlers):
             self.log("错误", "会话设置失败")
-            return
+            return False
 
+        # completed: 命令全部成功；finished: 命令循环正常结束（会话可以归还给代理）
+        completed = finished = False
         try:
             self.log("系统", "自动化脚本启动")
             self.log("系统", f"目标 OS 提示符已设为: '{TARGET_PROMPT_STRING}'")
 
-            # 启动 nanocom 进程
-            self.child = pexpect.spawn('/usr/local/bin/nanocom -y', timeout=TIMEOUT)
-
-            # 设置终端日志记录
-            if self.session_manager.raw_terminal_logger:
-                self.child.logfile = self.session_manager.raw_terminal_logger
-
-            # 动态端口选择
-            self.log("程序输出", "正在等待 nanocom 加载设备列表...")
-
-            # 等待设备列表
-            try:
-                self.expect_with_logging([r'Select a device by its number'], timeout=TIMEOUT)
-            except (pexpect.TIMEOUT, pexpect.EOF) as e:
-                self.log("错误", "启动 nanocom 后未找到 'Select a device' 提示")
-                return
-
-            # 获取设备列表输出并查找端口
-            output_before = self.child.before.decode('utf-8', errors='ignore') if self.child.before else ""
-            port_number = self.find_port_number(output_before)
-
-            if not port_number:
-                self.log("错误", "没有找到可用端口 (C-line 或 S-line)")
-                return
-
-            self.log("程序输出", f"最终选择端口: {port_number}")
-
-            # 发送端口选择命令
-            self.sendline_with_logging(port_number)
-
-            # 等待连接建立
-            time.sleep(2)
-
-            # 发送回车唤醒提示符
-            self.sendline_with_logging("")
-
-            # 检测系统状态
-            self.log("程序输出", "正在检测机台状态...")
-
-            index = self.expect_with_logging([
-                TARGET_PROMPT_REGEX,  # 索引 0 (OS Mode)
-                r'(?i)login:|(?i)username:',  # 索引 1 (Login needed)
-                r'(?i)password:',  # 索引 2 (Password only)
-                re.escape(":)"),  # 索引 3 (Diags)
-                pexpect.TIMEOUT,  # 索引 4 (Booting/Unknown)
-                pexpect.EOF  # 索引 5 (Crashed)
-            ], timeout=TIMEOUT)
-
-            if index == 0:  # OS Mode
-                self.log("程序输出", f"状态: OS 模式 (检测到 '{TARGET_PROMPT_STRING}')")
-                self.log("程序输出", "无需登录, 准备执行命令")
-
-            elif index == 1:  # login/username
-                if not USERNAME or not PASSWORD:
-                    self.log("错误", "检测到登录提示, 但脚本中未配置 USERNAME/PASSWORD")
-                    return
-                self.log("程序输出", "状态: 需要登录。正在发送用户名")
-                self.sendline_with_logging(USERNAME)
-                self.expect_with_logging([r'(?i)password:'], timeout=5)
-                self.log("程序输出", "正在发送密码")
-                self.sendline_with_logging(PASSWORD)
-                if not self.wait_for_prompt():
-                    return
-                self.log("程序输出", f"登录成功, 已进入 OS 模式 ({TARGET_PROMPT_STRING})")
-
-            elif index == 2:  # password only
-                if not PASSWORD:
-                    self.log("错误", "检测到密码提示, 但脚本中未配置 PASSWORD")
-                    return
-                self.log("程序输出", "状态: 需要密码。正在发送密码")
-                self.sendline_with_logging(PASSWORD)
-                if not self.wait_for_prompt():
-                    return
-                self.log("程序输出", f"登录成功, 已进入 OS 模式 ({TARGET_PROMPT_STRING})")
-
-            elif index == 3:  # Diags
-                self.log("错误", "检测到 Diags 模式 (':)')")
-                self.log("错误", "命令无法在此模式下执行, 脚本终止。")
-                return
-
-            elif index == 4:  # TIMEOUT
-                self.log("错误", f"发送 'Enter' 后超时 ({TIMEOUT}秒)")
-                self.log("错误", "状态: 未知或正在 Booting (未收到任何已知提示符)")
-                return
-
-            elif index == 5:  # EOF
-                self.log("错误", "进程在检测状态时意外终止 (EOF)")
-                return
+            if self.console_broker:
+                # 复用已登录的控制台，没有时由代理调用 connect_nanocom 登录
+                self.console = await self.console_broker.acquire(AUTO_PORT, self._connect_for_broker,
+                                                                 self.cancel_token)
+                if self.console is None:
+                    return False
+                self.child = self.console.session
+                self.child.timeout = TIMEOUT
+                if self.session_manager.raw_terminal_logger:
+                    self.child.logfile = self.session_manager.raw_terminal_logger
+            elif not await self.connect_nanocom():
+                return False
 
             # 执行命令循环
             self.log("系统", "机台已就绪, 正在开始执行命令...")
 
-            for cmd in COMMANDS_TO_RUN:
-                # 发送命令
-                self.child.sendline(cmd)
-                if self.session_manager.raw_terminal_logger:
-                    self.session_manager.raw_terminal_logger.log_command(cmd)
-
-                # 等待命令完成
-                if not self.wait_for_prompt():
-                    break
-
-                time.sleep(0.5)
+            if self.workflow:
+                completed = await self.run_workflow()
+            else:
+                completed = await self.run_commands()
+            finished = True
 
-            self.log("系统", "所有命令在机台执行完毕")
+            if completed:
+                self.log("系统", "所有命令在机台执行完毕")
+            else:
+                self.log("错误", "命令未全部成功执行")
 
         except (pexpect.TIMEOUT, pexpect.EOF) as e:
             self.log("错误", f"脚本执行期间发生严重错误: {e}")
         except Exception as e:
             self.log("错误", f"发生意外的 Python 错误: {e}")
         finally:
-            # 清理资源
-            if self.child and self.child.isalive():
-                self.child.terminate()
+            # 清理资源: 会话来自代理时归还（未正常结束则让代理关闭），否则直接关闭
+            if self.console:
+                # 串口未回到提示符时也让代理关闭会话
+                self.console_broker.release(self.console, healthy=finished and not self.console_busy)
+                self.console = None
+            elif self.child and self.child.isalive():
+                await self.child.aclose()
 
             # 清理会话管理器资源
             self.session_manager.cleanup()
             self.log("系统", f"脚本结束，完整日志保存在: {self.session_manager.get_session_path()}")
+        return completed
 
 
 if __name__ == "__main__":
@@ -11,6 +11,7 @@ class CommandButtonPanel(QWidget):
     # 信号定义
     command_triggered = pyqtSignal(str)  # command_name
     config_triggered = pyqtSignal(str)  # command_name
+    cancel_triggered = pyqtSignal(str)  # command_name
 
     def __init__(self):
         super().__init__()
@@ -28,6 +29,7 @@ class CommandButtonPanel(QWidget):
             ("开始记录", "start_logging", True),
             ("停止记录", "stop_logging", True),
             ("清空日志", "clear_log", True),
+            ("查看日志", "view_logs", True),
             ("Nanocom", "nanocom", False),
             ("Reboot Log", "reboot_log", False),
             ("Scout Validate", "scout_validate", False),
@@ -62,10 +64,19 @@ class CommandButtonPanel(QWidget):
             settings_button.setProperty("commandName", command_name)
             settings_button.clicked.connect(lambda: self.config_triggered.emit(command_name))
             button_layout.addWidget(settings_button)
+
+            # 取消按钮
+            cancel_button = QToolButton()
+            cancel_button.setText("✕")
+            cancel_button.setToolTip(f"取消 {text}")
+            cancel_button.setFixedSize(30, 40)
+            cancel_button.setProperty("commandName", command_name)
+            cancel_button.clicked.connect(lambda: self.cancel_triggered.emit(command_name))
+            button_layout.addWidget(cancel_button)
         else:
             # 占位符保持对齐
             placeholder = QWidget()
-            placeholder.setFixedSize(30, 40)
+            placeholder.setFixedSize(65, 40)
             button_layout.addWidget(placeholder)
 
         layout.addLayout(button_layout)
@@ -0,0 +1,66 @@
+# ui/components/job_panel.py
+from PyQt5.QtWidgets import QListWidget, QListWidgetItem, QMenu
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QColor
+
+from core.job_scheduler import QUEUED, RUNNING, FINISHED, FAILED, CANCELLED
+
+STATE_COLORS = {
+    QUEUED: "#adb5bd",
+    RUNNING: "#ffd43b",
+    FINISHED: "#51cf66",
+    FAILED: "#ff6b6b",
+    CANCELLED: "#868e96",
+}
+
+
+class JobQueuePanel(QListWidget):
+    """任务队列面板 - 显示排队中、运行中和已结束的任务"""
+
+    def __init__(self, scheduler, history_rows=20):
+        super().__init__()
+        self.scheduler = scheduler
+        self.history_rows = history_rows
+        self.setStyleSheet("""
+            QListWidget {
+                background-color: #1e1e1e;
+                color: #ffffff;
+                border: 1px solid #555;
+                border-radius: 5px;
+            }
+        """)
+
+        scheduler.job_queued.connect(self.refresh)
+        scheduler.job_started.connect(self.refresh)
+        scheduler.job_finished.connect(self.refresh)
+
+        # 右键取消排队中或运行中的任务
+        self.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.customContextMenuRequested.connect(self.show_context_menu)
+
+        # 定时刷新运行时长
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(1000)
+
+    def refresh(self, *args):
+        """重建列表: 运行中 -> 排队中 -> 最近结束"""
+        jobs = (self.scheduler.running_jobs()
+                + self.scheduler.queued_jobs()
+                + list(reversed(self.scheduler.finished_jobs()[-self.history_rows:])))
+        self.clear()
+        for job in jobs:
+            item = QListWidgetItem(job.describe())
+            item.setForeground(QColor(STATE_COLORS.get(job.state, "#ffffff")))
+            item.setData(Qt.UserRole, job.id)
+            item.setData(Qt.UserRole + 1, job.state)
+            self.addItem(item)
+
+    def show_context_menu(self, pos):
+        item = self.itemAt(pos)
+        if item is None or item.data(Qt.UserRole + 1) not in (QUEUED, RUNNING):
+            return
+        menu = QMenu(self)
+        cancel_action = menu.addAction("取消任务")
+        if menu.exec_(self.mapToGlobal(pos)) == cancel_action:
+            self.scheduler.cancel(item.data(Qt.UserRole))
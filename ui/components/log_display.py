@@ -1,84 +1,275 @@
 # ui/components/log_display.py
-from PyQt5.QtWidgets import QTextEdit
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QFont, QTextCursor, QColor
+import time
 from datetime import datetime
 
+from PyQt5.QtWidgets import QAbstractScrollArea, QApplication, QMenu
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QFont, QColor, QPainter, QFontMetrics
+
+# 界面最多保留的日志行数，超出后覆盖最旧的记录（文件日志不受影响）
+DEFAULT_CAPACITY = 100000
+
+# 根据日志级别设置颜色
+LEVEL_COLORS = {
+    "错误": "#ff6b6b",
+    "警告": "#ffa94d",
+    "信息": "#51cf66",
+    "系统": "#339af0",
+    "程序输出": "#ffd43b",
+    "命令输入": "#ff8787",
+    "系统输出": "#74c0fc",
+    "自动": "#da77f2"
+}
+DEFAULT_LEVEL_COLOR = "#ffffff"
+TIMESTAMP_COLOR = "#adb5bd"  # 灰色时间戳
+BRACKET_COLOR = "#868e96"  # 灰色括号
+MESSAGE_COLOR = "#ffffff"  # 白色消息
+BACKGROUND_COLOR = "#1e1e1e"
+
+
+class LogRecord:
+    """界面日志记录"""
+
+    __slots__ = ('timestamp', 'level', 'message')
+
+    def __init__(self, timestamp, level, message):
+        self.timestamp = timestamp
+        self.level = level
+        self.message = message
+
+
+class LogRingBuffer:
+    """固定容量的环形缓冲区，追加为 O(1)，内存占用恒定"""
+
+    __slots__ = ('capacity', '_items', '_start', '_count')
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = max(1, capacity)
+        self._items = [None] * self.capacity
+        self._start = 0
+        self._count = 0
+
+    def append(self, item):
+        """追加一条记录，缓冲区已满时覆盖最旧的记录并返回 True"""
+        if self._count < self.capacity:
+            self._items[(self._start + self._count) % self.capacity] = item
+            self._count += 1
+            return False
+
+        self._items[self._start] = item
+        self._start = (self._start + 1) % self.capacity
+        return True
+
+    def __getitem__(self, index):
+        return self._items[(self._start + index) % self.capacity]
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    def clear(self):
+        self._items = [None] * self.capacity
+        self._start = 0
+        self._count = 0
+
+
+class LogDisplay(QAbstractScrollArea):
+    """日志显示组件 - 基于环形缓冲区的虚拟化视图，只绘制可见行"""
 
-class LogDisplay(QTextEdit):
-    """日志显示组件"""
+    PADDING = 10
 
-    def __init__(self):
+    def __init__(self, capacity=DEFAULT_CAPACITY):
         super().__init__()
+        self.records = LogRingBuffer(capacity)
+
+        # 时间戳前缀按秒缓存
+        self._cached_second = None
+        self._cached_timestamp = ""
+
+        self._max_line_width = 0
         self.init_ui()
 
     def init_ui(self):
         """初始化UI"""
-        self.setReadOnly(True)
-        self.setLineWrapMode(QTextEdit.NoWrap)
-
         # 设置字体和样式
         font = QFont("Consolas", 10)
         self.setFont(font)
         self.setStyleSheet("""
-            QTextEdit {
+            QAbstractScrollArea {
                 background-color: #1e1e1e;
-                color: #ffffff;
                 border: 1px solid #555;
                 border-radius: 5px;
-                padding: 10px;
             }
         """)
+        self.viewport().setAutoFillBackground(False)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
+        self.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.customContextMenuRequested.connect(self._show_context_menu)
+
+        # 缓存颜色和字体度量
+        self._background = QColor(BACKGROUND_COLOR)
+        self._timestamp_color = QColor(TIMESTAMP_COLOR)
+        self._bracket_color = QColor(BRACKET_COLOR)
+        self._message_color = QColor(MESSAGE_COLOR)
+        self._default_level_color = QColor(DEFAULT_LEVEL_COLOR)
+        self._level_colors = {level: QColor(color) for level, color in LEVEL_COLORS.items()}
+        self._update_metrics()
+
+    def _update_metrics(self):
+        """缓存字体相关的尺寸"""
+        metrics = QFontMetrics(self.font())
+        self._metrics = metrics
+        self._line_height = metrics.height()
+        self._ascent = metrics.ascent()
+        self._wide_char_width = metrics.horizontalAdvance("中")
+        self._timestamp_width = metrics.horizontalAdvance("[0000-00-00 00:00:00] ")
+        self._open_bracket_width = metrics.horizontalAdvance("[")
+        self._close_bracket_width = metrics.horizontalAdvance("] ")
+        self._level_widths = {}
+
+    def _level_width(self, level):
+        """级别文本宽度（按级别缓存）"""
+        width = self._level_widths.get(level)
+        if width is None:
+            width = self._metrics.horizontalAdvance(level)
+            self._level_widths[level] = width
+        return width
+
+    def _timestamp(self):
+        """当前时间戳（同一秒内复用）"""
+        second = int(time.time())
+        if second != self._cached_second:
+            self._cached_second = second
+            self._cached_timestamp = datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+        return self._cached_timestamp
 
     def add_log(self, level, message):
         """添加日志"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.add_logs([(level, message)])
+
+    def add_logs(self, batch):
+        """批量添加日志"""
+        if not batch:
+            return
+
+        scrollbar = self.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()
+
+        timestamp = self._timestamp()
+        evicted = 0
+        for level, message in batch:
+            message = str(message).replace("\n", " ")
+            if self.records.append(LogRecord(timestamp, level, message)):
+                evicted += 1
+            self._track_width(level, message)
+
+        self._update_scrollbars()
+
+        # 在底部时自动滚动，否则保持当前查看的内容不动
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+        elif evicted:
+            scrollbar.setValue(max(0, scrollbar.value() - evicted))
+
+        self.viewport().update()
+
+    def _track_width(self, level, message):
+        """更新最长行宽度，只有可能超过当前最大值的行才精确测量"""
+        prefix = (self._timestamp_width + self._open_bracket_width
+                  + self._level_width(level) + self._close_bracket_width)
+        if prefix + len(message) * self._wide_char_width <= self._max_line_width:
+            return
+        width = prefix + self._metrics.horizontalAdvance(message)
+        if width > self._max_line_width:
+            self._max_line_width = width
+
+    def _visible_rows(self):
+        return max(1, self.viewport().height() // self._line_height)
+
+    def _update_scrollbars(self):
+        """根据记录数和视口大小更新滚动条范围"""
+        rows = self._visible_rows()
+        vertical = self.verticalScrollBar()
+        vertical.setPageStep(rows)
+        vertical.setSingleStep(1)
+        vertical.setRange(0, max(0, len(self.records) - rows))
+
+        horizontal = self.horizontalScrollBar()
+        width = self.viewport().width()
+        horizontal.setPageStep(width)
+        horizontal.setSingleStep(self._wide_char_width)
+        horizontal.setRange(0, max(0, self._max_line_width + self.PADDING * 2 - width))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        scrollbar = self.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()
+        self._update_scrollbars()
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+
+    def scrollContentsBy(self, dx, dy):
+        self.viewport().update()
+
+    def paintEvent(self, event):
+        """只绘制可见区域内的行"""
+        painter = QPainter(self.viewport())
+        painter.fillRect(event.rect(), self._background)
+        painter.setFont(self.font())
+
+        first = self.verticalScrollBar().value()
+        last = min(len(self.records), first + self._visible_rows() + 1)
+        x0 = self.PADDING - self.horizontalScrollBar().value()
+        y = self._ascent
 
-        # 根据日志级别设置颜色
-        color_map = {
-            "错误": "#ff6b6b",
-            "警告": "#ffa94d",
-            "信息": "#51cf66",
-            "系统": "#339af0",
-            "程序输出": "#ffd43b",
-            "命令输入": "#ff8787",
-            "系统输出": "#74c0fc",
-            "自动": "#da77f2"
-        }
+        for index in range(first, last):
+            record = self.records[index]
+            x = x0
 
-        color = color_map.get(level, "#ffffff")
+            painter.setPen(self._timestamp_color)
+            painter.drawText(x, y, f"[{record.timestamp}] ")
+            x += self._timestamp_width
 
-        # 添加带颜色的文本
-        cursor = self.textCursor()
-        cursor.movePosition(QTextCursor.End)
+            painter.setPen(self._bracket_color)
+            painter.drawText(x, y, "[")
+            x += self._open_bracket_width
 
-        # 插入带格式的文本
-        self.setTextColor(QColor("#adb5bd"))  # 灰色时间戳
-        self.insertPlainText(f"[{timestamp}] ")
+            painter.setPen(self._level_colors.get(record.level, self._default_level_color))
+            painter.drawText(x, y, record.level)
+            x += self._level_width(record.level)
 
-        self.setTextColor(QColor("#868e96"))  # 灰色括号
-        self.insertPlainText("[")
+            painter.setPen(self._bracket_color)
+            painter.drawText(x, y, "] ")
+            x += self._close_bracket_width
 
-        self.setTextColor(self._hex_to_color(color))  # 彩色级别
-        self.insertPlainText(level)
+            painter.setPen(self._message_color)
+            painter.drawText(x, y, record.message)
 
-        self.setTextColor(QColor("#868e96"))  # 灰色括号
-        self.insertPlainText("] ")
+            y += self._line_height
 
-        self.setTextColor(QColor("#ffffff"))  # 白色消息
-        self.insertPlainText(f"{message}\n")
+        painter.end()
 
-        # 自动滚动到底部
-        self.ensureCursorVisible()
+    def to_plain_text(self):
+        """导出全部日志文本"""
+        return "\n".join(
+            f"[{record.timestamp}] [{record.level}] {record.message}" for record in self.records
+        )
 
-    def _hex_to_color(self, hex_color):
-        """将十六进制颜色转换为QColor"""
-        hex_color = hex_color.lstrip('#')
-        r = int(hex_color[0:2], 16)
-        g = int(hex_color[2:4], 16)
-        b = int(hex_color[4:6], 16)
-        return QColor(r, g, b)
+    def _show_context_menu(self, pos):
+        """右键菜单"""
+        menu = QMenu(self)
+        copy_action = menu.addAction("复制全部")
+        action = menu.exec_(self.viewport().mapToGlobal(pos))
+        if action == copy_action:
+            QApplication.clipboard().setText(self.to_plain_text())
 
     def clear(self):
         """清空日志"""
-        super().clear()
\ No newline at end of file
+        self.records.clear()
+        self._max_line_width = 0
+        self._update_scrollbars()
+        self.viewport().update()
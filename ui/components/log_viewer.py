@@ -0,0 +1,365 @@
+# ui/components/log_viewer.py
+import re
+import threading
+import time
+from pathlib import Path
+
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
+                             QPushButton, QComboBox, QListWidget, QListWidgetItem,
+                             QSplitter, QAbstractScrollArea, QFileDialog, QMessageBox)
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
+from PyQt5.QtGui import QFont, QColor, QPainter, QFontMetrics
+
+from ui.components.log_display import LEVEL_COLORS
+from utils.log_index import LogFileIndex
+from utils.segmented_log import SegmentedLogReader, find_manifest
+
+# 单行最多显示的字节数，避免超长行拖慢绘制
+MAX_DISPLAY_LENGTH = 4096
+# 结果列表最多保留的条目数
+MAX_RESULTS = 100000
+
+
+class LogFileView(QAbstractScrollArea):
+    """基于行索引的文件视图 - 只从 mmap 中读取并绘制可见行"""
+
+    PADDING = 6
+
+    def __init__(self):
+        super().__init__()
+        self.index = None
+        self.highlight_line = None
+
+        self.setFont(QFont("Consolas", 10))
+        self.setStyleSheet("QAbstractScrollArea { background-color: #1e1e1e; border: 1px solid #555; }")
+        metrics = QFontMetrics(self.font())
+        self._line_height = metrics.height()
+        self._ascent = metrics.ascent()
+        self._char_width = metrics.horizontalAdvance("M")
+        self._number_width = metrics.horizontalAdvance("00000000 ")
+
+        self._background = QColor("#1e1e1e")
+        self._highlight = QColor("#264f78")
+        self._number_color = QColor("#868e96")
+        self._text_color = QColor("#d4d4d4")
+
+    def set_index(self, index):
+        self.index = index
+        self.highlight_line = None
+        self.verticalScrollBar().setValue(0)
+        self.refresh()
+
+    def refresh(self):
+        """索引增长后更新滚动范围"""
+        rows = self._visible_rows()
+        count = self.index.line_count if self.index else 0
+        vertical = self.verticalScrollBar()
+        vertical.setPageStep(rows)
+        vertical.setRange(0, max(0, count - rows))
+
+        horizontal = self.horizontalScrollBar()
+        horizontal.setPageStep(self.viewport().width())
+        horizontal.setSingleStep(self._char_width)
+        horizontal.setRange(0, MAX_DISPLAY_LENGTH * self._char_width)
+        self.viewport().update()
+
+    def scroll_to_line(self, line_no):
+        """跳转到指定行，并居中高亮"""
+        self.highlight_line = line_no
+        self.verticalScrollBar().setValue(max(0, line_no - self._visible_rows() // 2))
+        self.viewport().update()
+
+    def _visible_rows(self):
+        return max(1, self.viewport().height() // self._line_height)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.refresh()
+
+    def scrollContentsBy(self, dx, dy):
+        self.viewport().update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        painter.fillRect(event.rect(), self._background)
+        if not self.index:
+            painter.end()
+            return
+
+        painter.setFont(self.font())
+        first = self.verticalScrollBar().value()
+        last = min(self.index.line_count, first + self._visible_rows() + 1)
+        x = self.PADDING - self.horizontalScrollBar().value()
+        y = 0
+
+        for line_no in range(first, last):
+            if line_no == self.highlight_line:
+                painter.fillRect(0, y, self.viewport().width(), self._line_height, self._highlight)
+            painter.setPen(self._number_color)
+            painter.drawText(x, y + self._ascent, f"{line_no + 1:>8} ")
+            painter.setPen(self._text_color)
+            painter.drawText(x + self._number_width, y + self._ascent,
+                             self.index.line(line_no, MAX_DISPLAY_LENGTH))
+            y += self._line_height
+
+        painter.end()
+
+
+class LogSearchThread(QThread):
+    """后台过滤线程 - 边扫描边分批返回匹配的行号"""
+
+    results_found = pyqtSignal(list)  # [line_no, ...]
+    search_failed = pyqtSignal(str)
+
+    def __init__(self, index, pattern, level, batch_interval=0.1):
+        super().__init__()
+        self.index = index
+        self.pattern = pattern
+        self.level = level
+        self.batch_interval = batch_interval
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        batch = []
+        last_emit = time.monotonic()
+        try:
+            for line_no in self.index.search(self.pattern, self.level, cancel=self.cancel_event):
+                batch.append(line_no)
+                now = time.monotonic()
+                if now - last_emit >= self.batch_interval:
+                    self.results_found.emit(batch)
+                    batch = []
+                    last_emit = now
+        except re.error as e:
+            self.search_failed.emit(f"正则表达式错误: {e}")
+        except Exception as e:
+            self.search_failed.emit(f"搜索失败: {e}")
+
+        if batch:
+            self.results_found.emit(batch)
+
+
+class SegmentJoinThread(QThread):
+    """后台把分段终端日志（含已压缩的分段）还原为单个文件"""
+
+    joined = pyqtSignal(str)  # 还原后的文件路径
+    join_failed = pyqtSignal(str)
+
+    def __init__(self, manifest_path):
+        super().__init__()
+        self.manifest_path = manifest_path
+
+    def run(self):
+        try:
+            self.joined.emit(str(SegmentedLogReader(self.manifest_path).materialize()))
+        except Exception as e:
+            self.join_failed.emit(f"无法读取分段日志: {e}")
+
+
+class LogViewerWindow(QWidget):
+    """历史日志查看器"""
+
+    def __init__(self, file_path=None, parent=None):
+        super().__init__(parent)
+        self.setWindowFlag(Qt.Window)
+        self.setAttribute(Qt.WA_DeleteOnClose)
+        self.setWindowTitle("日志查看器")
+        self.resize(1100, 700)
+
+        self.index = None
+        self.search_thread = None
+        self.join_thread = None
+        self.result_count = 0
+
+        self.progress_timer = QTimer(self)
+        self.progress_timer.timeout.connect(self._update_progress)
+
+        self.init_ui()
+        if file_path:
+            self.open_file(file_path)
+
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+
+        # 文件选择
+        file_layout = QHBoxLayout()
+        self.file_label = QLabel("未打开文件")
+        open_button = QPushButton("打开")
+        open_button.clicked.connect(self.browse_file)
+        file_layout.addWidget(self.file_label, 1)
+        file_layout.addWidget(open_button)
+        layout.addLayout(file_layout)
+
+        # 过滤条件
+        filter_layout = QHBoxLayout()
+        self.pattern_input = QLineEdit()
+        self.pattern_input.setPlaceholderText("正则表达式 (忽略大小写)")
+        self.pattern_input.returnPressed.connect(self.start_search)
+        self.level_combo = QComboBox()
+        self.level_combo.addItem("全部级别", None)
+        for level in LEVEL_COLORS:
+            self.level_combo.addItem(level, level)
+        self.search_button = QPushButton("过滤")
+        self.search_button.clicked.connect(self.start_search)
+        self.stop_button = QPushButton("停止")
+        self.stop_button.clicked.connect(self.stop_search)
+        self.stop_button.setEnabled(False)
+        filter_layout.addWidget(self.pattern_input, 1)
+        filter_layout.addWidget(self.level_combo)
+        filter_layout.addWidget(self.search_button)
+        filter_layout.addWidget(self.stop_button)
+        layout.addLayout(filter_layout)
+
+        # 文件视图和过滤结果
+        splitter = QSplitter(Qt.Vertical)
+        self.file_view = LogFileView()
+        self.result_list = QListWidget()
+        self.result_list.setFont(QFont("Consolas", 10))
+        self.result_list.itemActivated.connect(self._on_result_activated)
+        self.result_list.itemClicked.connect(self._on_result_activated)
+        splitter.addWidget(self.file_view)
+        splitter.addWidget(self.result_list)
+        splitter.setStretchFactor(0, 3)
+        splitter.setStretchFactor(1, 1)
+        layout.addWidget(splitter, 1)
+
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+
+    def browse_file(self):
+        """选择日志文件"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "选择日志文件",
+            str(Path.home() / "Desktop"),
+            "Log Files (*.log *.manifest.json *.log.gz);;All Files (*)"
+        )
+        if file_path:
+            self.open_file(file_path)
+
+    def open_file(self, file_path):
+        """打开日志文件并在后台建立索引；分段终端日志（清单或任一分段）先按清单还原为单个文件"""
+        self.stop_search()
+        self._close_index()
+        self._stop_join()
+
+        manifest = find_manifest(file_path)
+        if manifest:
+            self.file_label.setText(str(manifest))
+            self.status_label.setText("正在还原分段日志...")
+            self.join_thread = SegmentJoinThread(manifest)
+            self.join_thread.joined.connect(self._on_joined)
+            self.join_thread.join_failed.connect(lambda msg: QMessageBox.warning(self, "打开失败", msg))
+            self.join_thread.start()
+            return
+
+        self._open_index(file_path)
+
+    def _on_joined(self, file_path):
+        if self.sender() is not self.join_thread:
+            return
+        self.join_thread = None
+        self._open_index(file_path)
+
+    def _stop_join(self):
+        """等待正在进行的分段还原结束并丢弃其结果"""
+        if self.join_thread:
+            self.join_thread.wait()
+            self.join_thread = None
+
+    def _open_index(self, file_path):
+        try:
+            self.index = LogFileIndex(file_path)
+        except OSError as e:
+            QMessageBox.warning(self, "打开失败", f"无法打开日志文件: {e}")
+            return
+
+        self.file_label.setText(str(file_path))
+        self.setWindowTitle(f"日志查看器 - {Path(file_path).name}")
+        self.result_list.clear()
+        self.file_view.set_index(self.index)
+        self.index.build_async()
+        self.progress_timer.start(200)
+
+    def _update_progress(self):
+        """索引建立过程中刷新行数和进度"""
+        if not self.index:
+            return
+        self.file_view.refresh()
+        if self.index.ready.is_set():
+            self.progress_timer.stop()
+            self.status_label.setText(f"共 {self.index.line_count} 行")
+        else:
+            percent = self.index.indexed_bytes * 100 // max(1, self.index.size)
+            self.status_label.setText(f"正在建立索引... {percent}% ({self.index.line_count} 行)")
+
+    def start_search(self):
+        """开始过滤"""
+        if not self.index:
+            return
+        self.stop_search()
+
+        pattern = self.pattern_input.text().strip() or None
+        level = self.level_combo.currentData()
+        self.result_list.clear()
+        self.result_count = 0
+        if not pattern and not level:
+            return
+
+        self.search_thread = LogSearchThread(self.index, pattern, level)
+        self.search_thread.results_found.connect(self._on_results_found)
+        self.search_thread.search_failed.connect(lambda msg: self.status_label.setText(msg))
+        self.search_thread.finished.connect(self._on_search_finished)
+        self.search_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
+        self.status_label.setText("正在过滤...")
+        self.search_thread.start()
+
+    def stop_search(self):
+        """停止当前过滤"""
+        if self.search_thread:
+            self.search_thread.cancel()
+            self.search_thread.wait()
+            self.search_thread = None
+        self.search_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+
+    def _on_results_found(self, line_numbers):
+        """追加一批过滤结果"""
+        for line_no in line_numbers:
+            self.result_count += 1
+            if self.result_list.count() >= MAX_RESULTS:
+                continue
+            item = QListWidgetItem(f"{line_no + 1:>8}  {self.index.line(line_no, 300)}")
+            item.setData(Qt.UserRole, line_no)
+            self.result_list.addItem(item)
+        self.status_label.setText(f"已找到 {self.result_count} 条匹配")
+
+    def _on_search_finished(self):
+        if self.sender() is not self.search_thread:
+            return
+        self.search_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        if self.result_count > MAX_RESULTS:
+            self.status_label.setText(f"共 {self.result_count} 条匹配 (列表仅显示前 {MAX_RESULTS} 条)")
+        else:
+            self.status_label.setText(f"共 {self.result_count} 条匹配")
+
+    def _on_result_activated(self, item):
+        self.file_view.scroll_to_line(item.data(Qt.UserRole))
+
+    def _close_index(self):
+        self.progress_timer.stop()
+        if self.index:
+            self.file_view.set_index(None)
+            self.index.close()
+            self.index = None
+
+    def closeEvent(self, event):
+        self._stop_join()
+        self.stop_search()
+        self._close_index()
+        super().closeEvent(event)
@@ -13,11 +13,12 @@ class AC_vali():
         else:
             print(f"[{level}] {message}")
 
-    def check_AC(self):
+    def _probe(self, args, description):
+        """执行检查命令，返回 True/False；超时或无法执行时返回 None（状态未知）"""
         try:
             # 使用 subprocess 执行命令
             result = subprocess.run(
-                ['/usr/local/bin/scout', 'insight --check_user_access'],
+                args,
                 capture_output=True,
                 text=True,
                 timeout=10
@@ -30,55 +31,39 @@ class AC_vali():
 
             # 检查输出中是否包含 "Account"
             if "Account" in result.stdout:
-                self.log("系统", "检测到AppleConnect账户已登录")
-                print("True")
+                self.log("系统", f"检测到{description}账户已登录")
                 return True
             else:
                 self.log("错误", "——————请先登录AppleConnect账户！！——————")
-                print("False")
                 return False
 
         except subprocess.TimeoutExpired:
             self.log("错误", "命令执行超时")
-            return False
+            return None
         except Exception as e:
-            self.log("错误", f"执行AppleConnect命令时发生异常: {e}")
-            return False
+            self.log("错误", f"执行{description}命令时发生异常: {e}")
+            return None
 
-    def check_Scout(self):
-        try:
-            # 使用 subprocess 执行命令
-            result = subprocess.run(
-                ['/usr/local/bin/AppleConnect', 'userList'],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
+    def probe_scout(self):
+        """scout 访问权限检查"""
+        return self._probe(['/usr/local/bin/scout', 'insight', '--check_user_access'], "scout")
 
-            # 打印完整的输出用于调试
-            self.log("调试", f"命令输出: {result.stdout}")
-            if result.stderr:
-                self.log("调试", f"错误输出: {result.stderr}")
+    def probe_appleconnect(self):
+        """AppleConnect 登录检查"""
+        return self._probe(['/usr/local/bin/AppleConnect', 'userList'], "AppleConnect")
 
-            # 检查输出中是否包含 "Account"
-            if "Account" in result.stdout:
-                self.log("系统", "检测到AppleConnect账户已登录")
-                print("True")
-                return True
-            else:
-                self.log("错误", "——————请先登录AppleConnect账户！！——————")
-                print("False")
-                return False
+    def check_AC(self):
+        result = self.probe_scout() is True
+        print(result)
+        return result
 
-        except subprocess.TimeoutExpired:
-            self.log("错误", "命令执行超时")
-            return False
-        except Exception as e:
-            self.log("错误", f"执行AppleConnect命令时发生异常: {e}")
-            return False
+    def check_Scout(self):
+        result = self.probe_appleconnect() is True
+        print(result)
+        return result
 
 
 
 if __name__ == "__main__":
     instance = AC_vali()
-    instance.check_AC()
\ No newline at end of file
+    instance.check_AC()
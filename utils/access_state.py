@@ -0,0 +1,131 @@
+# utils/access_state.py
+import threading
+import time
+
+from utils.AC_validate import AC_vali
+
+# 检查结果的有效期（秒），过期后返回旧结果并在后台重新检查
+DEFAULT_TTL = 300
+# 还没有任何检查结果时，命令最多等待首次检查的时间
+DEFAULT_WAIT = 10
+
+
+class AccessState:
+    """一次访问检查的结果，ok 为 None 表示无法确定（超时、工具不存在等）"""
+
+    __slots__ = ('name', 'ok', 'checked_at', 'duration')
+
+    def __init__(self, name, ok, checked_at, duration):
+        self.name = name
+        self.ok = ok
+        self.checked_at = checked_at
+        self.duration = duration
+
+    def age(self):
+        return time.monotonic() - self.checked_at
+
+
+class AccessStateService:
+    """AppleConnect / scout 访问状态服务
+
+    - start() 后在后台执行所有检查，之后每 ttl 秒重新检查一次
+    - require() 直接返回缓存结果；结果过期时先返回旧结果，同时在后台重新检查
+    - 下载过程中发现认证失败时调用 invalidate()，后续任务不再等待认证超时
+    同一个检查同一时刻只会有一个在执行。
+    """
+
+    def __init__(self, logger=None, ttl=DEFAULT_TTL, checks=None):
+        self.logger = logger
+        self.ttl = ttl
+        if checks is None:
+            validator = AC_vali()
+            validator.logger = logger
+            checks = {
+                "scout": validator.probe_scout,
+                "appleconnect": validator.probe_appleconnect,
+            }
+        self.checks = checks
+        self._states = {}
+        self._running = {}  # name -> threading.Event，检查完成时置位
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def log(self, level, message):
+        if self.logger:
+            self.logger.log(level, message)
+
+    def start(self):
+        """后台预热并定期重新检查"""
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._refresh_loop, name="access-state", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            for name in self.checks:
+                self.refresh(name)
+            self._stop.wait(self.ttl)
+
+    def refresh(self, name):
+        """在后台线程中检查，返回完成事件；已有检查在执行时复用它"""
+        with self._lock:
+            done = self._running.get(name)
+            if done:
+                return done
+            done = self._running[name] = threading.Event()
+        threading.Thread(target=self._run_check, args=(name, done), name=f"access-check:{name}",
+                         daemon=True).start()
+        return done
+
+    def _run_check(self, name, done):
+        started = time.monotonic()
+        try:
+            ok = self.checks[name]()
+        except Exception as e:
+            self.log("警告", f"访问检查 {name} 异常: {e}")
+            ok = None
+        state = AccessState(name, ok, time.monotonic(), time.monotonic() - started)
+        with self._lock:
+            previous = self._states.get(name)
+            self._states[name] = state
+            self._running.pop(name, None)
+        done.set()
+        if previous is None or previous.ok != ok:
+            status = {True: "通过", False: "未通过", None: "无法确定"}[ok]
+            self.log("系统", f"访问检查 {name}: {status}（耗时 {state.duration:.1f}s）")
+
+    def get(self, name):
+        """当前缓存的检查结果，没有时返回 None"""
+        with self._lock:
+            return self._states.get(name)
+
+    def require(self, name, wait=DEFAULT_WAIT):
+        """返回访问状态 True/False/None，不阻塞已有结果的调用
+
+        - 有结果且未过期: 直接返回
+        - 有结果但已过期: 返回旧结果，后台重新检查
+        - 还没有结果: 等待首次检查最多 wait 秒，仍未完成返回 None
+        """
+        state = self.get(name)
+        if state is not None:
+            if state.age() >= self.ttl:
+                self.refresh(name)
+            return state.ok
+
+        done = self.refresh(name)
+        if wait and done.wait(wait):
+            state = self.get(name)
+            return state.ok if state else None
+        return None
+
+    def invalidate(self, name):
+        """认证失败时调用: 清除缓存并立即在后台重新检查"""
+        with self._lock:
+            self._states.pop(name, None)
+        self.log("警告", f"访问状态 {name} 已失效，正在重新检查")
+        return self.refresh(name)
@@ -0,0 +1,159 @@
+# utils/archive_stream.py
+import posixpath
+import shlex
+import subprocess
+import tarfile
+import tempfile
+import threading
+import time
+from pathlib import Path, PurePosixPath
+
+from utils import async_expect
+from utils.cancellation import close_child
+
+# 按链路速度选择 gzip 级别: (最低速度 MB/s, 级别)，级别 0 表示不压缩
+# 链路够快时压缩反而受设备 CPU 限制；慢链路上压缩率更重要
+COMPRESSION_LEVELS = ((40, 0), (8, 1), (0, 6))
+# 测不出链路速度时使用的级别
+DEFAULT_LEVEL = 1
+# 超过该时间（秒）没有收到数据视为连接中断
+STALL_TIMEOUT = 120
+
+
+def choose_level(speed):
+    """根据链路速度（MB/s）选择 gzip 级别"""
+    if speed is None:
+        return DEFAULT_LEVEL
+    for minimum, level in COMPRESSION_LEVELS:
+        if speed >= minimum:
+            return level
+    return DEFAULT_LEVEL
+
+
+def is_safe_member(member):
+    """只解包相对路径下的普通文件、目录和链接，拒绝绝对路径、.. 和设备文件"""
+    path = PurePosixPath(member.name)
+    if path.is_absolute() or ".." in path.parts:
+        return False
+    if member.isdev():
+        return False
+    if member.issym() or member.islnk():
+        target = PurePosixPath(member.linkname)
+        return not target.is_absolute() and ".." not in target.parts
+    return True
+
+
+class _CountingReader:
+    """记录已读取字节数和最后一次收到数据的时间"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes_read = 0
+        self.last_read = time.monotonic()
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        if data:
+            self.bytes_read += len(data)
+            self.last_read = time.monotonic()
+        return data
+
+
+class ArchiveStream:
+    """流式归档传输 - 设备端 tar（按链路速度 gzip 压缩）通过一个 SSH 通道输出，主机端边接收边解包
+
+    语义与 `scp -r 设备路径 本地目录` 相同（本地得到 <本地目录>/<设备路径的名字>），
+    大量小文件只需一次往返，数据不在设备或主机上落盘为中间归档。
+    只走 SSH 主连接（BatchMode），主连接不可用时 pull() 返回失败，由调用方退回 scp。
+    """
+
+    def __init__(self, ssh, host, logger=None, cancel_token=None, level=None):
+        self.ssh = ssh
+        self.host = host
+        self.logger = logger
+        self.cancel_token = cancel_token
+        # 固定的 gzip 级别；None 表示按测得的链路速度选择
+        self.level = level
+
+    def log(self, level, message):
+        if self.logger:
+            self.logger.log(level, message)
+
+    async def choose_level(self):
+        if self.level is not None:
+            return self.level
+        return choose_level(await self.ssh.measure_link(self.host, self.cancel_token))
+
+    def remote_command(self, remote_path, level):
+        parent, name = posixpath.split(remote_path.rstrip("/"))
+        # COPYFILE_DISABLE: macOS 的 tar 不附带 ._ 扩展属性文件
+        command = f"cd {shlex.quote(parent or '/')} && COPYFILE_DISABLE=1 tar -cf - {shlex.quote(name)}"
+        if level:
+            command += f" | gzip -{level}"
+        return command
+
+    def _extract(self, reader, local_dir, compressed, stats):
+        """在工作线程中解包数据流"""
+        with tarfile.open(fileobj=reader, mode="r|gz" if compressed else "r|") as archive:
+            for member in archive:
+                if not is_safe_member(member):
+                    stats["rejected"].append(member.name)
+                    continue
+                archive.extract(member, local_dir, set_attrs=True)
+                if member.isfile():
+                    stats["files"] += 1
+                    stats["bytes"] += member.size
+
+    async def pull(self, remote_path, local_dir, stall_timeout=STALL_TIMEOUT):
+        """把设备上的 remote_path 流式传输并解包到 local_dir，返回 (是否成功, 失败原因)"""
+        local_dir = Path(local_dir)
+        local_dir.mkdir(parents=True, exist_ok=True)
+        async with self.ssh.connection(self.host, self.cancel_token) as ok:
+            if not ok:
+                return False, "SSH 主连接不可用"
+            level = await self.choose_level()
+            started = time.monotonic()
+            stats = {"files": 0, "bytes": 0, "rejected": []}
+            with tempfile.TemporaryFile() as errors:
+                process = subprocess.Popen(self.ssh.batch_args(self.host, self.remote_command(remote_path, level)),
+                                           stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=errors)
+                if self.cancel_token:
+                    self.cancel_token.register(process)
+                reader = _CountingReader(process.stdout)
+                error = None
+                try:
+                    result = {}
+                    worker = threading.Thread(target=self._run_extract,
+                                              args=(reader, local_dir, bool(level), stats, result), daemon=True)
+                    worker.start()
+                    while worker.is_alive():
+                        await async_expect.sleep(0.2, self.cancel_token)
+                        if time.monotonic() - reader.last_read > stall_timeout:
+                            error = f"超过 {stall_timeout}s 未收到数据"
+                            break
+                    if error is None:
+                        error = result.get("error")
+                        if process.wait() != 0 and error is None:
+                            errors.seek(0)
+                            message = errors.read().decode('utf-8', 'replace').strip()
+                            error = f"退出码 {process.returncode}" + (f": {message[-200:]}" if message else "")
+                finally:
+                    close_child(process)
+                    if self.cancel_token:
+                        self.cancel_token.unregister(process)
+
+        duration = time.monotonic() - started
+        if stats["rejected"]:
+            self.log("警告", f"跳过 {len(stats['rejected'])} 个不安全的归档条目: {stats['rejected'][:5]}")
+        if error:
+            return False, error
+        self.log("程序输出", f"流式传输 {remote_path}: {stats['files']} 个文件，"
+                           f"{stats['bytes'] / 1024 / 1024:.1f} MB（线路上 {reader.bytes_read / 1024 / 1024:.1f} MB，"
+                           f"{'不压缩' if not level else f'gzip -{level}'}），耗时 {duration:.1f}s")
+        return True, None
+
+    def _run_extract(self, reader, local_dir, compressed, stats, result):
+        try:
+            self._extract(reader, local_dir, compressed, stats)
+        except (tarfile.TarError, OSError, EOFError) as e:
+            result["error"] = f"解包失败: {e}"
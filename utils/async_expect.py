@@ -0,0 +1,243 @@
+# utils/async_expect.py
+import asyncio
+
+import pexpect
+from pexpect.expect import Expecter, searcher_re
+
+from utils.cancellation import POLL_INTERVAL
+
+# 每次可读时最多读取的字节数
+READ_SIZE = 64 * 1024
+
+
+class AsyncSession:
+    """asyncio 版的 pexpect 会话 - 用事件循环监听 PTY 可读，不占用线程
+
+    pexpect.spawn 负责创建子进程和 PTY，读取和匹配由事件循环驱动:
+    PTY 可读时读入数据交给 pexpect 的 Expecter 匹配，匹配语义（before/after/match、
+    EOF/TIMEOUT 作为模式）与同步的 child.expect 一致，所以多个设备会话可以共用一个事件循环。
+    没有用 pexpect 自带的 async_=True（requirements 中的 pexpect 4.9 已支持）: 它在等待期间无法检查取消令牌；
+    这里用 add_reader 等待 PTY 可读，每次最多等 POLL_INTERVAL 并检查取消令牌，与线程版流程的取消方式一致。
+    """
+
+    def __init__(self, command, args=None, cancel_token=None, **spawn_kwargs):
+        self.child = pexpect.spawn(command, args or [], **spawn_kwargs)
+        # sendline 前默认 sleep 50ms 会阻塞整个事件循环；各流程都是先 expect 到提示符再发送，不需要这段延迟
+        self.child.delaybeforesend = None
+        self.cancel_token = cancel_token
+        if cancel_token:
+            cancel_token.register(self.child)
+
+    # --- 与 pexpect.spawn 相同的属性 ---
+
+    @property
+    def before(self):
+        return self.child.before
+
+    @property
+    def after(self):
+        return self.child.after
+
+    @property
+    def match(self):
+        return self.child.match
+
+    @property
+    def timeout(self):
+        return self.child.timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self.child.timeout = value
+
+    @property
+    def logfile(self):
+        return self.child.logfile
+
+    @logfile.setter
+    def logfile(self, value):
+        self.child.logfile = value
+
+    @property
+    def logfile_read(self):
+        return self.child.logfile_read
+
+    @logfile_read.setter
+    def logfile_read(self, value):
+        self.child.logfile_read = value
+
+    @property
+    def logfile_send(self):
+        return self.child.logfile_send
+
+    @logfile_send.setter
+    def logfile_send(self, value):
+        self.child.logfile_send = value
+
+    # --- 写入（数据量很小，直接同步写入 PTY） ---
+
+    def send(self, data):
+        return self.child.send(data)
+
+    def sendline(self, data=""):
+        return self.child.sendline(data)
+
+    def sendcontrol(self, char):
+        return self.child.sendcontrol(char)
+
+    def sendintr(self):
+        return self.child.sendintr()
+
+    def attach(self, cancel_token):
+        """把会话交给另一个命令的取消令牌（会话在多个命令之间复用时使用）"""
+        self.detach()
+        self.cancel_token = cancel_token
+        if cancel_token:
+            cancel_token.register(self.child)
+
+    def detach(self):
+        """从当前取消令牌中注销，命令结束后会话不会被结束"""
+        if self.cancel_token:
+            self.cancel_token.unregister(self.child)
+        self.cancel_token = None
+
+    def isalive(self):
+        return self.child.isalive()
+
+    def terminate(self, force=False):
+        return self.child.terminate(force)
+
+    def close(self):
+        """关闭会话并从取消令牌中注销（同步，会 sleep 等待子进程退出）"""
+        try:
+            self.child.close()
+        finally:
+            if self.cancel_token:
+                self.cancel_token.unregister(self.child)
+
+    async def aclose(self):
+        """在线程池中关闭会话，不阻塞事件循环"""
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    # --- 读取 ---
+
+    async def expect(self, patterns, timeout=-1):
+        """等待任一模式出现，返回模式索引；语义与 child.expect 相同"""
+        pattern_list = patterns if isinstance(patterns, list) else [patterns]
+        compiled = self.child.compile_pattern_list(pattern_list)
+        return await self.expect_list(compiled, timeout)
+
+    async def expect_list(self, compiled, timeout=-1):
+        if timeout == -1:
+            timeout = self.child.timeout
+        expecter = Expecter(self.child, searcher_re(compiled))
+
+        index = expecter.existing_data()
+        if index is not None:
+            return index
+
+        loop = asyncio.get_running_loop()
+        end = None if timeout is None else loop.time() + timeout
+        while True:
+            if self.cancel_token:
+                self.cancel_token.raise_if_cancelled()
+
+            wait = POLL_INTERVAL
+            if end is not None:
+                remaining = end - loop.time()
+                if remaining <= 0:
+                    return expecter.timeout()
+                wait = min(wait, remaining)
+
+            if not await self._wait_readable(wait):
+                continue
+
+            try:
+                data = self.child.read_nonblocking(READ_SIZE, timeout=0)
+            except pexpect.TIMEOUT:
+                continue
+            except pexpect.EOF as e:
+                return expecter.eof(e)
+
+            index = expecter.new_data(data)
+            if index is not None:
+                return index
+
+    async def _wait_readable(self, timeout):
+        """等待 PTY 可读，超时返回 False"""
+        if self.child.child_fd < 0:
+            return True  # 已关闭，交给 read_nonblocking 报告 EOF
+        loop = asyncio.get_running_loop()
+        readable = loop.create_future()
+        fd = self.child.child_fd
+        loop.add_reader(fd, lambda: readable.done() or readable.set_result(True))
+        try:
+            return await asyncio.wait_for(readable, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(fd)
+
+    async def discard_pending(self, quiet=0.2):
+        """读掉并丢弃已到达的输出，直到 quiet 秒内没有新数据；用于复用会话前清除上一个命令的残留"""
+        while await self._wait_readable(quiet):
+            try:
+                self.child.read_nonblocking(READ_SIZE, timeout=0)
+            except pexpect.TIMEOUT:
+                break
+            except pexpect.EOF:
+                break
+        self.child.buffer = self.child.string_type()
+
+    async def wait_eof(self, timeout=-1):
+        """等待进程输出结束"""
+        return await self.expect(pexpect.EOF, timeout)
+
+
+async def sleep(seconds, cancel_token=None):
+    """可被取消令牌打断的 asyncio.sleep"""
+    if cancel_token is None:
+        await asyncio.sleep(seconds)
+        return
+    loop = asyncio.get_running_loop()
+    end = loop.time() + seconds
+    while True:
+        cancel_token.raise_if_cancelled()
+        remaining = end - loop.time()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(remaining, POLL_INTERVAL))
+
+
+async def run_blocking(func, *args, cancel_token=None, timeout=None):
+    """在线程池中运行阻塞函数，等待期间每 POLL_INTERVAL 检查一次取消；超过 timeout 秒抛出 TimeoutError
+
+    取消或超时后线程仍在运行，调用方需结束它所等待的子进程或文件。
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(None, func, *args)
+    end = loop.time() + timeout if timeout else None
+    while True:
+        done, _ = await asyncio.wait({future}, timeout=POLL_INTERVAL)
+        if done:
+            return future.result()
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        if end is not None and loop.time() >= end:
+            raise TimeoutError()
+
+
+async def gather_limited(coros, limit):
+    """并发运行协程，同时最多 limit 个，结果按输入顺序返回（异常作为结果返回）"""
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(run(coro) for coro in coros), return_exceptions=True)
+
+
+def run(coro):
+    """在当前线程中运行协程（同步调用入口，例如 CommandRunner.execute）"""
+    return asyncio.run(coro)
@@ -0,0 +1,206 @@
+# utils/cancellation.py
+import subprocess
+import threading
+import time
+
+import pexpect
+
+# 取消检查间隔: 每个 expect/subprocess 等待最多这么久就检查一次取消状态
+POLL_INTERVAL = 0.5
+# 取消后等待命令自行清理的时间，超时则强制结束登记的子进程
+KILL_GRACE = 5.0
+
+
+class OperationCancelled(BaseException):
+    """命令被取消或超过截止时间
+
+    继承 BaseException，避免被各路由中宽泛的 except Exception 吞掉，
+    finally 中的清理代码照常执行。
+    """
+
+
+class CancellationToken:
+    """协作式取消令牌 - 由调度器创建，沿 CommandRunner.execute 传入每个等待点
+
+    - cancel(): 请求取消；等待点最多 POLL_INTERVAL 秒后抛出 OperationCancelled
+    - deadline: 可选的绝对截止时间（秒），到时由定时器调用 cancel()，阻塞在等待点之外的子进程也会被强制结束
+    - 登记的子进程在取消 KILL_GRACE 秒后仍存活会被强制结束
+    """
+
+    def __init__(self, timeout=None):
+        self._event = threading.Event()
+        self.reason = None
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self._children = set()
+        self._lock = threading.Lock()
+        self._kill_timer = None
+        self._deadline_timer = None
+        if timeout:
+            self._deadline_timer = threading.Timer(timeout, self.cancel, ("超过截止时间",))
+            self._deadline_timer.daemon = True
+            self._deadline_timer.start()
+
+    @property
+    def cancelled(self):
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("超过截止时间")
+        return self._event.is_set()
+
+    def cancel(self, reason="用户取消"):
+        """请求取消"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            self._kill_timer = threading.Timer(KILL_GRACE, self.kill_children)
+            self._kill_timer.daemon = True
+            self._kill_timer.start()
+
+    def remaining(self):
+        """距截止时间的剩余秒数，没有截止时间时返回 None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise OperationCancelled(self.reason)
+
+    def sleep(self, seconds):
+        """可被取消打断的 sleep"""
+        end = time.monotonic() + seconds
+        while True:
+            self.raise_if_cancelled()
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return
+            self._event.wait(min(remaining, POLL_INTERVAL))
+
+    def register(self, child):
+        """登记子进程（pexpect.spawn 或 subprocess.Popen）"""
+        with self._lock:
+            self._children.add(child)
+        return child
+
+    def unregister(self, child):
+        with self._lock:
+            self._children.discard(child)
+
+    def kill_children(self):
+        """强制结束所有仍存活的登记子进程"""
+        with self._lock:
+            children = list(self._children)
+            self._children.clear()
+        for child in children:
+            close_child(child)
+
+    def finish(self):
+        """命令结束后调用，停止强制结束定时器"""
+        with self._lock:
+            if self._deadline_timer:
+                self._deadline_timer.cancel()
+            if self._kill_timer:
+                self._kill_timer.cancel()
+        self.kill_children()
+
+
+def close_child(child):
+    """结束子进程，忽略已退出的情况"""
+    try:
+        if isinstance(child, subprocess.Popen):
+            if child.poll() is None:
+                child.terminate()
+                try:
+                    child.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    child.kill()
+        elif child.isalive():
+            child.terminate(force=True)
+    except Exception:
+        pass
+
+
+def sleep(seconds, token=None):
+    """token 为空时等同 time.sleep"""
+    if token is None:
+        time.sleep(seconds)
+    else:
+        token.sleep(seconds)
+
+
+def expect(child, patterns, timeout=-1, token=None):
+    """可取消的 child.expect，语义与 pexpect 一致
+
+    把一次长等待拆成多个 POLL_INTERVAL 的短等待，每次之间检查取消令牌；
+    pexpect 在超时时不会丢弃已读取的缓冲区，所以拆分不影响匹配结果。
+    """
+    if token is None:
+        return child.expect(patterns, timeout=timeout)
+
+    pattern_list = patterns if isinstance(patterns, list) else [patterns]
+    timeout_index = next((i for i, p in enumerate(pattern_list) if p is pexpect.TIMEOUT), None)
+    index_map = [i for i, p in enumerate(pattern_list) if p is not pexpect.TIMEOUT]
+    compiled = child.compile_pattern_list([pattern_list[i] for i in index_map])
+
+    if timeout == -1:
+        timeout = child.timeout
+    end = None if timeout is None else time.monotonic() + timeout
+
+    while True:
+        token.raise_if_cancelled()
+
+        wait = POLL_INTERVAL
+        if end is not None:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                if timeout_index is not None:
+                    return timeout_index
+                raise pexpect.TIMEOUT(f"Timeout exceeded ({timeout}s)")
+            wait = min(wait, remaining)
+        token_remaining = token.remaining()
+        if token_remaining is not None:
+            wait = min(wait, max(token_remaining, 0.01))
+
+        try:
+            return index_map[child.expect_list(compiled, timeout=wait)]
+        except pexpect.TIMEOUT:
+            continue
+
+
+def run_subprocess(command, token=None, timeout=None, **kwargs):
+    """可取消的 subprocess.run，返回 subprocess.CompletedProcess
+
+    超时抛出 subprocess.TimeoutExpired，取消抛出 OperationCancelled，两种情况都会先结束子进程。
+    """
+    if token is None:
+        return subprocess.run(command, timeout=timeout, **kwargs)
+
+    capture_output = kwargs.pop('capture_output', False)
+    if capture_output:
+        kwargs['stdout'] = subprocess.PIPE
+        kwargs['stderr'] = subprocess.PIPE
+
+    end = None if timeout is None else time.monotonic() + timeout
+    process = token.register(subprocess.Popen(command, **kwargs))
+    try:
+        while True:
+            if token.cancelled:
+                close_child(process)
+                token.raise_if_cancelled()
+
+            wait = POLL_INTERVAL
+            if end is not None:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    close_child(process)
+                    raise subprocess.TimeoutExpired(command, timeout)
+                wait = min(wait, remaining)
+
+            try:
+                stdout, stderr = process.communicate(timeout=wait)
+                return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+            except subprocess.TimeoutExpired:
+                continue
+    finally:
+        token.unregister(process)
@@ -1,26 +1,104 @@
 # util/command_runner.py
 from abc import ABC, abstractmethod
 from utils.logger import UnifiedLogger
+from utils.cancellation import OperationCancelled
+
+# 串口资源为 serial:<端口号>；端口在运行时才确定（自动选择或全部端口）的命令占用 serial:*，与所有端口互斥
+SERIAL_RESOURCE = "serial"
+ALL_PORTS = "*"
+
+
+def serial_resource(port=None):
+    """端口 port 对应的调度资源，port 为 None 时表示全部端口"""
+    return f"{SERIAL_RESOURCE}:{ALL_PORTS if port is None else port}"
 
 
 class CommandRunner(ABC):
     """命令执行器基类"""
 
+    # 执行期间独占的资源，调度器保证同一资源同一时刻只被一个任务使用
+    resources = ()
+
+    # 命令的最长执行时间（秒），超过后按取消处理；None 表示不限制
+    deadline = None
+
+    # 执行前需要通过的访问检查（AccessStateService 中的检查名），缓存结果为未通过时直接失败
+    required_access = ()
+
+    # 只作提示的访问检查: 未通过时记录警告，仍然执行（用于还没有在真实输出上验证过的检查）
+    advisory_access = ()
+
+    # 串口通过控制台会话代理使用；为 False 且占用串口资源的命令执行前会关闭代理保留的空闲会话，
+    # 避免与仍占着串口的 nanocom 冲突
+    uses_console_broker = False
+
     def __init__(self, logger: UnifiedLogger):
         self.logger = logger
+        self.cancel_token = None
+        self.access_service = None
+        self.console_broker = None
+        self.ssh_transport = None
+
+    def set_access_service(self, access_service):
+        """设置访问状态服务"""
+        self.access_service = access_service
+
+    def set_console_broker(self, console_broker):
+        """设置控制台会话代理，串口命令通过它复用已登录的 nanocom 会话"""
+        self.console_broker = console_broker
+
+    def set_ssh_transport(self, ssh_transport):
+        """设置 SSH 传输层，向设备传输文件的命令通过它复用主连接"""
+        self.ssh_transport = ssh_transport
+
+    def release_idle_consoles(self):
+        """不经过会话代理使用串口的命令执行前，关闭代理保留的已登录会话"""
+        uses_serial = any(resource.startswith(f"{SERIAL_RESOURCE}:") for resource in self.resources)
+        if self.console_broker and uses_serial and not self.uses_console_broker:
+            self.console_broker.close_all()
+
+    def check_access(self):
+        """按缓存的访问状态快速判断能否执行，状态未知时允许执行"""
+        if not self.access_service:
+            return True
+        for name in self.required_access:
+            if self.access_service.require(name) is False:
+                self.logger.log("错误", f"访问检查 {name} 未通过，请先登录 AppleConnect 后重试")
+                return False
+        for name in self.advisory_access:
+            if self.access_service.require(name, wait=0) is False:
+                self.logger.log("警告", f"访问检查 {name} 未通过，仍继续执行")
+        return True
 
     @abstractmethod
     def execute(self):
         """执行命令的抽象方法"""
         pass
 
-    def run_with_error_handling(self, description):
-        """带错误处理的执行方法"""
+    def run_with_error_handling(self, description, cancel_token=None):
+        """带错误处理的执行方法
+
+        Args:
+            description: 命令描述
+            cancel_token: 取消令牌，execute() 中通过 self.cancel_token 传给各路由
+        """
+        self.cancel_token = cancel_token
         try:
             self.logger.log("系统", f"开始执行: {description}")
+            if not self.check_access():
+                return False
+            self.release_idle_consoles()
             result = self.execute()
             self.logger.log("系统", f"完成执行: {description}")
             return result
+        except OperationCancelled as e:
+            self.logger.log("警告", f"{description} 已终止: {e}")
+            return False
         except Exception as e:
             self.logger.log("错误", f"执行 {description} 时发生错误: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+        finally:
+            # 结束命令遗留的子进程
+            if cancel_token:
+                cancel_token.finish()
+            self.cancel_token = None
\ No newline at end of file
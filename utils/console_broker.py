@@ -0,0 +1,194 @@
+# utils/console_broker.py
+import threading
+import time
+
+import pexpect
+
+from utils import async_expect
+from utils.cancellation import POLL_INTERVAL
+
+# 未指定端口时的会话键（nanocom 自动选择端口）
+AUTO_PORT = "auto"
+# 设备 OS 提示符，健康检查时等待它出现
+CONSOLE_PROMPT = "local@locals-Mac"
+# 空闲超过该时间（秒）的会话由后台线程关闭
+DEFAULT_IDLE_TIMEOUT = 600
+# 复用前健康检查等待提示符的时间
+HEALTH_TIMEOUT = 3
+
+
+class ConsoleSession:
+    """代理中保存的一个已登录控制台"""
+
+    def __init__(self, key, session):
+        self.key = key
+        self.session = session
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+
+    def idle_time(self):
+        return time.monotonic() - self.last_used
+
+
+class ConsoleBroker:
+    """nanocom 控制台会话代理 - 每个端口保留一个已登录的会话供后续命令复用
+
+    - acquire() 独占某个端口的会话: 已有会话先做健康检查（回车后等待提示符），
+      通过则直接复用，否则关闭后调用方传入的 connect() 重新连接和登录
+    - 同一端口同一时刻只有一个命令使用；会话跟随持有它的命令的取消令牌
+    - release() 归还会话；命令异常或被取消时以 healthy=False 归还，会话直接关闭
+    - 后台线程关闭空闲超过 idle_timeout 秒的会话
+    会话本身不绑定事件循环，可以被不同工作线程中的 asyncio.run 先后使用。
+    """
+
+    def __init__(self, logger=None, idle_timeout=DEFAULT_IDLE_TIMEOUT, prompt=CONSOLE_PROMPT):
+        self.logger = logger
+        self.idle_timeout = idle_timeout
+        self.prompt = prompt
+        self._sessions = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def log(self, level, message):
+        if self.logger:
+            self.logger.log(level, message)
+
+    def start(self):
+        """启动空闲会话回收线程"""
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._reap_loop, name="console-broker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止回收线程并关闭所有会话"""
+        self._stop.set()
+        self.close_all()
+
+    def _reap_loop(self):
+        while not self._stop.wait(min(60, self.idle_timeout)):
+            for key in list(self._sessions):
+                lock = self._port_lock(key)
+                if not lock.acquire(blocking=False):
+                    continue  # 正在使用
+                try:
+                    console = self._sessions.get(key)
+                    if console and console.idle_time() >= self.idle_timeout:
+                        self.log("系统", f"控制台 {key} 空闲 {console.idle_time():.0f}s，已关闭")
+                        self._discard(console)
+                finally:
+                    lock.release()
+
+    def _port_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    async def acquire(self, key, connect, cancel_token=None):
+        """取得 key 对应端口的已登录会话，失败返回 None
+
+        Args:
+            key: 端口号，未指定端口时使用 AUTO_PORT
+            connect: 没有可用会话时调用的协程函数，返回已登录的 AsyncSession，失败返回 None
+            cancel_token: 当前命令的取消令牌
+        """
+        lock = self._port_lock(key)
+        waited = False
+        while not lock.acquire(blocking=False):
+            if not waited:
+                self.log("程序输出", f"控制台 {key} 正在被其他命令使用，等待...")
+                waited = True
+            await async_expect.sleep(POLL_INTERVAL, cancel_token)
+
+        try:
+            console = self._sessions.get(key)
+            if console:
+                console.session.attach(cancel_token)
+                if await self._healthy(console):
+                    console.uses += 1
+                    self.log("程序输出", f"复用已登录的控制台 {key}（第 {console.uses} 次复用）")
+                    return console
+                self.log("警告", f"控制台 {key} 已失效，重新连接")
+                self._discard(console)
+
+            self._discard_conflicting(key)
+            session = await connect()
+            if session is None:
+                lock.release()
+                return None
+            console = ConsoleSession(key, session)
+            session.attach(cancel_token)
+            self._sessions[key] = console
+            return console
+        except BaseException:
+            lock.release()
+            raise
+
+    def _discard_conflicting(self, key):
+        """自动选择的端口可能与按端口号保存的会话是同一个串口，新建会话前关闭另一类的空闲会话"""
+        for other in list(self._sessions):
+            if (other == AUTO_PORT) == (key == AUTO_PORT):
+                continue
+            lock = self._port_lock(other)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                console = self._sessions.get(other)
+                if console:
+                    self._discard(console)
+            finally:
+                lock.release()
+
+    async def _healthy(self, console):
+        """会话存活且回车后能看到提示符"""
+        session = console.session
+        if not session.isalive():
+            return False
+        try:
+            await session.discard_pending()
+            session.sendline("")
+            return await session.expect([self.prompt, pexpect.TIMEOUT, pexpect.EOF], timeout=HEALTH_TIMEOUT) == 0
+        except (OSError, pexpect.ExceptionPexpect):
+            return False
+
+    def release(self, console, healthy=True):
+        """归还会话；healthy=False 时关闭会话，下次重新连接"""
+        session = console.session
+        session.detach()
+        session.logfile = None
+        session.logfile_read = None
+        session.logfile_send = None
+        console.last_used = time.monotonic()
+        if not healthy or not session.isalive():
+            self._discard(console)
+        self._port_lock(console.key).release()
+
+    def _discard(self, console):
+        """关闭会话并从代理中移除"""
+        if self._sessions.get(console.key) is console:
+            del self._sessions[console.key]
+        session = console.session
+        session.detach()
+        try:
+            if session.isalive():
+                # 退出 nanocom: Ctrl+A Ctrl+X
+                session.sendcontrol("a")
+                session.sendcontrol("x")
+            session.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        """关闭所有未被使用的会话"""
+        for key in list(self._sessions):
+            lock = self._port_lock(key)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                console = self._sessions.get(key)
+                if console:
+                    self._discard(console)
+            finally:
+                lock.release()
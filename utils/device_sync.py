@@ -0,0 +1,228 @@
+# utils/device_sync.py
+import hashlib
+import json
+import os
+import posixpath
+import shlex
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+
+from utils import async_expect
+from utils.cancellation import close_child
+
+# 同步清单文件名
+MANIFEST_NAME = "sync_manifest.json"
+# 计算本地文件哈希时每次读取的字节数
+HASH_CHUNK = 1024 * 1024
+# 超过该大小的文件单独传输，中断后从已接收的字节偏移继续
+RESUME_SIZE = 16 * 1024 * 1024
+# 续传时每接收这么多字节记录一次断点
+CHECKPOINT_BYTES = 8 * 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_stat_output(output):
+    """解析 `stat` 输出的 "大小 修改时间 路径" 行，返回 {相对路径: {"size", "mtime"}}"""
+    files = {}
+    for line in output.splitlines():
+        parts = line.strip().split(" ", 2)
+        if len(parts) != 3 or not parts[0].isdigit() or not parts[1].isdigit():
+            continue
+        files[parts[2]] = {"size": int(parts[0]), "mtime": int(parts[1])}
+    return files
+
+
+def parse_hash_output(output):
+    """解析 shasum/sha256sum 输出的 "哈希  路径" 行"""
+    hashes = {}
+    for line in output.splitlines():
+        digest, _, path = line.strip().partition("  ")
+        if len(digest) == 64 and path:
+            hashes[path] = digest
+    return hashes
+
+
+class DeviceSync:
+    """设备文件增量同步
+
+    语义与 `scp -r 设备路径 本地目录` 相同（本地得到 <本地目录>/<设备路径的名字>），但只传输变化的文件:
+    - 在设备上列出每个文件的大小和修改时间（use_hash=True 时再加 SHA-256）
+    - 与本地已有文件比较: 大小和修改时间都相同（或哈希相同）的跳过；scp -p 保留修改时间，所以上次同步过的文件不会重复传输
+    - 需要传输的文件按设备目录分组，每组一次 scp（通过 SSH 主连接）
+    - 有断点（checkpoint）时，大于 RESUME_SIZE 的文件单独通过 `tail -c +偏移` 传输到 .part，
+      中断后从记录的偏移继续；完成的文件记入断点
+    - sync() 返回设备端清单和本次传输结果，由调用方用 write_manifest() 保存
+    本地多出的文件不会删除。
+    """
+
+    def __init__(self, ssh, host, logger=None, cancel_token=None, use_hash=False, logfile=None, checkpoint=None):
+        self.ssh = ssh
+        self.host = host
+        self.logger = logger
+        self.cancel_token = cancel_token
+        self.use_hash = use_hash
+        self.logfile = logfile
+        self.checkpoint = checkpoint
+
+    def log(self, level, message):
+        if self.logger:
+            self.logger.log(level, message)
+
+    async def remote_manifest(self, remote_path):
+        """列出设备上 remote_path 下的所有文件，路径相对 remote_path 的上级目录"""
+        parent, name = posixpath.split(remote_path.rstrip("/"))
+        parent, name = shlex.quote(parent or "/"), shlex.quote(name)
+        # Linux 的 stat -c 在前；macOS 的 stat 不认识 -c，直接失败后使用 stat -f
+        command = (f"cd {parent} && (find {name} -type f -exec stat -c '%s %Y %n' {{}} + 2>/dev/null"
+                   f" || find {name} -type f -exec stat -f '%z %m %N' {{}} +)")
+        status, output = await self.ssh.run(self.host, command, cancel_token=self.cancel_token)
+        if status is None:
+            raise TimeoutError(f"列出设备文件超时: {remote_path}")
+        files = parse_stat_output(output)
+
+        if self.use_hash and files:
+            command = (f"cd {parent} && (find {name} -type f -exec shasum -a 256 {{}} + 2>/dev/null"
+                       f" || find {name} -type f -exec sha256sum {{}} +)")
+            status, output = await self.ssh.run(self.host, command, timeout=600, cancel_token=self.cancel_token)
+            for path, digest in parse_hash_output(output).items():
+                if path in files:
+                    files[path]["sha256"] = digest
+        return files
+
+    def is_current(self, local_file, entry):
+        """本地文件与设备端记录一致时返回 True"""
+        try:
+            stat = local_file.stat()
+        except OSError:
+            return False
+        if stat.st_size != entry["size"]:
+            return False
+        if self.use_hash and "sha256" in entry:
+            return file_sha256(local_file) == entry["sha256"]
+        return int(stat.st_mtime) == entry["mtime"]
+
+    async def sync(self, remote_path, local_dir):
+        """把设备上的 remote_path 增量同步到 local_dir，返回同步结果"""
+        started = time.monotonic()
+        local_dir = Path(local_dir)
+        remote_parent = posixpath.dirname(remote_path.rstrip("/")) or "/"
+        files = await self.remote_manifest(remote_path)
+
+        changed = [path for path, entry in files.items() if not self.is_current(local_dir / path, entry)]
+        groups = {}
+        resumable = []
+        for path in changed:
+            if self.checkpoint and files[path]["size"] > RESUME_SIZE:
+                resumable.append(path)
+            else:
+                groups.setdefault(posixpath.dirname(path), []).append(path)
+
+        failed = []
+        for path in resumable:
+            error = await self.pull_resumable(posixpath.join(remote_parent, path), local_dir / path, files[path])
+            if error:
+                self.log("错误", f"传输 {path} 中断 ({error})")
+                failed.append(path)
+        for directory, paths in groups.items():
+            target = local_dir / directory
+            target.mkdir(parents=True, exist_ok=True)
+            sources = [posixpath.join(remote_parent, path) for path in paths]
+            ok, error = await self.ssh.copy(self.host, sources, target, cancel_token=self.cancel_token,
+                                            preserve=True, logfile=self.logfile)
+            if not ok:
+                self.log("错误", f"同步 {directory} 失败 ({error})")
+                failed.extend(paths)
+            elif self.checkpoint:
+                for path in paths:
+                    self.checkpoint.mark_done(posixpath.join(remote_parent, path), files[path]["size"],
+                                              files[path]["mtime"])
+
+        transferred = [path for path in changed if path not in failed]
+        result = {
+            "remote": remote_path,
+            "local": str(local_dir),
+            "synced_at": datetime.now().isoformat(timespec='seconds'),
+            "duration": round(time.monotonic() - started, 3),
+            "use_hash": self.use_hash,
+            "total_files": len(files),
+            "total_bytes": sum(entry["size"] for entry in files.values()),
+            "transferred": transferred,
+            "transferred_bytes": sum(files[path]["size"] for path in transferred),
+            "skipped": len(files) - len(changed),
+            "failed": failed,
+            "files": files,
+        }
+        self.log("程序输出", f"同步 {remote_path}: 共 {len(files)} 个文件，传输 {len(transferred)} 个"
+                           f"（{result['transferred_bytes'] / 1024 / 1024:.1f} MB），跳过 {result['skipped']} 个"
+                           + (f"，失败 {len(failed)} 个" if failed else ""))
+        return result
+
+    async def pull_resumable(self, remote, local_file, entry):
+        """传输单个大文件，从断点记录的字节偏移继续；成功返回 None，否则返回失败原因"""
+        part = local_file.with_name(local_file.name + ".part")
+        state = self.checkpoint.file_state(remote, entry["size"], entry["mtime"])
+        offset = min(state.get("offset", 0), part.stat().st_size) if part.exists() else 0
+        if offset:
+            self.log("程序输出", f"从断点继续传输 {remote}: 已有 {offset / 1024 / 1024:.1f} MB"
+                               f" / {entry['size'] / 1024 / 1024:.1f} MB")
+        part.parent.mkdir(parents=True, exist_ok=True)
+        with open(part, 'ab') as f:
+            f.truncate(offset)
+
+        async with self.ssh.connection(self.host, self.cancel_token):
+            process = subprocess.Popen(self.ssh.batch_args(self.host, f"tail -c +{offset + 1} {shlex.quote(remote)}"),
+                                       stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            if self.cancel_token:
+                self.cancel_token.register(process)
+            try:
+                offset = await async_expect.run_blocking(
+                    _append, process.stdout, part, offset, lambda done: self.checkpoint.set_offset(remote, done),
+                    cancel_token=self.cancel_token
+                )
+            finally:
+                close_child(process)
+                if self.cancel_token:
+                    self.cancel_token.unregister(process)
+                self.checkpoint.set_offset(remote, part.stat().st_size)
+                self.checkpoint.save(force=True)
+
+        if offset != entry["size"]:
+            return f"已接收 {offset}/{entry['size']} 字节"
+        os.replace(part, local_file)
+        os.utime(local_file, (entry["mtime"], entry["mtime"]))
+        self.checkpoint.mark_done(remote, entry["size"], entry["mtime"])
+        return None
+
+
+def _append(stream, path, offset, on_progress):
+    """把数据流追加到 path（当前长度为 offset），每 CHECKPOINT_BYTES 回调一次已写入的总字节数"""
+    reported = offset
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        for data in iter(lambda: stream.read(HASH_CHUNK), b''):
+            f.write(data)
+            offset += len(data)
+            if offset - reported >= CHECKPOINT_BYTES:
+                f.flush()
+                on_progress(offset)
+                reported = offset
+    return offset
+
+
+def write_manifest(path, results):
+    """把一次采集中各路径的同步结果写入清单文件"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"generated_at": datetime.now().isoformat(timespec='seconds'), "syncs": results},
+                  f, ensure_ascii=False, indent=2)
+    return path
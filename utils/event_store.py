@@ -0,0 +1,203 @@
+# utils/event_store.py
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, Optional
+
+EVENTS_FILE = "events.jsonl"
+INDEX_FILE = "events.index.jsonl"
+DEFAULT_BLOCK_SIZE = 1000  # 每个索引块的记录数
+DEFAULT_FLUSH_INTERVAL = 1.0  # 秒
+
+
+class EventStore:
+    """结构化日志存储 - 与文本日志并行写入的 JSONL 记录流
+
+    记录按块追加到 events.jsonl，每写入一个块就在 events.index.jsonl 中追加一行块摘要:
+    字节范围、时间范围、各级别/命令的记录数。查询时先读取索引，只读取可能命中的块。
+    """
+
+    def __init__(self, directory, session=None, block_size=DEFAULT_BLOCK_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.session = session or self.directory.name
+        self.block_size = block_size
+        self.flush_interval = flush_interval
+
+        self.events_path = self.directory / EVENTS_FILE
+        self.index_path = self.directory / INDEX_FILE
+        self._events_file = open(self.events_path, 'ab')
+        self._index_file = open(self.index_path, 'a', encoding='utf-8')
+
+        self._lock = threading.Lock()
+        self._block = []
+        self._last_write = time.monotonic()
+        self._closed = False
+
+    def append(self, level, message, command=None, timestamp=None):
+        """追加一条记录"""
+        record = {
+            "ts": timestamp if timestamp is not None else time.time(),
+            "level": level,
+            "command": command,
+            "session": self.session,
+            "message": message,
+        }
+        with self._lock:
+            if self._closed:
+                return
+            self._block.append(record)
+            if len(self._block) >= self.block_size or time.monotonic() - self._last_write >= self.flush_interval:
+                self._write_block()
+
+    def _write_block(self):
+        """把当前块写入数据文件并追加块索引（调用方持有锁）"""
+        if not self._block:
+            return
+
+        block = self._block
+        self._block = []
+        self._last_write = time.monotonic()
+
+        data = b''.join(
+            json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n' for record in block
+        )
+        offset = self._events_file.tell()
+        self._events_file.write(data)
+        self._events_file.flush()
+
+        levels = {}
+        commands = {}
+        for record in block:
+            levels[record["level"]] = levels.get(record["level"], 0) + 1
+            command = record["command"] or ""
+            commands[command] = commands.get(command, 0) + 1
+
+        entry = {
+            "offset": offset,
+            "length": len(data),
+            "count": len(block),
+            "ts_min": min(record["ts"] for record in block),
+            "ts_max": max(record["ts"] for record in block),
+            "levels": levels,
+            "commands": commands,
+        }
+        self._index_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._index_file.flush()
+
+    def flush(self):
+        """写出当前未满的块"""
+        with self._lock:
+            if not self._closed:
+                self._write_block()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._write_block()
+            self._closed = True
+            self._events_file.close()
+            self._index_file.close()
+
+
+def command_matches(name, command):
+    """命令过滤: 命令名相同，或是该命令的子通道（如 reboot_log/3、scout_insight/<序列号>）"""
+    return name == command or (name is not None and name.startswith(command + "/"))
+
+
+def _block_matches(entry, level, command, since, until):
+    """根据块摘要判断块内是否可能有匹配记录"""
+    if level is not None and level not in entry["levels"]:
+        return False
+    if command is not None and not any(command_matches(name, command) for name in entry["commands"]):
+        return False
+    if since is not None and entry["ts_max"] < since:
+        return False
+    if until is not None and entry["ts_min"] > until:
+        return False
+    return True
+
+
+def query(directory, level: Optional[str] = None, command: Optional[str] = None,
+          since: Optional[float] = None, until: Optional[float] = None) -> Iterator[dict]:
+    """查询单个会话目录中的结构化记录"""
+    directory = Path(directory)
+    index_path = directory / INDEX_FILE
+    events_path = directory / EVENTS_FILE
+    if not index_path.exists() or not events_path.exists():
+        return
+
+    with open(index_path, 'r', encoding='utf-8') as index_file, open(events_path, 'rb') as events_file:
+        for raw_entry in index_file:
+            try:
+                entry = json.loads(raw_entry)
+            except ValueError:
+                continue  # 写入中途中断的索引行
+            if not _block_matches(entry, level, command, since, until):
+                continue
+
+            events_file.seek(entry["offset"])
+            for raw_record in events_file.read(entry["length"]).splitlines():
+                record = json.loads(raw_record)
+                if level is not None and record["level"] != level:
+                    continue
+                if command is not None and not command_matches(record["command"], command):
+                    continue
+                if since is not None and record["ts"] < since:
+                    continue
+                if until is not None and record["ts"] > until:
+                    continue
+                yield record
+
+
+def find_stores(root=None) -> Iterator[Path]:
+    """查找桌面日志目录下所有包含结构化记录的会话目录"""
+    pattern = f"**/{INDEX_FILE}" if root else f"ATC_Logs*/**/{INDEX_FILE}"
+    root = Path(root) if root else Path.home() / "Desktop"
+    for index_path in sorted(root.glob(pattern)):
+        yield index_path.parent
+
+
+def query_all(root=None, **filters) -> Iterator[dict]:
+    """跨会话查询"""
+    for directory in find_stores(root):
+        yield from query(directory, **filters)
+
+
+def _parse_time(value):
+    """解析时间参数: 7d / 12h / 30m 或 YYYY-MM-DD[ HH:MM:SS]"""
+    if value is None:
+        return None
+    units = {"d": "days", "h": "hours", "m": "minutes"}
+    if value[-1:] in units and value[:-1].isdigit():
+        return (datetime.now() - timedelta(**{units[value[-1]]: int(value[:-1])})).timestamp()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"无法解析时间: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询结构化会话日志")
+    parser.add_argument("--root", help="日志根目录，默认为桌面")
+    parser.add_argument("--level", help="日志级别，例如 错误")
+    parser.add_argument("--command", help="命令名称，例如 reboot_log（包含 reboot_log/<端口> 等子通道）")
+    parser.add_argument("--since", type=_parse_time, help="起始时间，例如 7d 或 2025-01-01")
+    parser.add_argument("--until", type=_parse_time, help="结束时间")
+    args = parser.parse_args()
+
+    for record in query_all(args.root, level=args.level, command=args.command,
+                            since=args.since, until=args.until):
+        timestamp = datetime.fromtimestamp(record["ts"]).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"[{timestamp}] [{record['level']}] [{record['command'] or '-'}] {record['message']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# utils/line_assembler.py
+import codecs
+
+# 单行最大字符长度（字节），超过后强制断行，避免进度条、二进制输出无限累积
+DEFAULT_MAX_LINE_LENGTH = 64 * 1024
+
+
+class LineAssembler:
+    """流式行组装器 - 把 pexpect 的输出分片增量拼接为完整的文本行
+
+    - 只扫描新到达的字节，单次 feed 的开销与新数据量成正比
+    - 未完成的行保存在 bytearray 中，原地追加
+    - 使用增量解码器，多字节字符被分片或被强制断行截断时也能正确解码
+    - 返回的每一行都不超过 max_line_length 字节，无论是否以换行结束
+    """
+
+    def __init__(self, max_line_length: int = DEFAULT_MAX_LINE_LENGTH,
+                 encoding: str = 'utf-8', errors: str = 'ignore'):
+        self.max_line_length = max(1, max_line_length)
+        self.encoding = encoding
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+        self._buffer = bytearray()
+
+    def feed(self, data) -> list:
+        """输入一段新数据，返回本次产生的完整行（不含换行符）"""
+        if isinstance(data, str):
+            data = data.encode(self.encoding, errors='replace')
+
+        lines = []
+        buffer = self._buffer
+
+        # 只在新数据中查找最后一个换行符，之前的部分一次性解码并切分
+        index = data.rfind(b'\n')
+        if index >= 0:
+            buffer += data[:index]
+            if len(buffer) <= self.max_line_length:
+                lines = self._decoder.decode(buffer, final=True).split('\n')
+            else:
+                # 可能含超长行，逐行解码并强制断行
+                for raw in bytes(buffer).split(b'\n'):
+                    lines.extend(self._split_line(raw))
+            self._decoder.reset()
+            buffer.clear()
+            buffer += data[index + 1:]
+        else:
+            buffer += data
+
+        # 超长行按 max_line_length 强制断行
+        if len(buffer) >= self.max_line_length:
+            cut = len(buffer) - len(buffer) % self.max_line_length
+            for offset in range(0, cut, self.max_line_length):
+                lines.append(self._decoder.decode(buffer[offset:offset + self.max_line_length]))
+            del buffer[:cut]
+
+        return lines
+
+    def _split_line(self, raw: bytes) -> list:
+        """解码一个完整行，超过 max_line_length 的部分强制断行"""
+        step = self.max_line_length
+        if len(raw) <= step:
+            return [self._decoder.decode(raw, final=True)]
+        return [self._decoder.decode(raw[offset:offset + step], final=offset + step >= len(raw))
+                for offset in range(0, len(raw), step)]
+
+    def flush(self) -> str:
+        """取出缓冲区中剩余的不完整行"""
+        remaining = self._decoder.decode(self._buffer, final=True)
+        self.reset()
+        return remaining
+
+    def reset(self):
+        """清空缓冲区和解码器状态"""
+        self._decoder.reset()
+        self._buffer.clear()
+
+    @property
+    def pending_bytes(self) -> int:
+        """当前未组成完整行的字节数"""
+        return len(self._buffer)
@@ -0,0 +1,198 @@
+# utils/log_index.py
+import mmap
+import os
+import re
+import struct
+import threading
+import zlib
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+from typing import Iterator, Optional
+
+# 索引文件格式: 魔数 + (文件大小, 修改时间, 文件头校验, 行数) + 行起始偏移数组
+INDEX_MAGIC = b'ATCIDX1\0'
+INDEX_HEADER = struct.Struct('<QdIQ')
+INDEX_SUFFIX = '.idx'
+HEAD_CHECK_SIZE = 4096
+SCAN_CHUNK_SIZE = 16 * 1024 * 1024
+# 搜索等待索引建立时检查取消的间隔（秒）
+READY_POLL_INTERVAL = 0.1
+
+# 匹配 "[时间戳] [级别] 消息" 格式的日志行
+LEVEL_LINE_PATTERN = rb'^\[[^\]\n]*\] \[%s\]'
+
+
+class LogFileIndex:
+    """日志文件行索引 - 使用 mmap 访问文件，后台线程建立并持久化行偏移索引
+
+    索引以 <日志文件>.idx 保存在日志旁边，再次打开时直接加载；
+    日志文件追加写入后只对新增部分补建索引。
+    """
+
+    def __init__(self, file_path, index_path=None):
+        self.file_path = Path(file_path)
+        self.index_path = Path(index_path) if index_path else Path(f"{self.file_path}{INDEX_SUFFIX}")
+        self.offsets = array('Q')
+
+        self._file = open(self.file_path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+        self.indexed_bytes = 0
+        self.ready = threading.Event()
+        self._cancel = threading.Event()
+        self._thread = None
+
+    # ---------- 索引构建 ----------
+
+    def build_async(self):
+        """在后台线程中加载或建立索引"""
+        self._thread = threading.Thread(target=self.build, name=f"log-index:{self.file_path.name}", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def build(self):
+        """加载已持久化的索引，并补建未索引的部分"""
+        try:
+            if not self.size:
+                return
+
+            self._load_index()
+            if self.indexed_bytes < self.size:
+                self._scan(self.indexed_bytes)
+                if not self._cancel.is_set():
+                    self._save_index()
+        finally:
+            self.ready.set()
+
+    def _head_check(self):
+        return zlib.crc32(self._mmap[:HEAD_CHECK_SIZE])
+
+    def _load_index(self):
+        """加载持久化的索引，文件被改写时丢弃"""
+        try:
+            with open(self.index_path, 'rb') as f:
+                if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                    return
+                size, mtime, head_check, count = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+                if size > self.size or head_check != self._head_check():
+                    return
+                offsets = array('Q')
+                offsets.fromfile(f, count)
+        except (OSError, EOFError, struct.error):
+            return
+
+        if count == 0:
+            return
+
+        # 最后一行可能在上次索引时还未写完，从它的起点重新扫描
+        self.indexed_bytes = offsets.pop()
+        self.offsets = offsets
+
+    def _save_index(self):
+        """持久化索引"""
+        try:
+            tmp_path = Path(f"{self.index_path}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(INDEX_MAGIC)
+                f.write(INDEX_HEADER.pack(self.size, os.path.getmtime(self.file_path),
+                                          self._head_check(), len(self.offsets)))
+                self.offsets.tofile(f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"保存日志索引失败: {e}")
+
+    def _scan(self, start):
+        """从 start 开始扫描换行符，逐块追加行起始偏移
+
+        界面线程在扫描过程中读取 offsets，这里只追加确定是行起点的偏移，不会先追加再删除。
+        """
+        mm = self._mmap
+        offsets = self.offsets
+        offsets.append(start)
+        position = start
+
+        while position < self.size and not self._cancel.is_set():
+            end = min(position + SCAN_CHUNK_SIZE, self.size)
+            chunk = mm[position:end]
+            found = chunk.find(b'\n')
+            batch = array('Q')
+            while found >= 0:
+                batch.append(position + found + 1)
+                found = chunk.find(b'\n', found + 1)
+            # 文件以换行结尾时，最后一个偏移指向文件末尾，不是一行
+            if batch and batch[-1] >= self.size:
+                batch.pop()
+            offsets.extend(batch)
+            position = end
+            self.indexed_bytes = position
+
+    # ---------- 读取 ----------
+
+    @property
+    def line_count(self) -> int:
+        """当前已索引的行数（索引建立过程中会增长）"""
+        return len(self.offsets)
+
+    def line_bytes(self, line_no: int) -> bytes:
+        start = self.offsets[line_no]
+        end = self.offsets[line_no + 1] if line_no + 1 < len(self.offsets) else self.size
+        return self._mmap[start:end].rstrip(b'\r\n')
+
+    def line(self, line_no: int, max_length: Optional[int] = None) -> str:
+        """读取一行文本，只访问该行所在的页"""
+        data = self.line_bytes(line_no)
+        if max_length is not None:
+            data = data[:max_length]
+        return data.decode('utf-8', errors='replace')
+
+    def lines(self, start: int, count: int, max_length: Optional[int] = None):
+        end = min(self.line_count, start + count)
+        return [self.line(line_no, max_length) for line_no in range(start, end)]
+
+    def line_number_at(self, offset: int) -> int:
+        return bisect_right(self.offsets, offset) - 1
+
+    # ---------- 过滤 ----------
+
+    def search(self, pattern: str = None, level: str = None, ignore_case: bool = True,
+               cancel: threading.Event = None) -> Iterator[int]:
+        """按正则和/或日志级别过滤，边扫描边产出匹配的行号
+
+        正则直接在 mmap 的字节上匹配，避免逐行解码。
+        索引建立期间每 READY_POLL_INTERVAL 秒检查一次 cancel，取消时立即返回，界面线程等待搜索线程时不会卡住。
+        """
+        while not self.ready.wait(READY_POLL_INTERVAL):
+            if (cancel is not None and cancel.is_set()) or self._cancel.is_set():
+                return
+        if not self._mmap or not (pattern or level):
+            return
+
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        text_regex = re.compile(pattern.encode('utf-8'), flags) if pattern else None
+        level_regex = re.compile(LEVEL_LINE_PATTERN % re.escape(level.encode('utf-8')), re.MULTILINE) if level else None
+
+        # 以级别为主扫描条件时，正则只在命中的行上复核
+        scan_regex = level_regex or text_regex
+        last_line = -1
+        for match in scan_regex.finditer(self._mmap):
+            if cancel is not None and cancel.is_set():
+                return
+            line_no = self.line_number_at(match.start())
+            if line_no == last_line:
+                continue
+            last_line = line_no
+            if level_regex and text_regex and not text_regex.search(self.line_bytes(line_no)):
+                continue
+            yield line_no
+
+    def close(self):
+        """停止索引线程并释放 mmap"""
+        self._cancel.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+        if self._mmap:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
@@ -0,0 +1,118 @@
+# utils/log_record.py
+import time
+from datetime import datetime
+
+# 日志级别阈值
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+THRESHOLD_NAMES = {
+    "DEBUG": DEBUG,
+    "INFO": INFO,
+    "WARNING": WARNING,
+    "ERROR": ERROR,
+}
+
+# 界面使用的中文级别 -> 严重程度，未列出的级别按 INFO 处理
+LEVEL_SEVERITY = {
+    "调试": DEBUG,
+    "信息": INFO,
+    "系统": INFO,
+    "自动": INFO,
+    "程序输出": INFO,
+    "系统输出": INFO,
+    "终端输出": INFO,
+    "命令输入": INFO,
+    "警告": WARNING,
+    "错误": ERROR,
+}
+
+
+def level_severity(level) -> int:
+    """获取日志级别的严重程度"""
+    return LEVEL_SEVERITY.get(level, INFO)
+
+
+def parse_threshold(threshold) -> int:
+    """把 "DEBUG"/"INFO"/"WARNING"/"ERROR"、中文级别或数字转换为阈值"""
+    if isinstance(threshold, int):
+        return threshold
+    if threshold in THRESHOLD_NAMES:
+        return THRESHOLD_NAMES[threshold]
+    if str(threshold).upper() in THRESHOLD_NAMES:
+        return THRESHOLD_NAMES[str(threshold).upper()]
+    if threshold in LEVEL_SEVERITY:
+        return LEVEL_SEVERITY[threshold]
+    raise ValueError(f"未知的日志级别: {threshold}")
+
+
+class _TimestampCache:
+    """按秒缓存格式化后的时间戳"""
+
+    __slots__ = ('second', 'text')
+
+    def __init__(self):
+        self.second = None
+        self.text = ""
+
+    def format(self, created) -> str:
+        second = int(created)
+        if second != self.second:
+            # 先生成文本再更新秒数，多线程下最坏只是重复格式化
+            text = datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+            self.text = text
+            self.second = second
+            return text
+        return self.text
+
+
+_timestamp_cache = _TimestampCache()
+
+
+def format_timestamp(created) -> str:
+    """格式化时间戳 (YYYY-mm-dd HH:MM:SS)，同一秒内复用缓存"""
+    return _timestamp_cache.format(created)
+
+
+class LogRecord:
+    """日志记录 - 创建时只保存参数，消息和时间戳在首次被消费时才格式化
+
+    message 支持 %-风格的延迟参数: LogRecord("程序输出", "找到端口: %s", (port,))
+    """
+
+    __slots__ = ('level', 'severity', 'msg', 'args', 'created', 'command', '_message', '_formatted')
+
+    def __init__(self, level, msg, args=(), command=None, severity=None, created=None):
+        self.level = level
+        self.severity = severity if severity is not None else level_severity(level)
+        self.msg = msg
+        self.args = args
+        self.created = created if created is not None else time.time()
+        self.command = command
+        self._message = None
+        self._formatted = None
+
+    @property
+    def message(self) -> str:
+        """格式化后的消息"""
+        if self._message is None:
+            if self.args:
+                try:
+                    self._message = str(self.msg) % self.args
+                except (TypeError, ValueError):
+                    self._message = f"{self.msg} {self.args}"
+            else:
+                self._message = str(self.msg)
+        return self._message
+
+    @property
+    def timestamp(self) -> str:
+        return format_timestamp(self.created)
+
+    def formatted(self) -> str:
+        """完整的文本行: [时间戳] [级别] 消息"""
+        if self._formatted is None:
+            self._formatted = f"[{self.timestamp}] [{self.level}] {self.message}"
+        return self._formatted
@@ -0,0 +1,280 @@
+# utils/log_sinks.py
+import gzip
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+
+from utils.log_record import DEBUG, parse_threshold
+
+# 队列满时的处理策略
+BLOCK = "block"  # 阻塞调用线程直到有空位（保证不丢失）
+DROP_OLDEST = "drop_oldest"  # 丢弃最旧的记录
+SAMPLE = "sample"  # 过载期间每 sample_rate 条只保留 1 条
+
+# 文件刷新间隔（秒），与 UnifiedLogger 的默认值一致
+DEFAULT_FLUSH_INTERVAL = 0.2
+
+
+class LogSink(ABC):
+    """日志输出目标基类 - 每个目标有独立的有界队列和消费线程
+
+    UnifiedLogger 只负责把记录投递到各目标的队列，某个目标变慢时只影响它自己的队列，
+    按 overflow 策略阻塞、丢弃或抽样，不会拖慢其他目标。
+    子类设置 idle_interval 后，队列空闲超过该时间会调用 on_idle()。
+    flush() 之前投递的记录处理完后由消费线程调用 on_flush()，文件等资源只在消费线程中访问。
+    """
+
+    # 队列空闲多久（秒）调用一次 on_idle()，None 表示不调用
+    idle_interval = None
+
+    def __init__(self, name, level=DEBUG, capacity=10000, overflow=DROP_OLDEST,
+                 sample_rate=10, batch_size=500):
+        if overflow not in (BLOCK, DROP_OLDEST, SAMPLE):
+            raise ValueError(f"未知的溢出策略: {overflow}")
+        self.name = name
+        self.level = parse_threshold(level)
+        self.capacity = max(1, capacity)
+        self.overflow = overflow
+        self.sample_rate = max(1, sample_rate)
+        self.batch_size = max(1, batch_size)
+
+        self.dropped_count = 0
+        self._overflow_seen = 0
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        # 按序号跟踪刷新请求: 已入队/已出队（处理或丢弃）的记录数，请求刷新时的入队数，已刷新到的出队数
+        self._enqueued = 0
+        self._dequeued = 0
+        self._flush_target = 0
+        self._flushed = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"log-sink:{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, record):
+        """投递一条记录"""
+        with self._cond:
+            if self._closed:
+                return
+            queue = self._queue
+
+            if len(queue) >= self.capacity:
+                if self.overflow == BLOCK:
+                    while len(queue) >= self.capacity and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        return
+                elif self.overflow == DROP_OLDEST:
+                    queue.popleft()
+                    self._dequeued += 1
+                    self.dropped_count += 1
+                else:
+                    self._overflow_seen += 1
+                    self.dropped_count += 1
+                    if self._overflow_seen % self.sample_rate:
+                        return
+                    queue.popleft()
+                    self._dequeued += 1
+
+            queue.append(record)
+            self._enqueued += 1
+            if len(queue) == 1:
+                self._cond.notify_all()
+
+    def _run(self):
+        """消费线程"""
+        while True:
+            with self._cond:
+                idle = False
+                while not self._queue and not self._closed and not self._flush_pending():
+                    if not self._cond.wait(self.idle_interval):
+                        idle = not self._queue and not self._flush_pending()
+                        break
+                if self._queue:
+                    count = min(len(self._queue), self.batch_size)
+                    batch = [self._queue.popleft() for _ in range(count)]
+                    self._dequeued += count
+                    self._cond.notify_all()
+                elif self._flush_pending():
+                    batch = []
+                elif idle:
+                    batch = None
+                else:
+                    self._cond.notify_all()
+                    return
+                # 取出这批记录后，出队序号之前的记录都已处理或丢弃
+                flush_mark = self._dequeued
+
+            if batch is None:
+                self._call("刷新", self.on_idle)
+                continue
+
+            if batch:
+                self._call("写入", self.emit_batch, batch)
+
+            with self._cond:
+                pending = self._flush_pending()
+            if pending:
+                self._call("刷新", self.on_flush)
+                with self._cond:
+                    self._flushed = max(self._flushed, flush_mark)
+                    self._cond.notify_all()
+
+    def _flush_pending(self):
+        """有 flush() 在等待（调用方持有锁）"""
+        return self._flush_target > self._flushed
+
+    def _call(self, action, func, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"日志输出目标 {self.name} {action}失败: {e}", file=sys.__stderr__)
+
+    @abstractmethod
+    def emit_batch(self, records):
+        """处理一批记录，由子类实现"""
+
+    def on_idle(self):
+        """队列空闲超过 idle_interval 秒时在消费线程中调用"""
+        pass
+
+    def on_flush(self):
+        """flush() 之前投递的记录处理完后在消费线程中调用"""
+        pass
+
+    def on_close(self):
+        """消费线程结束后释放资源"""
+        pass
+
+    def flush(self, timeout=None):
+        """屏障: 等待此前投递的记录全部处理完，并由消费线程调用 on_flush()"""
+        with self._cond:
+            target = self._enqueued
+            if target <= self._flushed:
+                return True
+            self._flush_target = max(self._flush_target, target)
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._flushed >= target or not self._thread.is_alive(), timeout)
+
+    def close(self):
+        """处理完剩余记录后关闭"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.on_close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queued': len(self._queue),
+                'dropped': self.dropped_count,
+            }
+
+
+class ConsoleSink(LogSink):
+    """控制台输出"""
+
+    def __init__(self, level=DEBUG, capacity=5000, overflow=DROP_OLDEST, **kwargs):
+        super().__init__("console", level, capacity, overflow, **kwargs)
+
+    def emit_batch(self, records):
+        stream = sys.stdout
+        if stream is None:  # 打包为窗口程序时没有控制台
+            return
+        stream.write("".join(record.formatted() + "\n" for record in records))
+        stream.flush()
+
+
+class GuiSink(LogSink):
+    """界面输出 - 通过回调（通常是 log_signal.emit）交给 LogBridge"""
+
+    def __init__(self, emit, level=DEBUG, capacity=20000, overflow=DROP_OLDEST, **kwargs):
+        super().__init__("gui", level, capacity, overflow, **kwargs)
+        self.emit = emit
+
+    def emit_batch(self, records):
+        for record in records:
+            self.emit(record.level, record.message)
+
+
+class FileSink(LogSink):
+    """文本日志文件 - 距上次刷新超过 flush_interval 秒时刷新，队列空闲时也会刷新"""
+
+    def __init__(self, file_path, level=DEBUG, capacity=100000, overflow=BLOCK,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, **kwargs):
+        self.file_path = file_path
+        self.flush_interval = flush_interval
+        self.idle_interval = flush_interval
+        self._file = open(file_path, 'a', encoding='utf-8')
+        self._last_flush = time.monotonic()
+        self._dirty = False
+        super().__init__("file", level, capacity, overflow, **kwargs)
+
+    def emit_batch(self, records):
+        self._file.write("".join(record.formatted() + "\n" for record in records))
+        self._dirty = True
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self._flush_file()
+
+    def on_idle(self):
+        if self._dirty:
+            self._flush_file()
+
+    def _flush_file(self):
+        self._file.flush()
+        self._dirty = False
+        self._last_flush = time.monotonic()
+
+    def on_flush(self):
+        self._flush_file()
+
+    def on_close(self):
+        self._file.close()
+
+
+class StructuredSink(LogSink):
+    """结构化日志 (EventStore)"""
+
+    def __init__(self, event_store, level=DEBUG, capacity=100000, overflow=BLOCK, **kwargs):
+        self.event_store = event_store
+        super().__init__("structured", level, capacity, overflow, **kwargs)
+
+    def emit_batch(self, records):
+        for record in records:
+            self.event_store.append(record.level, record.message,
+                                    command=record.command, timestamp=record.created)
+
+    def on_flush(self):
+        self.event_store.flush()
+
+    def on_close(self):
+        self.event_store.close()
+
+
+class ArchiveSink(LogSink):
+    """gzip 压缩归档"""
+
+    def __init__(self, file_path, level=DEBUG, capacity=100000, overflow=BLOCK,
+                 compresslevel=6, sync_interval=5.0, **kwargs):
+        self.file_path = file_path
+        self.sync_interval = sync_interval
+        self._file = gzip.open(file_path, 'at', encoding='utf-8', compresslevel=compresslevel)
+        self._last_sync = time.monotonic()
+        super().__init__("archive", level, capacity, overflow, **kwargs)
+
+    def emit_batch(self, records):
+        self._file.write("".join(record.formatted() + "\n" for record in records))
+        # 压缩流频繁刷新会降低压缩率，按时间间隔同步
+        now = time.monotonic()
+        if now - self._last_sync >= self.sync_interval:
+            self._file.flush()
+            self._last_sync = now
+
+    def on_close(self):
+        self._file.close()
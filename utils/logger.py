@@ -1,20 +1,169 @@
+import queue
+import threading
+import time
 from datetime import datetime
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
 from PyQt5.QtCore import QObject, pyqtSignal
 
+from utils.event_store import EventStore
+from utils.log_record import LogRecord, DEBUG, INFO, ERROR, LEVEL_SEVERITY, parse_threshold
+from utils.log_sinks import ConsoleSink, GuiSink, FileSink, StructuredSink, ArchiveSink
+
+# 后台写入线程的默认刷新参数
+DEFAULT_FLUSH_INTERVAL = 0.2  # 秒
+DEFAULT_BATCH_SIZE = 256  # 行
+
+_STOP = object()
+
+
+class AsyncLogWriter:
+    """后台批量写入器 - 调用线程只负责入队，由独立线程按批次写入并刷新文件
+
+    满足以下任一条件时执行一次 flush:
+    - 距上次刷新超过 flush_interval 秒
+    - 未刷新的记录达到 batch_size 条
+    - 调用方通过 flush()/close() 设置了屏障
+    """
+
+    def __init__(self, file_path, mode='a', encoding='utf-8',
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, batch_size=DEFAULT_BATCH_SIZE):
+        self.file_path = file_path
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self.binary = 'b' in mode
+
+        self._file = open(file_path, mode) if self.binary else open(file_path, mode, encoding=encoding)
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name=f"log-writer:{Path(file_path).name}", daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def write(self, data):
+        """写入数据（仅入队，不阻塞调用线程）"""
+        with self._lock:
+            if self._closed:
+                return
+            self._queue.put(data)
+
+    def flush(self, timeout=None):
+        """屏障: 等待此前入队的数据全部写入并刷新到磁盘
+
+        Returns:
+            是否在超时前完成
+        """
+        barrier = threading.Event()
+        with self._lock:
+            if self._closed:
+                return True
+            self._queue.put(barrier)
+        return barrier.wait(timeout)
+
+    def close(self):
+        """关闭写入器，保证此前入队的数据全部落盘"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        """后台写入循环"""
+        pending = 0
+        last_flush = time.monotonic()
+
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval if pending else None)
+                items = [item]
+            except queue.Empty:
+                items = []
+
+            # 一次性取出队列中已有的数据，组成一个批次
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            chunks = []
+            barriers = []
+            stop = False
+            for item in items:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    barriers.append(item)
+                else:
+                    chunks.append(item)
+
+            try:
+                if chunks:
+                    self._file.write((b'' if self.binary else '').join(chunks))
+                    pending += len(chunks)
+
+                now = time.monotonic()
+                if pending and (barriers or stop or pending >= self.batch_size
+                                or now - last_flush >= self.flush_interval):
+                    self._file.flush()
+                    pending = 0
+                    last_flush = now
+            except Exception as e:
+                print(f"写入日志文件失败 ({self.file_path}): {e}")
+                pending = 0
+
+            for barrier in barriers:
+                barrier.set()
+
+            if stop:
+                try:
+                    self._file.close()
+                except Exception as e:
+                    print(f"关闭日志文件失败 ({self.file_path}): {e}")
+                return
+
+
+class _WriterStream:
+    """将 AsyncLogWriter 包装为类文件对象，供 pexpect 的 logfile 使用
+
+    pexpect 每次写入后都会调用 flush()，这里不做同步刷新，交由后台线程按批次处理。
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def write(self, data):
+        self.writer.write(data)
+
+    def flush(self):
+        pass
+
 
 class TerminalLogger:
     """终端输入输出记录器"""
 
-    def __init__(self, log_file_path):
+    def __init__(self, log_file_path, flush_interval=DEFAULT_FLUSH_INTERVAL, batch_size=DEFAULT_BATCH_SIZE):
         self.log_file_path = log_file_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.writer = None
         self.log_file = None
         self.setup_terminal_log()
 
     def setup_terminal_log(self):
         """设置终端日志文件"""
         try:
-            self.log_file = open(self.log_file_path, 'a', encoding='utf-8')
+            self.writer = AsyncLogWriter(self.log_file_path, 'a', encoding='utf-8',
+                                         flush_interval=self.flush_interval, batch_size=self.batch_size)
+            self.log_file = _WriterStream(self.writer)
             self.write_terminal_log("TERMINAL", "终端日志开始记录")
         except Exception as e:
             print(f"无法创建终端日志文件: {e}")
@@ -26,8 +175,7 @@ class TerminalLogger:
             # 清理数据中的控制字符
             cleaned_data = self.clean_control_chars(data)
             log_entry = f"[{timestamp}] [{direction}] {cleaned_data}\n"
-            self.log_file.write(log_entry)
-            self.log_file.flush()
+            self.writer.write(log_entry)
 
     def clean_control_chars(self, text):
         """清理控制字符，保留可打印字符"""
@@ -54,39 +202,91 @@ class TerminalLogger:
         """记录超时"""
         self.write_terminal_log("TIMEOUT", "操作超时")
 
+    def flush(self, timeout=None):
+        """等待已记录的终端日志全部落盘"""
+        if self.writer:
+            return self.writer.flush(timeout)
+        return True
+
     def close(self):
         """关闭终端日志"""
         if self.log_file:
             self.write_terminal_log("TERMINAL", "终端日志结束记录")
-            self.log_file.close()
+            self.writer.close()
+            self.log_file = None
 
 
 class UnifiedLogger(QObject):
-    """统一的日志记录器，支持UI显示、文件保存和命令记录"""
+    """统一的日志记录器，支持UI显示、文件保存和命令记录
+
+    每条日志按级别阈值过滤后投递到已注册的输出目标 (sink)，每个目标有独立的队列和线程:
+    console / gui / file / structured / archive。
+    """
 
     # 信号用于UI更新
     log_signal = pyqtSignal(str, str)  # level, message
 
-    def __init__(self, session_path=None, log_to_file=True):
+    def __init__(self, session_path=None, log_to_file=True,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, batch_size=DEFAULT_BATCH_SIZE,
+                 structured_log=False, archive_log=False):
         super().__init__()
         self.log_to_file = log_to_file
         self.session_path = session_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.structured_log = structured_log
+        self.archive_log = archive_log
+        self.event_store = None
+
+        # 当前线程（或协程任务）正在执行的命令，用于结构化日志和按命令过滤
+        self._command = ContextVar(f"atc_command_{id(self)}", default=None)
+
+        # 输出目标注册表和按命令的级别阈值
+        self.sinks = {}
+        self.command_levels = {}
+        self._min_level = DEBUG
+
+        self.add_sink(ConsoleSink())
+        self.add_sink(GuiSink(self.log_signal.emit))
 
         # 延迟初始化日志文件路径，直到session_path可用
         self.log_file_path = None
         self.terminal_log_path = None
+        self.archive_path = None
 
-        self.log_file = None
         self.terminal_logger = None
 
         # 如果提供了session_path，立即设置日志文件
         if self.session_path and self.log_to_file:
             self.setup_log_files()
 
+    def add_sink(self, sink):
+        """注册输出目标，同名目标会被替换"""
+        previous = self.sinks.get(sink.name)
+        self.sinks = {**self.sinks, sink.name: sink}
+        self._update_min_level()
+        if previous:
+            previous.close()
+
+    def remove_sink(self, name):
+        """移除并关闭输出目标"""
+        sinks = dict(self.sinks)
+        sink = sinks.pop(name, None)
+        self.sinks = sinks
+        self._update_min_level()
+        if sink:
+            sink.close()
+
+    def get_sink(self, name):
+        return self.sinks.get(name)
+
+    def _update_min_level(self):
+        self._min_level = min((sink.level for sink in self.sinks.values()), default=ERROR + 1)
+
     def set_session_path(self, session_path):
         """设置会话路径并初始化日志文件"""
         self.session_path = session_path
-        if self.log_to_file and not self.log_file:
+        if self.log_to_file and "file" not in self.sinks:
             self.setup_log_files()
 
     def setup_log_files(self):
@@ -104,40 +304,111 @@ class UnifiedLogger(QObject):
             self.terminal_log_path = Path(self.session_path) / f"atc_terminal_{timestamp}.log"
 
             # 设置普通日志文件
-            self.log_file = open(self.log_file_path, 'a', encoding='utf-8')
+            self.add_sink(FileSink(self.log_file_path, flush_interval=self.flush_interval, batch_size=self.batch_size))
             self.log("系统", f"日志文件: {self.log_file_path}")
 
             # 设置终端日志记录器
-            self.terminal_logger = TerminalLogger(self.terminal_log_path)
+            self.terminal_logger = TerminalLogger(self.terminal_log_path,
+                                                  flush_interval=self.flush_interval,
+                                                  batch_size=self.batch_size)
             self.log("系统", f"终端日志文件: {self.terminal_log_path}")
 
-        except Exception as e:
-            print(f"无法创建日志文件: {e}")
+            # 设置结构化日志
+            if self.structured_log:
+                self.event_store = EventStore(self.session_path)
+                self.add_sink(StructuredSink(self.event_store))
+                self.log("系统", f"结构化日志: {self.event_store.events_path}")
 
-    def log(self, level, message):
-        """统一的日志记录方法"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        formatted_message = f"[{timestamp}] [{level}] {message}"
+            # 设置压缩归档
+            if self.archive_log:
+                self.archive_path = Path(self.session_path) / f"atc_log_{timestamp}.log.gz"
+                self.add_sink(ArchiveSink(self.archive_path))
+                self.log("系统", f"压缩归档: {self.archive_path}")
 
-        # 输出到控制台
-        print(formatted_message)
+        except Exception as e:
+            print(f"无法创建日志文件: {e}")
 
-        # 发送到UI
-        self.log_signal.emit(level, message)
+    def set_sink_level(self, sink, threshold):
+        """设置某个输出目标的级别阈值"""
+        if sink not in self.sinks:
+            raise ValueError(f"未知的日志输出目标: {sink}")
+        self.sinks[sink].level = parse_threshold(threshold)
+        self._update_min_level()
+
+    def set_command_level(self, command_name, threshold):
+        """设置某个命令的级别阈值，threshold 为 None 时恢复默认"""
+        if threshold is None:
+            self.command_levels.pop(command_name, None)
+        else:
+            self.command_levels[command_name] = parse_threshold(threshold)
+
+    def is_enabled(self, level, command_name=None):
+        """判断该级别的日志是否会被任一输出目标记录"""
+        severity = LEVEL_SEVERITY.get(level, INFO)
+        return severity >= self._min_level and severity >= self._command_level(command_name)
+
+    def _command_level(self, command_name):
+        """命令的级别阈值；子通道 (如 reboot_log/3) 未单独设置时沿用所属命令的阈值"""
+        threshold = self.command_levels.get(command_name)
+        if threshold is None and command_name and "/" in command_name:
+            threshold = self.command_levels.get(command_name.split("/", 1)[0])
+        return DEBUG if threshold is None else threshold
+
+    def log(self, level, message, *args):
+        """统一的日志记录方法
+
+        args 非空时按 message % args 延迟格式化；被级别阈值过滤掉的日志不会做任何格式化。
+        """
+        severity = LEVEL_SEVERITY.get(level, INFO)
+        if severity < self._min_level:
+            return
+
+        command = self._command.get()
+        if self.command_levels and severity < self._command_level(command):
+            return
+
+        record = LogRecord(level, message, args, command, severity)
+        for sink in self.sinks.values():
+            if severity >= sink.level:
+                sink.submit(record)
+
+    @contextmanager
+    def command_context(self, command_name):
+        """在当前线程或协程任务内为日志标记所属命令"""
+        token = self._command.set(command_name)
+        try:
+            yield
+        finally:
+            self._command.reset(token)
 
-        # 写入文件
-        if self.log_to_file and self.log_file:
-            self.log_file.write(formatted_message + "\n")
-            self.log_file.flush()
+    def current_command(self):
+        """获取当前线程或协程任务正在执行的命令"""
+        return self._command.get()
 
     def get_terminal_logger(self):
         """获取终端日志记录器"""
         return self.terminal_logger
 
+    def sink_stats(self):
+        """各输出目标的队列长度和丢弃数量"""
+        return {name: sink.stats() for name, sink in self.sinks.items()}
+
+    def flush(self, timeout=None):
+        """屏障: 等待所有已记录的日志写入磁盘"""
+        done = True
+        for sink in self.sinks.values():
+            done = sink.flush(timeout) and done
+        if self.terminal_logger:
+            done = self.terminal_logger.flush(timeout) and done
+        return done
+
     def close(self):
-        """关闭日志记录器"""
-        if self.log_file:
-            self.log_file.close()
+        """关闭日志记录器，确保队列中的日志全部落盘"""
+        sinks = self.sinks
+        self.sinks = {}
+        self._update_min_level()
+        for sink in sinks.values():
+            sink.close()
 
         if self.terminal_logger:
-            self.terminal_logger.close()
\ No newline at end of file
+            self.terminal_logger.close()
@@ -0,0 +1,279 @@
+# utils/parallel_transfer.py
+import asyncio
+import os
+import posixpath
+import shlex
+import subprocess
+import time
+from pathlib import Path
+
+from utils import async_expect
+from utils.cancellation import close_child
+from utils.device_sync import DeviceSync, file_sha256, parse_hash_output
+from utils.ssh_transport import lane_host
+
+# 默认并行流数，可按工位调整
+DEFAULT_STREAMS = 4
+MAX_STREAMS = 16
+# 超过该大小的文件按字节范围分块，由多个流同时传输
+LARGE_FILE_SIZE = 64 * 1024 * 1024
+# 分块大小，必须是 dd 块大小（1 MiB）的整数倍
+CHUNK_SIZE = 32 * 1024 * 1024
+DD_BLOCK = 1024 * 1024
+# 一批小文件的最大文件数和字节数（一次 scp）
+BATCH_FILES = 200
+BATCH_BYTES = 32 * 1024 * 1024
+# 单个分块或批次的最长传输时间
+ITEM_TIMEOUT = 600
+# 分块或批次失败后的重试次数
+RETRIES = 2
+
+
+class _LargeFile:
+    """分块传输中的大文件: 先写入 .part，全部分块完成并校验后改名"""
+
+    def __init__(self, remote, local, size, mtime):
+        self.remote = remote
+        self.local = local
+        self.part = local.with_name(local.name + ".part")
+        self.size = size
+        self.mtime = mtime
+        self.pending = 0
+        self.failed = False
+        self.remote_hash = None
+
+
+class ParallelTransfer:
+    """多流并行传输 - 把一组设备路径拆成多个传输项，由 N 个流（各自独立的 SSH 主连接）同时拉取
+
+    - 小文件按设备目录分批，每批一次 scp -p
+    - 大于 LARGE_FILE_SIZE 的文件按 CHUNK_SIZE 分块，每块由 `dd skip/count` 读出后写入本地文件的对应偏移
+    - 大文件全部分块到齐后核对大小（verify=True 时再与设备端 SHA-256 比较），通过后改名并恢复修改时间
+    - 有断点（checkpoint）时记录完成的分块和文件；再次传输时跳过本地已是最新的文件和 .part 中已完成的分块
+    语义与对每个路径执行 `scp -r 设备路径 本地目录` 相同。分块读取只走主连接（BatchMode），
+    没有任何主连接可用时 pull() 直接返回失败且 lanes 为空，由调用方退回 scp；
+    部分传输项失败时只返回失败，已完成的部分记在断点中。
+    """
+
+    def __init__(self, ssh, host, logger=None, cancel_token=None, streams=DEFAULT_STREAMS, verify=True,
+                 logfile=None, checkpoint=None):
+        self.ssh = ssh
+        self.host = host
+        self.logger = logger
+        self.cancel_token = cancel_token
+        self.streams = max(1, min(MAX_STREAMS, streams))
+        self.verify = verify
+        self.logfile = logfile
+        self.checkpoint = checkpoint
+        # 本次 pull() 建立的主连接
+        self.lanes = []
+
+    def log(self, level, message):
+        if self.logger:
+            self.logger.log(level, message)
+
+    async def open_lanes(self):
+        """为每个流建立独立的主连接，返回可用的连接名"""
+        hosts = [lane_host(self.host, lane) for lane in range(self.streams)]
+        results = await asyncio.gather(*(self.ssh.ensure_master(host, self.cancel_token) for host in hosts))
+        return [host for host, ok in zip(hosts, results) if ok]
+
+    async def plan(self, remote_paths, local_dir):
+        """列出设备文件并拆分为传输项，返回 (传输项列表, 大文件列表, 总文件数, 总字节数)"""
+        syncer = DeviceSync(self.ssh, self.host, cancel_token=self.cancel_token)
+        skipped = 0
+        items, large_files, total_files, total_bytes = [], [], 0, 0
+        for remote_path in remote_paths:
+            remote_parent = posixpath.dirname(remote_path.rstrip("/")) or "/"
+            files = await syncer.remote_manifest(remote_path)
+            if not files:
+                raise FileNotFoundError(f"设备上没有文件: {remote_path}")
+            total_files += len(files)
+            batches = {}
+            for path, entry in sorted(files.items()):
+                total_bytes += entry["size"]
+                remote = posixpath.join(remote_parent, path)
+                if self.checkpoint and syncer.is_current(local_dir / path, entry):
+                    skipped += 1
+                    continue
+                if entry["size"] > LARGE_FILE_SIZE:
+                    large = _LargeFile(remote, local_dir / path, entry["size"], entry["mtime"])
+                    large_files.append(large)
+                    done_chunks = set()
+                    if self.checkpoint and large.part.exists():
+                        done_chunks = set(self.checkpoint.file_state(remote, large.size, large.mtime)["chunks"])
+                    elif self.checkpoint:
+                        self.checkpoint.file_state(remote, large.size, large.mtime)["chunks"] = []
+                    for offset in range(0, large.size, CHUNK_SIZE):
+                        if offset in done_chunks:
+                            continue
+                        items.append(("chunk", large, offset, min(CHUNK_SIZE, large.size - offset)))
+                        large.pending += 1
+                    if done_chunks:
+                        self.log("程序输出", f"断点续传 {remote}: 已完成 {len(done_chunks)} 个分块")
+                    continue
+                directory = posixpath.dirname(path)
+                batch = batches.get(directory)
+                if not batch or len(batch[1]) >= BATCH_FILES or batch[3] + entry["size"] > BATCH_BYTES:
+                    batch = batches[directory] = ["batch", [], local_dir / directory, 0, {}]
+                    items.append(batch)
+                batch[1].append(remote)
+                batch[3] += entry["size"]
+                batch[4][remote] = (entry["size"], entry["mtime"])
+        if skipped:
+            self.log("程序输出", f"断点续传: 跳过 {skipped} 个已完成的文件")
+        # 大的传输项先开始，避免最后只剩一个流在传大块
+        items.sort(key=lambda item: item[3], reverse=True)
+        return items, large_files, total_files, total_bytes
+
+    async def pull(self, remote_paths, local_dir):
+        """并行拉取 remote_paths 到 local_dir，返回 (是否成功, 失败原因)"""
+        started = time.monotonic()
+        local_dir = Path(local_dir)
+        lanes = self.lanes = await self.open_lanes()
+        if not lanes:
+            return False, "SSH 主连接不可用"
+        try:
+            items, large_files, total_files, total_bytes = await self.plan(remote_paths, local_dir)
+        except (FileNotFoundError, TimeoutError) as e:
+            return False, str(e)
+
+        for large in large_files:
+            large.part.parent.mkdir(parents=True, exist_ok=True)
+            # 续传时保留 .part 中已完成的分块
+            with open(large.part, 'ab') as f:
+                f.truncate(large.size)
+        hashing = asyncio.ensure_future(self.remote_hashes(large_files)) if self.verify and large_files else None
+
+        queue = asyncio.Queue()
+        for item in items:
+            queue.put_nowait(item)
+        failures = []
+        try:
+            await asyncio.gather(*(self.worker(lane, queue, failures) for lane in lanes))
+            if hashing:
+                await hashing
+            for large in large_files:
+                if not large.failed and not await self.finish_large(large):
+                    failures.append(large.remote)
+        finally:
+            if hashing and not hashing.done():
+                hashing.cancel()
+
+        duration = time.monotonic() - started
+        self.log("程序输出", f"并行传输 {len(lanes)} 个流: {total_files} 个文件，{total_bytes / 1024 / 1024:.1f} MB，"
+                           f"耗时 {duration:.1f}s（{total_bytes / 1024 / 1024 / max(duration, 0.001):.1f} MB/s）")
+        if failures:
+            return False, f"{len(failures)} 项传输失败: {', '.join(failures[:5])}"
+        return True, None
+
+    async def worker(self, lane, queue, failures):
+        """一个传输流: 依次取出传输项，失败时重试"""
+        while not queue.empty():
+            item = queue.get_nowait()
+            for attempt in range(RETRIES + 1):
+                error = await self.transfer_item(lane, item)
+                if error is None:
+                    break
+                self.log("警告", f"[{lane}] 传输失败 ({error})" + ("，重试" if attempt < RETRIES else ""))
+            else:
+                if item[0] == "chunk":
+                    item[1].failed = True
+                    failures.append(f"{item[1].remote}@{item[2]}")
+                else:
+                    failures.extend(item[1])
+                continue
+            if item[0] == "chunk":
+                item[1].pending -= 1
+                if self.checkpoint:
+                    self.checkpoint.add_chunk(item[1].remote, item[2])
+            elif self.checkpoint:
+                for remote, (size, mtime) in item[4].items():
+                    self.checkpoint.mark_done(remote, size, mtime)
+
+    async def transfer_item(self, lane, item):
+        """传输一个分块或一批小文件，成功返回 None，否则返回失败原因"""
+        if item[0] == "batch":
+            _, sources, target, _, _ = item
+            target.mkdir(parents=True, exist_ok=True)
+            ok, error = await self.ssh.copy(lane, sources, target, ITEM_TIMEOUT, self.cancel_token, preserve=True,
+                                            logfile=self.logfile)
+            return error
+        _, large, offset, length = item
+        return await self.fetch_chunk(lane, large, offset, length)
+
+    async def fetch_chunk(self, lane, large, offset, length):
+        """用 dd 读出 [offset, offset + length) 并写入 .part 的相同偏移"""
+        command = (f"dd if={shlex.quote(large.remote)} bs={DD_BLOCK} skip={offset // DD_BLOCK}"
+                   f" count={-(-length // DD_BLOCK)} 2>/dev/null")
+        async with self.ssh.connection(lane, self.cancel_token):
+            process = subprocess.Popen(self.ssh.batch_args(lane, command), stdin=subprocess.DEVNULL,
+                                       stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            if self.cancel_token:
+                self.cancel_token.register(process)
+            try:
+                received = await async_expect.run_blocking(_write_at, process.stdout, large.part, offset, length,
+                                                           cancel_token=self.cancel_token, timeout=ITEM_TIMEOUT)
+            except TimeoutError:
+                return "超时"
+            finally:
+                close_child(process)
+                if self.cancel_token:
+                    self.cancel_token.unregister(process)
+        if received != length:
+            return f"{large.remote} 偏移 {offset} 只收到 {received}/{length} 字节"
+        return None
+
+    async def remote_hashes(self, large_files):
+        """在设备上计算大文件的 SHA-256，与分块传输同时进行"""
+        paths = " ".join(shlex.quote(large.remote) for large in large_files)
+        status, output = await self.ssh.run(self.host, f"shasum -a 256 {paths} 2>/dev/null || sha256sum {paths}",
+                                            timeout=ITEM_TIMEOUT, cancel_token=self.cancel_token)
+        hashes = parse_hash_output(output)
+        for large in large_files:
+            large.remote_hash = hashes.get(large.remote)
+
+    async def finish_large(self, large):
+        """核对重组后的大文件，通过后改名并恢复修改时间"""
+        if large.pending:
+            self.log("错误", f"{large.remote} 分块不完整")
+            return False
+        if large.part.stat().st_size != large.size:
+            self.log("错误", f"{large.remote} 大小不符，丢弃已传输的分块")
+            self.discard_large(large)
+            return False
+        if self.verify:
+            if not large.remote_hash:
+                self.log("警告", f"未取得 {large.remote} 的设备端哈希，只核对大小")
+            else:
+                local_hash = await async_expect.run_blocking(file_sha256, large.part, cancel_token=self.cancel_token)
+                if local_hash != large.remote_hash:
+                    self.log("错误", f"{large.remote} 校验失败: 本地 {local_hash[:12]}，设备 {large.remote_hash[:12]}，"
+                                   f"丢弃已传输的分块")
+                    self.discard_large(large)
+                    return False
+        os.replace(large.part, large.local)
+        os.utime(large.local, (large.mtime, large.mtime))
+        if self.checkpoint:
+            self.checkpoint.mark_done(large.remote, large.size, large.mtime)
+        return True
+
+    def discard_large(self, large):
+        """删除 .part 并清除断点中的分块记录，重试时整个文件从头传输"""
+        large.part.unlink(missing_ok=True)
+        if self.checkpoint:
+            self.checkpoint.reset_file(large.remote)
+
+
+def _write_at(stream, path, offset, length):
+    """把数据流写入 path 的 offset 处，最多 length 字节，返回写入的字节数"""
+    written = 0
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        while written < length:
+            data = stream.read(min(DD_BLOCK, length - written))
+            if not data:
+                break
+            f.write(data)
+            written += len(data)
+    return written
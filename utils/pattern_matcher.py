@@ -0,0 +1,67 @@
+# utils/pattern_matcher.py
+import re
+from typing import Callable, Dict, List
+
+
+class MultiPatternMatcher:
+    """多模式匹配器 - 将 {pattern: callback} 事件表一次性编译为单个正则
+
+    所有模式合并为一个带命名分组的交替表达式，未命中任何模式的行（绝大多数终端输出）
+    只需扫描一次。命中时，交替匹配可能因位置重叠而漏掉其他模式，此时只对尚未命中的
+    模式逐个复核，保证与逐个 re.search 完全相同的回调语义和顺序。
+    """
+
+    def __init__(self, handlers: Dict[str, Callable], flags: int = re.IGNORECASE):
+        self.handlers = list((handlers or {}).items())
+        self.flags = flags
+        self._patterns = [re.compile(pattern, flags) for pattern, _ in self.handlers]
+
+        # 自带捕获分组的模式（可能含反向引用）不参与合并，始终单独匹配
+        self._merged = [index for index, pattern in enumerate(self._patterns) if pattern.groups == 0]
+        self._separate = [index for index, pattern in enumerate(self._patterns) if pattern.groups > 0]
+        self._combined = self._compile_combined()
+
+    def _compile_combined(self):
+        """编译合并后的正则"""
+        if not self._merged:
+            return None
+        try:
+            return re.compile(
+                '|'.join(f'(?P<_h{index}>{self.handlers[index][0]})' for index in self._merged),
+                self.flags
+            )
+        except re.error:
+            # 例如模式中间含有全局内联标志，退回逐个匹配
+            self._separate = list(range(len(self._patterns)))
+            return None
+
+    def match(self, line: str) -> List[int]:
+        """返回命中的处理器下标（按注册顺序）"""
+        matched = set()
+        if self._combined is not None:
+            for match in self._combined.finditer(line):
+                matched.add(int(match.lastgroup[2:]))
+
+            # 复核未命中的合并模式，处理匹配区间重叠的情况
+            if matched:
+                for index in self._merged:
+                    if index not in matched and self._patterns[index].search(line):
+                        matched.add(index)
+
+        for index in self._separate:
+            if self._patterns[index].search(line):
+                matched.add(index)
+
+        return sorted(matched)
+
+    def dispatch(self, line: str, on_error: Callable = None) -> int:
+        """对命中的处理器依次调用回调，返回调用次数"""
+        indices = self.match(line)
+        for index in indices:
+            try:
+                self.handlers[index][1](line)
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(e)
+        return len(indices)
@@ -0,0 +1,245 @@
+# utils/segmented_log.py
+import gzip
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from bisect import bisect_right
+from pathlib import Path
+
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+MANIFEST_SUFFIX = ".manifest.json"
+# 还原后的完整日志文件名: <名称>.combined<扩展名>，供日志查看器建立索引
+COMBINED_INFIX = ".combined"
+# 分段文件名: <名称>.0001.log 或 <名称>.0001.log.gz
+SEGMENT_NAME_PATTERN = re.compile(r"(.+)\.\d{4}\.[^.]+(\.gz)?$")
+
+
+class SegmentedLogWriter:
+    """分段终端日志写入器 - 按大小/时间滚动，已关闭的分段在后台线程中 gzip 压缩
+
+    nanocom_session.log 会写成:
+        nanocom_session.0001.log.gz, nanocom_session.0002.log.gz, ..., nanocom_session.000N.log
+        nanocom_session.manifest.json
+
+    清单按顺序记录每个分段的文件名、原始字节数和在整个记录中的起始偏移，
+    可以直接定位某个偏移所在的分段；各 .gz 分段按顺序拼接后也是合法的 gzip 流。
+    对外提供 write()/flush()/close()，可直接作为 pexpect 的日志文件使用。
+    """
+
+    def __init__(self, log_file_path, segment_bytes=DEFAULT_SEGMENT_BYTES, segment_seconds=None,
+                 compress=True, compresslevel=6):
+        path = Path(log_file_path)
+        self.directory = path.parent
+        self.stem = path.stem
+        self.suffix = path.suffix or ".log"
+        self.manifest_path = self.directory / f"{self.stem}{MANIFEST_SUFFIX}"
+
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.compress = compress
+        self.compresslevel = compresslevel
+
+        self._lock = threading.Lock()
+        self.segments = []
+        self._file = None
+        self._segment_size = 0
+        self._segment_started = 0.0
+        self._total_bytes = 0
+        self.closed = False
+
+        self._compress_queue = queue.Queue()
+        self._compress_thread = None
+        if compress:
+            self._compress_thread = threading.Thread(
+                target=self._compress_worker, name=f"log-compress:{self.stem}", daemon=True
+            )
+            self._compress_thread.start()
+
+        self._open_segment()
+
+    @property
+    def name(self):
+        """当前正在写入的分段路径"""
+        return str(self.directory / self.segments[-1]["file"])
+
+    def _open_segment(self):
+        """开始一个新分段（调用方持有锁或处于初始化中）"""
+        index = len(self.segments) + 1
+        file_name = f"{self.stem}.{index:04d}{self.suffix}"
+        self._file = open(self.directory / file_name, 'wb')
+        self._segment_size = 0
+        self._segment_started = time.time()
+        self.segments.append({
+            "index": index,
+            "file": file_name,
+            "compressed": False,
+            "start_offset": self._total_bytes,
+            "raw_bytes": 0,
+            "started": self._segment_started,
+            "ended": None,
+        })
+        self._write_manifest()
+
+    def _close_segment(self):
+        """关闭当前分段并提交压缩（调用方持有锁）"""
+        segment = self.segments[-1]
+        self._file.close()
+        self._file = None
+        segment["raw_bytes"] = self._segment_size
+        segment["ended"] = time.time()
+        self._write_manifest()
+        if self.compress:
+            self._compress_queue.put(segment)
+
+    def _should_rotate(self):
+        if self.segment_bytes and self._segment_size >= self.segment_bytes:
+            return True
+        if self.segment_seconds and time.time() - self._segment_started >= self.segment_seconds:
+            return True
+        return False
+
+    def write(self, data):
+        """写入原始字节"""
+        if isinstance(data, str):
+            data = data.encode('utf-8', errors='replace')
+        with self._lock:
+            if self.closed:
+                return
+            if self._segment_size and self._should_rotate():
+                self._close_segment()
+                self._open_segment()
+            self._file.write(data)
+            self._segment_size += len(data)
+            self._total_bytes += len(data)
+
+    def flush(self):
+        with self._lock:
+            if self._file:
+                self._file.flush()
+
+    def close(self, wait=False):
+        """关闭写入器，最后一个分段同样提交压缩
+
+        Args:
+            wait: 是否等待所有分段压缩完成
+        """
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._close_segment()
+        if self.compress:
+            self._compress_queue.put(None)
+            if wait:
+                self._compress_thread.join()
+
+    def wait(self):
+        """等待后台压缩完成"""
+        if self._compress_thread:
+            self._compress_thread.join()
+
+    def _compress_worker(self):
+        """后台压缩已关闭的分段"""
+        while True:
+            segment = self._compress_queue.get()
+            if segment is None:
+                return
+
+            raw_path = self.directory / segment["file"]
+            gz_name = f"{segment['file']}.gz"
+            tmp_path = self.directory / f"{gz_name}.tmp"
+            try:
+                with open(raw_path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=self.compresslevel) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.replace(tmp_path, self.directory / gz_name)
+                with self._lock:
+                    segment["file"] = gz_name
+                    segment["compressed"] = True
+                    self._write_manifest()
+                raw_path.unlink()
+            except Exception as e:
+                print(f"压缩日志分段失败 ({raw_path}): {e}")
+
+    def _write_manifest(self):
+        """原子地更新清单"""
+        manifest = {
+            "name": f"{self.stem}{self.suffix}",
+            "total_bytes": self._total_bytes if self.closed else None,
+            "segments": self.segments,
+        }
+        tmp_path = Path(f"{self.manifest_path}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+
+class SegmentedLogReader:
+    """根据清单按顺序读取分段日志"""
+
+    def __init__(self, manifest_path):
+        self.manifest_path = Path(manifest_path)
+        self.directory = self.manifest_path.parent
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.segments = self.manifest["segments"]
+        self._starts = [segment["start_offset"] for segment in self.segments]
+
+    def _open_segment(self, segment):
+        path = self.directory / segment["file"]
+        if not path.exists() and segment["compressed"] is False:
+            # 读取清单后分段刚好被压缩
+            path = self.directory / f"{segment['file']}.gz"
+        return gzip.open(path, 'rb') if path.suffix == ".gz" else open(path, 'rb')
+
+    def iter_bytes(self, offset=0, chunk_size=1024 * 1024):
+        """从原始偏移 offset 开始按顺序输出数据，只解压需要的分段"""
+        first = max(0, bisect_right(self._starts, offset) - 1)
+        for segment in self.segments[first:]:
+            skip = max(0, offset - segment["start_offset"])
+            with self._open_segment(segment) as f:
+                if skip:
+                    f.seek(skip)
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+
+    def concatenate(self, output_path):
+        """还原为单个未压缩文件"""
+        with open(output_path, 'wb') as out:
+            for chunk in self.iter_bytes():
+                out.write(chunk)
+
+    @property
+    def combined_path(self):
+        name = Path(self.manifest["name"])
+        return self.directory / f"{name.stem}{COMBINED_INFIX}{name.suffix}"
+
+    def materialize(self, output_path=None):
+        """还原为单个文件（默认 combined_path）并返回路径；记录已结束且已有大小相同的还原文件时直接复用"""
+        output_path = Path(output_path or self.combined_path)
+        total = self.manifest.get("total_bytes")
+        if total is not None and output_path.exists() and output_path.stat().st_size == total:
+            return output_path
+        tmp_path = output_path.with_name(f"{output_path.name}.tmp")
+        self.concatenate(tmp_path)
+        os.replace(tmp_path, output_path)
+        return output_path
+
+
+def find_manifest(path):
+    """path 是分段清单或某个分段文件时返回清单路径，否则返回 None"""
+    path = Path(path)
+    if path.name.endswith(MANIFEST_SUFFIX):
+        return path
+    match = SEGMENT_NAME_PATTERN.match(path.name)
+    if match:
+        manifest = path.with_name(f"{match.group(1)}{MANIFEST_SUFFIX}")
+        if manifest.exists():
+            return manifest
+    return None
@@ -6,6 +6,10 @@ from datetime import datetime
 from pathlib import Path
 from typing import Optional, Callable
 
+from utils.line_assembler import LineAssembler
+from utils.pattern_matcher import MultiPatternMatcher
+from utils.segmented_log import SegmentedLogWriter, DEFAULT_SEGMENT_BYTES
+
 
 class SessionManager:
     """会话管理器 - 统一处理目录创建、日志记录等重复功能"""
@@ -21,12 +25,12 @@ class SessionManager:
         """设置日志记录器"""
         self.logger = logger
 
-    def log(self, level: str, message: str):
-        """统一的日志记录方法"""
+    def log(self, level: str, message: str, *args):
+        """统一的日志记录方法，args 用于延迟格式化"""
         if self.logger:
-            self.logger.log(level, message)
+            self.logger.log(level, message, *args)
         else:
-            print(f"[{level}] {message}")
+            print(f"[{level}] {message % args if args else message}")
 
     def create_session_directory(self, session_type: str = "session") -> str:
         """创建标准化的会话目录结构
@@ -45,13 +49,18 @@ class SessionManager:
             date_folder = os.path.join(desktop_path, f"{self.base_name}_{date_str}")
             os.makedirs(date_folder, exist_ok=True)
 
-            # 创建类型化的会话文件夹
+            # 创建类型化的会话文件夹；同一秒内并发创建的会话追加序号，互不覆盖
             session_time = datetime.now().strftime("%H%M%S")
-            self.session_path = os.path.join(
-                date_folder,
-                f"{session_type}_session_{session_time}"
-            )
-            os.makedirs(self.session_path, exist_ok=True)
+            base_path = os.path.join(date_folder, f"{session_type}_session_{session_time}")
+            self.session_path = base_path
+            suffix = 1
+            while True:
+                try:
+                    os.makedirs(self.session_path)
+                    break
+                except FileExistsError:
+                    suffix += 1
+                    self.session_path = f"{base_path}_{suffix}"
 
             self.log("系统", f"{session_type}会话目录已创建: {self.session_path}")
             return self.session_path
@@ -60,11 +69,20 @@ class SessionManager:
             self.log("错误", f"创建{session_type}会话目录失败: {e}")
             return None
 
-    def setup_terminal_logging(self, log_filename: str = "terminal.log") -> bool:
-        """设置终端日志记录
+    def setup_terminal_logging(self, log_filename: str = "terminal.log",
+                               segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+                               segment_seconds: Optional[float] = None,
+                               compress: bool = True) -> bool:
+        """设置终端日志记录（分段滚动，已关闭的分段在后台压缩）
+
+        日志写成 <名称>.0001.log(.gz)、<名称>.0002.log(.gz)... 和 <名称>.manifest.json，
+        不再有单个 <名称>.log；日志查看器按清单打开并解压。
 
         Args:
             log_filename: 终端日志文件名
+            segment_bytes: 单个分段的最大字节数
+            segment_seconds: 单个分段的最长时间，None 表示不按时间滚动
+            compress: 是否 gzip 压缩已关闭的分段
 
         Returns:
             设置是否成功
@@ -77,10 +95,15 @@ class SessionManager:
             # 创建终端日志文件路径
             log_file_path = os.path.join(self.session_path, log_filename)
 
-            # 打开终端日志文件
-            self.terminal_log_file = open(log_file_path, 'wb')
+            # 打开分段终端日志
+            self.terminal_log_file = SegmentedLogWriter(
+                log_file_path,
+                segment_bytes=segment_bytes,
+                segment_seconds=segment_seconds,
+                compress=compress
+            )
 
-            self.log("系统", f"终端日志将保存到: {log_file_path}")
+            self.log("系统", f"终端日志将保存到: {log_file_path} (分段清单: {self.terminal_log_file.manifest_path})")
             return True
 
         except Exception as e:
@@ -105,7 +128,8 @@ class SessionManager:
                 self.raw_log_file = raw_log_file
                 self.ui_logger = ui_logger
                 self.event_handlers = event_handlers or {}
-                self.buffer = b''
+                self.event_matcher = MultiPatternMatcher(self.event_handlers)
+                self.line_assembler = LineAssembler()
 
             def write(self, data):
                 # 如果是字符串，转换为字节
@@ -118,28 +142,14 @@ class SessionManager:
                 self.raw_log_file.write(data_bytes)
                 self.raw_log_file.flush()
 
-                # 同时更新缓冲区用于UI显示和事件处理
-                self.buffer += data_bytes
-                self._process_buffer_for_ui()
+                # 同时增量组装完整行用于UI显示和事件处理
+                self._process_buffer_for_ui(data_bytes)
 
-            def _process_buffer_for_ui(self):
-                """处理缓冲区数据用于UI显示和事件处理"""
+            def _process_buffer_for_ui(self, data_bytes):
+                """处理新到达的数据用于UI显示和事件处理"""
                 try:
-                    # 尝试解码为UTF-8
-                    decoded = self.buffer.decode('utf-8', errors='ignore')
-
-                    # 按行分割，处理完整的行
-                    lines = decoded.split('\n')
-
-                    # 如果最后一行不完整，保留在缓冲区中
-                    if not decoded.endswith('\n'):
-                        self.buffer = lines[-1].encode('utf-8')
-                        lines = lines[:-1]
-                    else:
-                        self.buffer = b''
-
-                    # 处理完整的行
-                    for line in lines:
+                    # 只处理新数据中产生的完整行
+                    for line in self.line_assembler.feed(data_bytes):
                         line = line.strip()
                         if not line:
                             continue
@@ -151,18 +161,16 @@ class SessionManager:
                         self.ui_logger.log("终端输出", line)
 
                 except Exception as e:
-                    # 如果解码失败，清空缓冲区
-                    self.buffer = b''
-                    self.ui_logger.log("错误", f"终端日志处理异常: {e}")
+                    # 如果处理失败，清空缓冲区
+                    self.line_assembler.reset()
+                    self.ui_logger.log("错误", "终端日志处理异常: %s", e)
 
             def _handle_events(self, line: str):
-                """处理特定事件"""
-                for pattern, callback in self.event_handlers.items():
-                    if re.search(pattern, line, re.IGNORECASE):
-                        try:
-                            callback(line)
-                        except Exception as e:
-                            self.ui_logger.log("错误", f"事件处理回调异常: {e}")
+                """处理特定事件 - 所有模式已预编译，一次扫描分发全部命中的回调"""
+                self.event_matcher.dispatch(
+                    line,
+                    on_error=lambda e: self.ui_logger.log("错误", "事件处理回调异常: %s", e)
+                )
 
             def flush(self):
                 self.raw_log_file.flush()
@@ -171,7 +179,7 @@ class SessionManager:
                 """专门记录命令"""
                 timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 # 在UI中显示命令
-                self.ui_logger.log("命令输入", f"执行命令: {command}")
+                self.ui_logger.log("命令输入", "执行命令: %s", command)
                 # 同时确保命令被写入日志文件
                 command_bytes = f"\n[{timestamp}] [COMMAND] 执行命令: {command}\n".encode('utf-8')
                 self.raw_log_file.write(command_bytes)
@@ -233,7 +241,7 @@ class EventHandlers:
     def create_auth_handler(logger):
         def handler(line):
             if 'authenticating' in line.lower():
-                logger.log("系统输出", f"认证状态: {line}")
+                logger.log("系统输出", "认证状态: %s", line)
 
         return handler
 
@@ -259,8 +267,8 @@ class EventHandlers:
     def create_completion_handler(logger):
         def handler(line):
             if 'saved in' in line or 'done' in line.lower():
-                logger.log("系统输出", f"操作完成: {line}")
+                logger.log("系统输出", "操作完成: %s", line)
             elif 'error' in line.lower() or 'failed' in line.lower():
-                logger.log("错误", f"错误信息: {line}")
+                logger.log("错误", "错误信息: %s", line)
 
         return handler
\ No newline at end of file
@@ -0,0 +1,363 @@
+# utils/ssh_transport.py
+import re
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from pathlib import Path
+
+import pexpect
+
+from utils import async_expect
+from utils.async_expect import AsyncSession
+from utils.cancellation import POLL_INTERVAL, close_child
+
+# 设备 SSH 账户
+DEFAULT_USER = "local"
+DEFAULT_PASSWORD = "local"
+# 建立主连接（含输入密码）的最长时间
+CONNECT_TIMEOUT = 30
+# 主连接空闲超过该时间（秒）后关闭
+DEFAULT_IDLE_TIMEOUT = 600
+# 测量链路速度时从设备读取的字节数
+LINK_PROBE_BYTES = 4 * 1024 * 1024
+# ssh -O exit、ssh-keygen -R 的最长时间
+HELPER_TIMEOUT = 5
+
+
+def lane_host(host, lane):
+    """同一设备的第 lane 条独立主连接（独立的 TCP 连接和加密线程），lane 0 即设备本身的主连接
+
+    返回的名字可以代替 host 传给 SshTransport 的所有方法。
+    """
+    return f"{host}+{lane}" if lane else host
+
+
+def device_host(host):
+    """去掉 lane_host() 添加的连接编号"""
+    return host.split("+", 1)[0]
+
+
+@lru_cache(maxsize=None)
+def legacy_scp_options():
+    """本机 scp 需要的协议参数（只检测一次）
+
+    OpenSSH 9.0 起 scp 默认走 SFTP 协议，远程路径不经过 shell；加 -O 使用原协议，
+    copy() 中用 shlex.quote 转义的远程路径在各版本上含义一致。
+    """
+    try:
+        result = subprocess.run(["ssh", "-V"], capture_output=True, text=True, timeout=HELPER_TIMEOUT)
+    except (OSError, subprocess.SubprocessError):
+        return []
+    match = re.search(r"OpenSSH_(\d+)\.(\d+)", result.stderr + result.stdout)
+    return ("-O",) if match and (int(match.group(1)), int(match.group(2))) >= (9, 0) else ()
+
+
+class SshTransport:
+    """设备 SSH 传输层 - 每台设备一个复用的 SSH 主连接（ControlMaster）
+
+    - ensure_master(host) 建立 ssh -N 主连接，只在这一步输入密码；之后的 scp/ssh 通过
+      ControlPath 复用它，不再进行 TCP 连接、密钥交换和密码认证
+    - 主机密钥记录在本次会话专用的 known_hosts 中（StrictHostKeyChecking=accept-new），
+      不再删除用户的 ~/.ssh/known_hosts；设备重刷导致密钥变化时只移除该设备的记录后重连
+    - 主连接不跟随命令的取消令牌，空闲超过 idle_timeout 秒后由后台线程关闭，stop() 关闭全部
+    - 并行传输需要多条 TCP 连接时，用 lane_host(host, n) 为同一设备建立额外的主连接
+    主连接失效时 scp/ssh 会退回普通连接，调用方仍需处理密码提示。
+    """
+
+    def __init__(self, known_hosts=None, logger=None, user=DEFAULT_USER, password=DEFAULT_PASSWORD,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.logger = logger
+        self.user = user
+        self.password = password
+        self.idle_timeout = idle_timeout
+        # ControlPath 是 unix socket，路径长度有限制（macOS 104 字节），放在短的临时目录中
+        self.control_dir = Path(tempfile.mkdtemp(prefix="atc-ssh-"))
+        self.known_hosts = Path(known_hosts) if known_hosts else self.control_dir / "known_hosts"
+        self.known_hosts.parent.mkdir(parents=True, exist_ok=True)
+        self.scp_options = legacy_scp_options()
+        self._masters = {}  # host -> AsyncSession
+        self.link_speeds = {}  # host -> 测得的链路速度（MB/s）
+        self._last_used = {}
+        self._active = {}  # host -> 正在使用主连接的传输数
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def log(self, level, message):
+        if self.logger:
+            self.logger.log(level, message)
+
+    def start(self):
+        """启动空闲主连接回收线程"""
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._reap_loop, name="ssh-transport", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """关闭所有主连接并删除临时目录"""
+        self._stop.set()
+        for host in list(self._masters):
+            self.close_master(host)
+        shutil.rmtree(self.control_dir, ignore_errors=True)
+
+    def _reap_loop(self):
+        while not self._stop.wait(min(60, self.idle_timeout)):
+            for host, last_used in list(self._last_used.items()):
+                if self._active.get(host):
+                    continue
+                if time.monotonic() - last_used >= self.idle_timeout and host in self._masters:
+                    self.log("系统", f"SSH 主连接 {host} 空闲，已关闭")
+                    self.close_master(host)
+
+    def _host_lock(self, host):
+        with self._lock:
+            return self._locks.setdefault(host, threading.Lock())
+
+    # --- 连接参数 ---
+
+    def target(self, host):
+        return f"{self.user}@{device_host(host)}"
+
+    def control_path(self, host):
+        return self.control_dir / f"{self.user}@{host}"
+
+    def _base_options(self, host):
+        return [
+            "-o", f"ControlPath={self.control_path(host)}",
+            "-o", f"UserKnownHostsFile={self.known_hosts}",
+            "-o", "StrictHostKeyChecking=accept-new",
+        ]
+
+    def options(self, host):
+        """scp/ssh 共用的参数: 复用主连接并使用会话专用的 known_hosts"""
+        return [*self._base_options(host), "-o", "ControlMaster=no"]
+
+    def ssh_args(self, host, command):
+        return [*self.options(host), self.target(host), command]
+
+    def batch_args(self, host, command):
+        """只走主连接、不会等待密码输入的 ssh 参数，用于读取命令输出的数据流"""
+        return ["ssh", *self.options(host), "-o", "BatchMode=yes", self.target(host), command]
+
+    # --- 主连接 ---
+
+    def has_master(self, host):
+        master = self._masters.get(host)
+        return bool(master and master.isalive() and self.control_path(host).exists())
+
+    async def ensure_master(self, host, cancel_token=None) -> bool:
+        """确保 host 有可用的主连接，失败返回 False（后续 scp/ssh 会退回普通连接）"""
+        lock = self._host_lock(host)
+        while not lock.acquire(blocking=False):
+            await async_expect.sleep(POLL_INTERVAL, cancel_token)
+        try:
+            if self.has_master(host):
+                return True
+            await self.aclose_master(host)
+            for attempt in range(2):
+                result = await self._start_master(host, cancel_token)
+                if result != "host_key_changed":
+                    return result == "ok"
+                # 设备重刷后主机密钥变化: 只移除该设备的记录后重试一次
+                await async_expect.run_blocking(self.forget_host, host)
+            return False
+        finally:
+            if host in self._masters:
+                self._last_used[host] = time.monotonic()
+            lock.release()
+
+    @asynccontextmanager
+    async def connection(self, host, cancel_token=None):
+        """在一次传输期间使用 host 的主连接，期间不会被空闲回收；返回主连接是否可用"""
+        ok = await self.ensure_master(host, cancel_token)
+        self._active[host] = self._active.get(host, 0) + 1
+        try:
+            yield ok
+        finally:
+            self._active[host] -= 1
+            if host in self._masters:
+                self._last_used[host] = time.monotonic()
+
+    async def _start_master(self, host, cancel_token):
+        started = time.monotonic()
+        # 保活: 链路中断约 60s 后主连接退出，复用它的传输随即结束，可以从断点重试
+        args = ["-N", *self._base_options(host), "-o", "ControlMaster=yes", "-o", "ServerAliveInterval=15",
+                "-o", "ServerAliveCountMax=4", self.target(host)]
+        master = AsyncSession("ssh", args, encoding='utf-8')
+        self._masters[host] = master
+        try:
+            while True:
+                if cancel_token:
+                    cancel_token.raise_if_cancelled()
+                index = await master.expect([
+                    'Are you sure you want to continue connecting',
+                    '[Pp]assword:',
+                    'REMOTE HOST IDENTIFICATION HAS CHANGED|Host key verification failed',
+                    pexpect.EOF,
+                    pexpect.TIMEOUT,
+                ], timeout=POLL_INTERVAL)
+                if index == 0:
+                    master.sendline("yes")
+                elif index == 1:
+                    master.sendline(self.password)
+                elif index == 2:
+                    self.log("警告", f"设备 {host} 的主机密钥已变化")
+                    await self.aclose_master(host)
+                    return "host_key_changed"
+                elif index == 3:
+                    self.log("警告", f"SSH 主连接 {host} 建立失败: {(master.before or '').strip()}")
+                    await self.aclose_master(host)
+                    return "failed"
+                elif self.control_path(host).exists():
+                    self.log("程序输出", f"SSH 主连接 {host} 已建立，耗时 {time.monotonic() - started:.1f}s")
+                    return "ok"
+                elif time.monotonic() - started > CONNECT_TIMEOUT:
+                    self.log("警告", f"SSH 主连接 {host} 建立超时")
+                    await self.aclose_master(host)
+                    return "failed"
+        except BaseException:
+            await self.aclose_master(host)
+            raise
+
+    def close_master(self, host):
+        """关闭 host 的主连接（同步，最多等待 HELPER_TIMEOUT 秒；供 stop() 和空闲回收线程使用）"""
+        master = self._detach_master(host)
+        if master:
+            self._exit_master(host, master)
+
+    async def aclose_master(self, host):
+        """在线程池中关闭 host 的主连接；多个设备共用一个事件循环，不能在协程中同步等待"""
+        master = self._detach_master(host)
+        if master:
+            await async_expect.run_blocking(self._exit_master, host, master)
+
+    def _detach_master(self, host):
+        self._last_used.pop(host, None)
+        return self._masters.pop(host, None)
+
+    def _exit_master(self, host, master):
+        try:
+            subprocess.run(["ssh", "-O", "exit", *self.options(host), self.target(host)],
+                           capture_output=True, timeout=HELPER_TIMEOUT)
+        except Exception:
+            pass
+        try:
+            master.close()
+        except Exception:
+            pass
+
+    def forget_host(self, host):
+        """从会话 known_hosts 中移除 host 的记录（同步，协程中通过 run_blocking 调用）"""
+        if not self.known_hosts.exists():
+            return
+        try:
+            subprocess.run(["ssh-keygen", "-R", device_host(host), "-f", str(self.known_hosts)], capture_output=True,
+                           timeout=HELPER_TIMEOUT)
+            self.log("程序输出", f"已从会话 known_hosts 中移除 {host}")
+        except Exception as e:
+            self.log("警告", f"移除 {host} 的主机密钥失败: {e}")
+
+    # --- 远程命令 ---
+
+    async def run(self, host, command, timeout=60, cancel_token=None):
+        """通过主连接在设备上执行命令，返回 (退出码, 输出)；退出码为 None 表示超时"""
+        async with self.connection(host, cancel_token):
+            child = AsyncSession("ssh", self.ssh_args(host, command), encoding='utf-8', cancel_token=cancel_token)
+            output = []
+            try:
+                while True:
+                    index = await child.expect(['[Pp]assword:', pexpect.EOF, pexpect.TIMEOUT], timeout=timeout)
+                    output.append(child.before or "")
+                    if index == 0:
+                        child.sendline(self.password)
+                    elif index == 1:
+                        break
+                    else:
+                        return None, "".join(output)
+            finally:
+                await child.aclose()
+        return child.child.exitstatus, "".join(output)
+
+    async def measure_link(self, host, cancel_token=None):
+        """通过主连接从设备读取 LINK_PROBE_BYTES 字节测量链路速度（MB/s），结果按设备缓存；失败返回 None"""
+        if host in self.link_speeds:
+            return self.link_speeds[host]
+        async with self.connection(host, cancel_token) as ok:
+            if not ok:
+                return None
+            command = f"dd if=/dev/zero bs=1048576 count={LINK_PROBE_BYTES // 1048576} 2>/dev/null"
+            started = time.monotonic()
+            process = subprocess.Popen(self.batch_args(host, command), stdin=subprocess.DEVNULL,
+                                       stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            if cancel_token:
+                cancel_token.register(process)
+            try:
+                received = await async_expect.run_blocking(_drain, process.stdout, cancel_token=cancel_token,
+                                                           timeout=CONNECT_TIMEOUT)
+            except TimeoutError:
+                received = 0
+            finally:
+                close_child(process)
+                if cancel_token:
+                    cancel_token.unregister(process)
+        elapsed = time.monotonic() - started
+        if received < LINK_PROBE_BYTES or elapsed <= 0:
+            self.log("警告", f"测量设备 {host} 链路速度失败")
+            return None
+        speed = received / 1024 / 1024 / elapsed
+        self.link_speeds[host] = speed
+        self.log("程序输出", f"设备 {host} 链路速度约 {speed:.1f} MB/s")
+        return speed
+
+    async def copy(self, host, remote_paths, local_path, timeout=600, cancel_token=None, preserve=False,
+                   logfile=None):
+        """通过主连接把设备上的文件或目录（可以是多个）复制到 local_path，返回 (是否成功, 失败原因)
+
+        主连接不可用时 scp 退回普通连接，这里自动确认主机密钥并输入密码。
+        preserve=True 时保留修改时间（scp -p），增量同步依赖它比较文件。
+        远程路径经 shlex.quote 转义，可以包含空格和 shell 特殊字符。
+        """
+        sources = [remote_paths] if isinstance(remote_paths, (str, Path)) else list(remote_paths)
+        args = ["-r", *self.scp_options, *(["-p"] if preserve else []), *self.options(host),
+                *(f"{self.target(host)}:{shlex.quote(str(path))}" for path in sources), str(local_path)]
+        async with self.connection(host, cancel_token):
+            child = AsyncSession("scp", args, encoding='utf-8', cancel_token=cancel_token)
+            if logfile:
+                child.logfile_read = logfile
+                child.logfile_send = logfile
+            try:
+                while True:
+                    index = await child.expect(['Are you sure you want to continue connecting', '[Pp]assword:',
+                                                pexpect.EOF, pexpect.TIMEOUT], timeout=timeout)
+                    if index == 0:
+                        child.sendline("yes")
+                    elif index == 1:
+                        child.sendline(self.password)
+                    elif index == 2:
+                        break
+                    else:
+                        return False, "超时"
+            finally:
+                await child.aclose()
+
+        # 被信号结束时 exitstatus 为 None
+        if child.child.signalstatus is not None:
+            return False, f"被信号 {child.child.signalstatus} 结束"
+        if child.child.exitstatus != 0:
+            return False, f"退出码 {child.child.exitstatus}"
+        return True, None
+
+
+def _drain(stream):
+    """读完数据流，返回读到的字节数"""
+    total = 0
+    for chunk in iter(lambda: stream.read(65536), b''):
+        total += len(chunk)
+    return total
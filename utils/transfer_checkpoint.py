@@ -0,0 +1,135 @@
+# utils/transfer_checkpoint.py
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# 断点文件名前缀，完整文件名为 transfer_checkpoint_<序列号>.json
+CHECKPOINT_PREFIX = "transfer_checkpoint_"
+# 两次写入断点文件的最小间隔（秒），完成、失败等关键状态立即写入
+SAVE_INTERVAL = 2.0
+
+
+class TransferCheckpoint:
+    """传输断点 - 保存在会话目录中的 JSON
+
+    - context: 采集上下文（序列号、设备 IP、设备目录、sysdiagnose 归档、设备端步骤是否完成等），
+      继续采集时据此跳过设备端步骤
+    - transfers: 每个 设备路径 -> 本地目录 的传输及是否完成
+    - files: 每个设备文件是否传输完成；大文件另记已接收的字节偏移或已完成的分块
+    设备上的文件大小或修改时间变化后，该文件的断点作废，从头传输。
+    """
+
+    def __init__(self, path, data=None):
+        self.path = Path(path)
+        self.data = data or {"context": {}, "transfers": {}, "files": {}}
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+
+    @classmethod
+    def for_device(cls, folder, serial):
+        """打开 folder 中该设备的断点文件，不存在时新建"""
+        path = Path(folder) / f"{CHECKPOINT_PREFIX}{serial}.json"
+        return cls.load(path) if path.exists() else cls(path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(path, json.load(f))
+
+    @property
+    def context(self):
+        return self.data["context"]
+
+    def start_collection(self, **context):
+        """开始新的采集: 替换上下文并清空传输记录，保留文件进度（设备文件未变化时仍可续传）"""
+        with self._lock:
+            self.data["context"] = dict(context, started_at=datetime.now().isoformat(timespec='seconds'))
+            self.data["transfers"] = {}
+        self.save(force=True)
+
+    def update_context(self, **values):
+        with self._lock:
+            self.context.update(values)
+        self.save(force=True)
+
+    # --- 传输 ---
+
+    @staticmethod
+    def transfer_key(remote_path, local_dir):
+        return f"{remote_path} -> {local_dir}"
+
+    def begin_transfer(self, remote_path, local_dir, method):
+        with self._lock:
+            transfer = self.data["transfers"].setdefault(self.transfer_key(remote_path, local_dir), {
+                "remote": remote_path, "local": str(local_dir), "attempts": 0, "done": False,
+            })
+            transfer["method"] = method
+            transfer["attempts"] += 1
+            transfer["started_at"] = datetime.now().isoformat(timespec='seconds')
+        self.save(force=True)
+
+    def end_transfer(self, remote_path, local_dir, ok):
+        with self._lock:
+            transfer = self.data["transfers"].get(self.transfer_key(remote_path, local_dir))
+            if transfer:
+                transfer["done"] = ok
+        self.save(force=True)
+
+    def pending_transfers(self):
+        """未完成的传输，按开始顺序"""
+        return [transfer for transfer in self.data["transfers"].values() if not transfer["done"]]
+
+    # --- 文件 ---
+
+    def file_state(self, remote, size, mtime):
+        """返回需要传输的设备文件的断点记录；已完成（本地文件已不是最新）或大小、修改时间与记录不同时重新开始"""
+        with self._lock:
+            state = self.data["files"].get(remote)
+            if not state or state["done"] or state["size"] != size or state["mtime"] != mtime:
+                state = self.data["files"][remote] = {
+                    "size": size, "mtime": mtime, "offset": 0, "chunks": [], "done": False,
+                }
+            return state
+
+    def set_offset(self, remote, offset):
+        """记录大文件已写入本地的字节数"""
+        with self._lock:
+            if remote in self.data["files"]:
+                self.data["files"][remote]["offset"] = offset
+        self.save()
+
+    def add_chunk(self, remote, offset):
+        """记录大文件中从 offset 开始的分块已完成"""
+        with self._lock:
+            state = self.data["files"].get(remote)
+            if state and offset not in state["chunks"]:
+                state["chunks"].append(offset)
+        self.save()
+
+    def reset_file(self, remote):
+        """丢弃文件的传输进度（如校验失败），下次从头传输"""
+        with self._lock:
+            self.data["files"].pop(remote, None)
+        self.save(force=True)
+
+    def mark_done(self, remote, size, mtime):
+        with self._lock:
+            self.data["files"][remote] = {"size": size, "mtime": mtime, "done": True}
+        self.save()
+
+    def save(self, force=False):
+        """写入断点文件（先写临时文件再替换，中途退出不会留下损坏的文件）"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._saved_at < SAVE_INTERVAL:
+                return
+            self._saved_at = now
+            self.data["updated_at"] = datetime.now().isoformat(timespec='seconds')
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp = self.path.with_name(self.path.name + ".tmp")
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            os.replace(temp, self.path)
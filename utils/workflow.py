@@ -0,0 +1,260 @@
+# utils/workflow.py
+import asyncio
+import json
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+# 步骤状态
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+STATE_NAMES = {
+    SUCCEEDED: "成功",
+    FAILED: "失败",
+    SKIPPED: "跳过",
+}
+
+# 步骤中会替换 {变量} 的字段
+TEMPLATE_FIELDS = ("command", "path", "source", "dest", "save_as")
+
+
+class WorkflowStep:
+    """工作流中的一个步骤
+
+    JSON 字段:
+        id          步骤名，工作流内唯一
+        transport   执行通道，如 "console"（设备串口）、"scp"（主机拉取）、"host"（主机命令）
+        depends_on  依赖的步骤 id 列表，依赖全部成功后才开始
+        after       只排顺序的步骤 id 列表，等这些步骤结束（无论成败）后才开始
+        timeout     超时秒数，省略表示不限制
+        optional    为 true 时失败不影响工作流结果（依赖它的步骤仍会跳过）
+    其余字段（command、action、path、source、dest、save_as 等）原样交给通道处理函数。
+    """
+
+    def __init__(self, data):
+        self.id = data["id"]
+        self.transport = data["transport"]
+        self.depends_on = list(data.get("depends_on", []))
+        self.after = list(data.get("after", []))
+        self.timeout = data.get("timeout")
+        self.optional = bool(data.get("optional", False))
+        self.params = {key: value for key, value in data.items()
+                       if key not in ("id", "transport", "depends_on", "after", "timeout", "optional")}
+
+    def get(self, key, default=None):
+        return self.params.get(key, default)
+
+    def render(self, key, context, default=None):
+        """取字段值并用上下文替换其中的 {变量}"""
+        value = self.params.get(key, default)
+        if isinstance(value, str) and key in TEMPLATE_FIELDS:
+            try:
+                return value.format_map(context)
+            except KeyError as e:
+                raise ValueError(f"步骤 {self.id} 的 {key} 引用了未定义的变量 {e}")
+        return value
+
+
+class Workflow:
+    """已校验的工作流: 步骤按拓扑顺序排列，limits 为各通道的并发数（覆盖执行器的默认值）"""
+
+    def __init__(self, name, steps, limits=None):
+        self.name = name
+        self.steps = steps
+        self.limits = limits or {}
+
+    @classmethod
+    def from_dict(cls, data):
+        raw_steps = data.get("steps")
+        if not isinstance(raw_steps, list) or not raw_steps:
+            raise ValueError("工作流缺少 steps 列表")
+
+        steps = {}
+        for number, raw in enumerate(raw_steps, 1):
+            missing = [key for key in ("id", "transport") if not raw.get(key)]
+            if missing:
+                raise ValueError(f"第 {number} 个步骤缺少字段: {', '.join(missing)}")
+            step = WorkflowStep(raw)
+            if step.id in steps:
+                raise ValueError(f"步骤 id 重复: {step.id}")
+            steps[step.id] = step
+
+        for step in steps.values():
+            unknown = [dep for dep in step.depends_on + step.after if dep not in steps]
+            if unknown:
+                raise ValueError(f"步骤 {step.id} 依赖了不存在的步骤: {', '.join(unknown)}")
+
+        return cls(data.get("name", "workflow"), cls._topological_order(steps), data.get("limits"))
+
+    @staticmethod
+    def _topological_order(steps):
+        """按依赖排序（同层保持文件中的顺序），有循环依赖时报错"""
+        ordered = []
+        placed = set()
+        pending = list(steps.values())
+        while pending:
+            ready = [step for step in pending if all(dep in placed for dep in step.depends_on + step.after)]
+            if not ready:
+                raise ValueError(f"存在循环依赖: {', '.join(step.id for step in pending)}")
+            for step in ready:
+                ordered.append(step)
+                placed.add(step.id)
+            pending = [step for step in pending if step.id not in placed]
+        return ordered
+
+    def transports(self):
+        return {step.transport for step in self.steps}
+
+
+def load_workflow(path):
+    """读取 JSON 工作流文件"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return Workflow.from_dict(json.load(f))
+
+
+class StepResult:
+    """步骤执行结果，started 为相对工作流开始的秒数"""
+
+    __slots__ = ('id', 'transport', 'state', 'started', 'duration', 'error')
+
+    def __init__(self, step):
+        self.id = step.id
+        self.transport = step.transport
+        self.state = SKIPPED
+        self.started = None
+        self.duration = 0.0
+        self.error = None
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class WorkflowExecutor:
+    """在事件循环中执行工作流
+
+    - 每个步骤在依赖全部成功、after 中的步骤全部结束后开始，互不依赖的步骤并发执行
+    - 每个通道可以限制并发数，例如串口只有一个，"console" 通道限制为 1；
+      主机上的 scp 不受串口占用影响，可以与串口步骤同时进行
+    - 处理函数签名为 async handler(step, context) -> bool，可以向 context 写入变量供后续步骤使用
+    - 依赖失败或被跳过的步骤记为跳过，记录每个步骤的开始时间和耗时
+    """
+
+    def __init__(self, workflow, logger=None, cancel_token=None):
+        self.workflow = workflow
+        self.logger = logger
+        self.cancel_token = cancel_token
+        self.handlers = {}
+        self.limits = {}
+        self.context = {}
+        self.results = {}
+        self.duration = 0.0
+
+    def log(self, level, message):
+        if self.logger:
+            self.logger.log(level, message)
+        else:
+            print(f"[{level}] {message}")
+
+    def add_transport(self, name, handler, limit=None):
+        """注册通道处理函数，limit 为该通道同时执行的步骤数（None 表示不限制）"""
+        self.handlers[name] = handler
+        self.limits[name] = limit
+
+    def run(self, context=None):
+        """同步入口"""
+        return asyncio.run(self.run_async(context))
+
+    async def run_async(self, context=None):
+        """执行全部步骤，所有必需步骤成功时返回 True"""
+        unknown = self.workflow.transports() - set(self.handlers)
+        if unknown:
+            raise ValueError(f"工作流 {self.workflow.name} 使用了未注册的通道: {', '.join(sorted(unknown))}")
+
+        self.context = dict(context or {})
+        self.results = {step.id: StepResult(step) for step in self.workflow.steps}
+        limits = {**self.limits, **self.workflow.limits}
+        semaphores = {name: asyncio.Semaphore(limit) for name, limit in limits.items() if limit}
+        started = time.monotonic()
+
+        tasks = {}
+        for step in self.workflow.steps:
+            tasks[step.id] = asyncio.create_task(self._run_step(
+                step, [tasks[dep] for dep in step.depends_on], [tasks[dep] for dep in step.after],
+                semaphores.get(step.transport), started
+            ))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            self.duration = time.monotonic() - started
+
+        return all(self.results[step.id].state == SUCCEEDED or step.optional for step in self.workflow.steps)
+
+    async def _run_step(self, step, dependencies, predecessors, semaphore, workflow_started):
+        result = self.results[step.id]
+        if predecessors:
+            await asyncio.gather(*predecessors)
+        if dependencies:
+            # 依赖的任务返回该步骤是否成功
+            if not all(await asyncio.gather(*dependencies)):
+                self.log("警告", f"步骤 {step.id} 的依赖未成功，跳过")
+                return False
+
+        async with (semaphore or nullcontext()):
+            if self.cancel_token:
+                self.cancel_token.raise_if_cancelled()
+            result.started = time.monotonic() - workflow_started
+            self.log("程序输出", f"开始步骤 {step.id} ({step.transport})")
+            try:
+                handler = self.handlers[step.transport](step, self.context)
+                ok = await asyncio.wait_for(handler, step.timeout) if step.timeout else await handler
+                result.state = SUCCEEDED if ok else FAILED
+            except asyncio.TimeoutError:
+                result.state = FAILED
+                result.error = f"超时 ({step.timeout}s)"
+            except Exception as e:
+                result.state = FAILED
+                result.error = str(e)
+            finally:
+                result.duration = time.monotonic() - workflow_started - result.started
+
+        if result.state == SUCCEEDED:
+            self.log("程序输出", f"步骤 {step.id} 完成，耗时 {result.duration:.1f}s")
+        else:
+            level = "警告" if step.optional else "错误"
+            self.log(level, f"步骤 {step.id} 失败，耗时 {result.duration:.1f}s {result.error or ''}".rstrip())
+        return result.state == SUCCEEDED
+
+    def summary(self):
+        """输出每个步骤的开始时间和耗时"""
+        self.log("系统", f"=== 工作流 {self.workflow.name} 步骤耗时 ===")
+        for step in self.workflow.steps:
+            result = self.results.get(step.id)
+            if result is None:
+                continue
+            state = STATE_NAMES[result.state]
+            if result.started is None:
+                self.log("系统", f"{step.id}: {state}")
+            else:
+                self.log("系统" if result.state == SUCCEEDED else "警告",
+                         f"{step.id}: {state}，开始 +{result.started:.1f}s，耗时 {result.duration:.1f}s")
+        self.log("系统", f"总耗时 {self.duration:.1f}s")
+
+    def write_report(self, path):
+        """保存每个步骤的结果和耗时（JSON）"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "workflow": self.workflow.name,
+                "total_duration": self.duration,
+                "steps": [self.results[step.id].to_dict() for step in self.workflow.steps],
+            }, f, ensure_ascii=False, indent=2)
+        return path
+